@@ -7,12 +7,7 @@
 
 ## Initialization and Imports
 import ee            # Import the Earth Engine API
-import math          # Import math for trigonometric functions
-import pandas as pd  # Import pandas for data manipulation 
 import sys           # Import system-specific parameters and functions
-import os            # Import operating system functionalities
-import re            # Import regular expression operations for string parsing
-import time          # Import time-related functions
 
 # Authenticate the Earth Engine account (required in new environments)
 ee.Authenticate()
@@ -21,79 +16,69 @@ ee.Authenticate()
 ee.Initialize(project = 'ee-ipam')
 
 ## Environment and Custom Module Setup
-# Define the repository URL containing the custom mapbiomas mosaic scripts
-REPO_URL = "https://github.com/costa-barbara/mapbiomas-mosaic.git"
+# Add the local copy of this repository to access the shared pipeline helpers
+sys.path.append("/content/brazil-cerrado")
+from pipeline.module_cache import SENTINEL_COMMIT, SENTINEL_HASH, load_modules
 
-# Define the local directory path to clone the repository into
-REPO_DIR = "/content/mapbiomas-mosaic-10m"
+# Load the 10 m branch of the MapBiomas mosaic helper modules from the local cache (cloned only when missing
+# or modified); copies of the modules imported earlier in the session are dropped
+load_modules('sentinel', commit=SENTINEL_COMMIT, expected_hash=SENTINEL_HASH)
 
-# Define the specific Git branch to be used
-BRANCH = "mapbiomas-mosaics-10m"
-
-# Iterate through loaded Python modules to remove previously cached custom modules
-for module_name in list(sys.modules.keys()):
-    if module_name == "modules" or module_name.startswith("modules."):
-        del sys.modules[module_name]
-
-# Remove any previous instances of the repository path from the system path
-sys.path = [p for p in sys.path if p != REPO_DIR]
-
-# Force remove the old local copy of the repository
-!rm -rf /content/mapbiomas-mosaic-10m
-
-# Clone the specific branch of the repository into the defined local folder
-!git clone --branch mapbiomas-mosaics-10m --single-branch https://github.com/costa-barbara/mapbiomas-mosaic.git /content/mapbiomas-mosaic-10m
-
-# Confirm the active branch in the cloned repository
-!git -C /content/mapbiomas-mosaic-10m branch --show-current
-!git -C /content/mapbiomas-mosaic-10m status
-!git -C /content/mapbiomas-mosaic-10m log -1 --oneline
-
-# Add the cloned repository directory to the top of the Python system path
-sys.path.insert(0, REPO_DIR)
-
-# Import custom spectral index functions from the downloaded module
+# Import custom spectral index functions from the cached modules
 from modules.SpectralIndexes import *
 
+# Import the shared pipeline helpers
+from pipeline.covariates import CovariateFactory
+from pipeline.manifest import AssetManifest
+from pipeline.parameters import parameter
+from pipeline.schema import sentinel_general_schema
+
 ## Parameters and Asset Management
 # Define the input version for the sample points
-version_in = '4'
+version_in = parameter('version_in', '4')
 
 # Define the output version for the generated training data
-version_out  = '4'
+version_out  = parameter('version_out', '4')
 
 # Define the base output folder path for storing the generated training assets in GEE
 dirout = f'projects/ee-ipam/assets/MAPBIOMAS/LULC/CERRADO_DEV/COL_11/SENTINEL/trainings/'
 
 # Define the list of years to be processed
-years = list(range(2017, 2026))
+years = parameter('years', list(range(2017, 2026)))
 
 # Define the list of classification regions (IDs) to be processed.
-regions = list(range(1, 39))
+regions = parameter('regions', list(range(1, 39)))
 
 # Define specific regions where the number of samples must be downsampled to prevent memory limits
 # This is often done to mitigate memory issues during Earth Engine computations for large regions
 reduced_regions  = [8, 10, 14, 15, 20, 21, 32]
 
-# Retrieve the list of all existing assets currently saved in the output directory
-files = ee.data.listAssets({'parent': dirout})
+# Define the local file caching the listing of the output directory
+manifest_path = parameter('manifest_path', '/content/asset_manifest.sqlite')
 
-# Extract only the asset name strings from the API response
-files = [asset['name'] for asset in files['assets']]
+# Reuse a listing of the output folder younger than this many seconds (set by the command line runner,
+# which lists the folder once for all of its jobs); None lists it on every run
+manifest_max_age = parameter('manifest_max_age')
 
-# Strip the legacy prefix from the asset names to standardize the format for comparison
-files = [file.replace('projects/earthengine-legacy/assets/', '') for file in files]
+# Refresh the local manifest of existing assets (paginated folder listing)
+manifest = AssetManifest(manifest_path)
+manifest.refresh(dirout, max_age=manifest_max_age)
 
-# Generate a comprehensive list of all expected asset names based on regions and years
-expected = [
-    f'projects/ee-ipam/assets/MAPBIOMAS/LULC/CERRADO_DEV/COL_11/SENTINEL/trainings/v{version_out}/train_col04_reg{region}_{year}_v{version_out}'
+# Generate all expected asset names keyed by (region, year), at the path used by the export below
+expected = {
+    (region, year): f'{dirout}train_col04_reg{region}_{year}_v{version_out}'
     for region in regions for year in years
+}
+
+# Compare expected assets against the manifest to identify only the missing tasks
+# These are the (region, year) pairs that still need to be generated.
+missing_by_region = manifest.missing_by_region(dirout, expected)
+missing = [
+    (region, year)
+    for region, region_years in sorted(missing_by_region.items())
+    for year in region_years
 ]
 
-# Compare expected assets against existing files to identify only the missing tasks
-# These are the assets that still need to be generated.
-missing = [entry for entry in expected if entry not in files]
-
 # Load the Cerrado classification regions feature collection
 regionsCollection = ee.FeatureCollection('projects/ee-ipam-cerrado/assets/ancillary/collection_11_classification_regions_vector')
 
@@ -111,21 +96,42 @@ biomes = ['CERRADO'];
 # Initialize an empty dictionary to temporarily store computed mosaics by year
 mosaic_dict = {}
 
-## Main Processing Loop
-# Iterate over each missing asset that needs to be generated
-for obj in missing:
-    # Print the name of the asset currently being processed
-    print(obj)
+# Construct a dictionary containing Geomorpho90m topographic covariates and MERIT DEM
+# Source: Amatulli et al. 2019 - https://www.nature.com/articles/s41597-020-0479-6
+geomorpho = {
+    'dem': ee.Image('MERIT/DEM/v1_0_3').select('dem').toInt64().rename('merit_dem'),
+    'aspect': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/aspect").mosaic().multiply(10000).round().rename('aspect').toInt64(),
+    'convergence': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/convergence").mosaic().multiply(10000).round().rename('convergence').toInt64(),
+    'pcurv': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/pcurv").mosaic().multiply(10000).round().rename('pcurv').toInt64(),
+    'tcurv': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/tcurv").mosaic().multiply(10000).round().rename('tcurv').toInt64(),
+    'roughness': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/roughness").mosaic().multiply(10000).round().rename('roughness').toInt64(),
+    'eastness': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/eastness").mosaic().multiply(10000).round().rename('eastness').toInt64(),
+    'northness': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/northness").mosaic().multiply(10000).round().rename('northness').toInt64(),
+    'dxx': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/dxx").mosaic().multiply(10000).round().rename('dxx').toInt64(),
+    'cti': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/cti").mosaic().multiply(10000).round().rename('cti').toInt64(),
+}
+
+# Define the spectral index functions applied to each temporal aggregate of the Sentinel mosaic, in order
+indexFunctions = [
+    getNDVI, getMNDWI, getPRI, getCAI, getEVI2, getGCVI, getGRND,
+    getMSI, getGARI, getGNDVI, getMSAVI, getHallCover, getHallHeigth,
+    getTGSI, getNDVIRED, getVI700, getIRECI, getCIRE, getTCARI, getSFDVI, getNDRE
+]
 
-    # Use regular expressions to extract the region ID from the expected asset name
-    match = re.search(r"(?<=reg)\d+", obj)
-    if match:
-        region_list = int(match.group())
+# Derive the mosaic band schema locally from the feature stack (verified against the server on the first task)
+feature_schema = sentinel_general_schema(indexFunctions, geomorpho)
 
-    # Use regular expressions to extract the year from the expected asset name
-    match = re.search(r"\d{4}", obj)
-    if match:
-        year = int(match.group())
+# Static covariates (coordinates, geomorpho) built once per process and clipped with the final mosaic
+covariates = CovariateFactory(geomorpho)
+
+## Main Processing Loop
+# Region-years whose export tasks were started (reported to the command line runner)
+launched = 0
+
+# Iterate over each missing (region, year) pair that needs to be generated
+for region_list, year in missing:
+    # Print the name of the asset currently being processed
+    print(expected[(region_list, year)])
 
     # Filter the regions collection to isolate the geometry of the current region
     region_i = regionsCollection.filterMetadata('mapb', "equals", region_list).geometry()
@@ -136,31 +142,6 @@ for obj in missing:
     # Load the region raster and mask it to keep only the pixels of the current region
     region_i_img = ee.Image('projects/barbaracosta-ipam/assets/base/CERRADO_CLASSIFICATION_REGIONS').eq(region_list).selfMask()
 
-    ## Covariates and Coordinates
-    # Extract pixel latitude and longitude coordinates
-    geo_coordinates = ee.Image.pixelLonLat().clip(region_i)
-
-    # Compute auxiliary coordinates
-    coords = ee.Image.pixelLonLat().clip(region_i)
-    lat = coords.select('latitude').add(5).multiply(-1).multiply(1000).toInt16()
-    lon_sin = coords.select('longitude').multiply(math.pi).divide(180).sin().multiply(-1).multiply(10000).toInt16().rename('longitude_sin')
-    lon_cos = coords.select('longitude').multiply(math.pi).divide(180).cos().multiply(-1).multiply(10000).toInt16().rename('longitude_cos')
-
-    # Construct a dictionary containing Geomorpho90m topographic covariates and MERIT DEM
-    # Source: Amatulli et al. 2019 - https://www.nature.com/articles/s41597-020-0479-6
-    geomorpho = {
-        'dem': ee.Image('MERIT/DEM/v1_0_3').select('dem').toInt64().rename('merit_dem'),
-        'aspect': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/aspect").mosaic().multiply(10000).round().rename('aspect').toInt64(),
-        'convergence': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/convergence").mosaic().multiply(10000).round().rename('convergence').toInt64(),
-        'pcurv': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/pcurv").mosaic().multiply(10000).round().rename('pcurv').toInt64(),
-        'tcurv': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/tcurv").mosaic().multiply(10000).round().rename('tcurv').toInt64(),
-        'roughness': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/roughness").mosaic().multiply(10000).round().rename('roughness').toInt64(),
-        'eastness': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/eastness").mosaic().multiply(10000).round().rename('eastness').toInt64(),
-        'northness': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/northness").mosaic().multiply(10000).round().rename('northness').toInt64(),
-        'dxx': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/dxx").mosaic().multiply(10000).round().rename('dxx').toInt64(),
-        'cti': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/cti").mosaic().multiply(10000).round().rename('cti').toInt64(),
-    }
-
     ## Mosaic Assembly
     # Define the start date based on the current iteration year
     dateStart = ee.Date.fromYMD(year, 1, 1)
@@ -223,27 +204,8 @@ for obj in missing:
           img_suffix = rename_bands_for_suffix(image, suffix)
 
           # Apply all custom spectral index functions imported from the MapBiomas module
-          img_suffix = getNDVI(img_suffix)
-          img_suffix = getMNDWI(img_suffix)
-          img_suffix = getPRI(img_suffix)
-          img_suffix = getCAI(img_suffix)
-          img_suffix = getEVI2(img_suffix)
-          img_suffix = getGCVI(img_suffix)
-          img_suffix = getGRND(img_suffix)
-          img_suffix = getMSI(img_suffix)
-          img_suffix = getGARI(img_suffix)
-          img_suffix = getGNDVI(img_suffix)
-          img_suffix = getMSAVI(img_suffix)
-          img_suffix = getHallCover(img_suffix)
-          img_suffix = getHallHeigth(img_suffix)
-          img_suffix = getTGSI(img_suffix)
-          img_suffix = getNDVIRED(img_suffix)
-          img_suffix = getVI700(img_suffix)
-          img_suffix = getIRECI(img_suffix)
-          img_suffix = getCIRE(img_suffix)
-          img_suffix = getTCARI(img_suffix)
-          img_suffix = getSFDVI(img_suffix)
-          img_suffix = getNDRE(img_suffix)
+          for indexFunction in indexFunctions:
+              img_suffix = indexFunction(img_suffix)
 
           # Re-attach the suffix to the newly calculated index bands to avoid name conflicts
           img_suffix = img_suffix.rename(img_suffix.bandNames().map(lambda b: ee.String(b).cat(f'_{suffix}')))
@@ -255,12 +217,8 @@ for obj in missing:
     # Apply the indices calculation function to the base mosaic 
     mosaic = apply_indices_all_suffixes(mosaic)
 
-    # Append the Google Embeddings and coordinate bands to the main mosaic
-    mosaic = mosaic.addBands(emb_mosaic).addBands(lat).addBands(lon_sin).addBands(lon_cos)
-
-    # Iterate through the geomorphology dictionary and append each band to the mosaic
-    for key in geomorpho:
-        mosaic = mosaic.addBands(geomorpho[key])
+    # Append the Google Embeddings, coordinate and geomorphology bands to the main mosaic
+    mosaic = mosaic.addBands(emb_mosaic).addBands(covariates.stack('coordinates', 'geomorpho'))
 
     # Store the fully assembled mosaic in the tracking dictionary
     mosaic_dict[year] = mosaic
@@ -306,7 +264,7 @@ for obj in missing:
     #     )
 
     # Filter the extracted collection to remove points that returned null values for any band
-    training_i = training_i.filter(ee.Filter.notNull(mosaic.bandNames()))
+    training_i = training_i.filter(ee.Filter.notNull(feature_schema.verify(mosaic)))
 
     # Export to Earth Engine
     task = ee.batch.Export.table.toAsset(
@@ -317,6 +275,7 @@ for obj in missing:
 
     # Submit the export task to the Earth Engine servers
     task.start()
+    launched += 1
     print ('------------> NEXT REGION --------->')
 
 print('✅ All tasks have been started. Now wait a few hours and have fun :)')
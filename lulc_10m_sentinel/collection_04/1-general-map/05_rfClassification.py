@@ -9,8 +9,6 @@
 import ee            # Import the Earth Engine API
 import math          # Import math for trigonometric functions
 import sys           # Import system-specific parameters and functions
-import os            # Import operating system functionalities
-import re            # Import regular expression operations for string parsing
 import itertools     # Import itertools for generating combinations
 
 # Authenticate the Earth Engine account (required in new environments)
@@ -20,46 +18,30 @@ ee.Authenticate()
 ee.Initialize(project = 'ee-ipam')
 
 ## Environment and Custom Module Setup
-# Define the repository URL containing the custom mapbiomas mosaic scripts
-REPO_URL = "https://github.com/costa-barbara/mapbiomas-mosaic.git"
+# Add the local copy of this repository to access the shared pipeline helpers
+sys.path.append("/content/brazil-cerrado")
+from pipeline.module_cache import SENTINEL_COMMIT, SENTINEL_HASH, load_modules
 
-# Define the local directory path to clone the repository into
-REPO_DIR = "/content/mapbiomas-mosaic-10m"
+# Load the 10 m branch of the MapBiomas mosaic helper modules from the local cache (cloned only when missing
+# or modified); copies of the modules imported earlier in the session are dropped
+load_modules('sentinel', commit=SENTINEL_COMMIT, expected_hash=SENTINEL_HASH)
 
-# Define the specific Git branch to be used
-BRANCH = "mapbiomas-mosaics-10m"
-
-# Iterate through loaded Python modules to remove previously cached custom modules
-for module_name in list(sys.modules.keys()):
-    if module_name == "modules" or module_name.startswith("modules."):
-        del sys.modules[module_name]
-
-# Remove any previous instances of the repository path from the system path
-sys.path = [p for p in sys.path if p != REPO_DIR]
-
-# Force remove the old local copy of the repository
-!rm -rf /content/mapbiomas-mosaic-10m
-
-# Clone the specific branch of the repository into the defined local folder
-!git clone --branch mapbiomas-mosaics-10m --single-branch https://github.com/costa-barbara/mapbiomas-mosaic.git /content/mapbiomas-mosaic-10m
-
-# Confirm the active branch in the cloned repository
-!git -C /content/mapbiomas-mosaic-10m branch --show-current
-!git -C /content/mapbiomas-mosaic-10m status
-!git -C /content/mapbiomas-mosaic-10m log -1 --oneline
-
-# Add the cloned repository directory to the top of the Python system path
-sys.path.insert(0, REPO_DIR)
-
-# Import custom spectral index functions from the downloaded module
+# Import custom spectral index functions from the cached modules
 from modules.SpectralIndexes import *
 
+# Import the shared pipeline helpers
+from pipeline.covariates import CovariateFactory
+from pipeline.manifest import AssetManifest
+from pipeline.metadata import prefetch_classes
+from pipeline.parameters import parameter
+from pipeline.schema import sentinel_general_schema
+
 ## Parameters and Asset Management
 # Define the input version for the training samples
-samples_version = '4'
+samples_version = parameter('samples_version', '4')
 
 # Define the output version for the final classification assets
-output_version  = '4'
+output_version  = parameter('output_version', '4')
 
 # Define the base output folder path for storing the classification assets in GEE
 output_asset = 'projects/ee-ipam/assets/MAPBIOMAS/LULC/CERRADO_DEV/COL_11/SENTINEL/C04_GENERAL-MAP-PROBABILITY/'
@@ -68,31 +50,33 @@ output_asset = 'projects/ee-ipam/assets/MAPBIOMAS/LULC/CERRADO_DEV/COL_11/SENTIN
 training_dir = 'projects/ee-ipam/assets/MAPBIOMAS/LULC/CERRADO_DEV/COL_11/SENTINEL/trainings/'
 
 # Define the list of years to be processed
-years = list(range(2017, 2026))
+years = parameter('years', list(range(2017, 2026)))
 
 # Load the Cerrado classification regions feature collection
 regions_vec = ee.FeatureCollection('projects/ee-ipam-cerrado/assets/ancillary/collection_11_classification_regions_vector')
 
 # Extract a sorted list of unique region IDs from the feature collection
-regions_list = sorted(regions_vec.aggregate_array('mapb').distinct().getInfo())
+regions_list = parameter('regions') or sorted(regions_vec.aggregate_array('mapb').distinct().getInfo())
 
-# Retrieve the list of all existing assets currently saved in the output directory
-files = ee.data.listAssets({'parent': output_asset})
+# Define the local file caching the listing of the output directory
+manifest_path = parameter('manifest_path', '/content/asset_manifest.sqlite')
 
-# Extract only the asset name strings from the API response
-files = [asset['name'] for asset in files['assets']]
+# Reuse a listing of the output folder younger than this many seconds (set by the command line runner,
+# which lists the folder once for all of its jobs); None lists it on every run
+manifest_max_age = parameter('manifest_max_age')
 
-# Strip the legacy prefix from the asset names to standardize the format for comparison
-files = [file.replace('projects/earthengine-legacy/assets/', '') for file in files]
+# Refresh the local manifest of existing assets (paginated folder listing)
+manifest = AssetManifest(manifest_path)
+manifest.refresh(output_asset, max_age=manifest_max_age)
 
-# Generate a comprehensive list of all expected output asset names
-expected = [
-    f"{output_asset}CERRADO_{region}_{year}_v{output_version}"
+# Generate all expected output asset names keyed by (region, year)
+expected = {
+    (region, year): f"{output_asset}CERRADO_{region}_{year}_v{output_version}"
     for region, year in itertools.product(regions_list, years)
-]
+}
 
-# Compare expected assets against existing files to identify only the missing tasks
-missing = [entry for entry in expected if entry not in files]
+# Compare expected assets against the manifest to identify the missing years of each region
+missing_by_region = manifest.missing_by_region(output_asset, expected)
 
 # Define a dictionary mapping numeric class IDs to descriptive labels
 classDict = {
@@ -116,12 +100,56 @@ biomes = ['CERRADO'];
 # Initialize an empty dictionary to temporarily store computed mosaics by year
 mosaic_dict = {}
 
+# Define a helper function to load the training samples of a region and year
+def getTraining(region, year):
+    return ee.FeatureCollection(training_dir + f'v{samples_version}/train_col04_reg{region}_{year}_v{samples_version}')
+
+# Construct a dictionary containing Geomorpho90m topographic covariates and MERIT DEM
+# Source: Amatulli et al. 2019 - https://www.nature.com/articles/s41597-020-0479-6
+geomorpho = {
+    'dem': ee.Image('MERIT/DEM/v1_0_3').select('dem').toInt64().rename('merit_dem'),
+    'aspect': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/aspect").mosaic().multiply(10000).round().rename('aspect').toInt64(),
+    'convergence': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/convergence").mosaic().multiply(10000).round().rename('convergence').toInt64(),
+    'pcurv': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/pcurv").mosaic().multiply(10000).round().rename('pcurv').toInt64(),
+    'tcurv': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/tcurv").mosaic().multiply(10000).round().rename('tcurv').toInt64(),
+    'roughness': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/roughness").mosaic().multiply(10000).round().rename('roughness').toInt64(),
+    'eastness': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/eastness").mosaic().multiply(10000).round().rename('eastness').toInt64(),
+    'northness': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/northness").mosaic().multiply(10000).round().rename('northness').toInt64(),
+    'dxx': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/dxx").mosaic().multiply(10000).round().rename('dxx').toInt64(),
+    'cti': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/cti").mosaic().multiply(10000).round().rename('cti').toInt64(),
+}
+
+# Define the spectral index functions applied to each temporal aggregate of the Sentinel mosaic, in order
+indexFunctions = [
+    getNDVI, getMNDWI, getPRI, getCAI, getEVI2, getGCVI, getGRND,
+    getMSI, getGARI, getGNDVI, getMSAVI, getHallCover, getHallHeigth,
+    getTGSI, getNDVIRED, getVI700, getIRECI, getCIRE, getTCARI, getSFDVI, getNDRE
+]
+
+# Derive the mosaic band schema locally from the feature stack (verified against the server on the first task)
+feature_schema = sentinel_general_schema(indexFunctions, geomorpho)
+
+# Static covariates (coordinates, geomorpho) built once per process and clipped with the final mosaic
+covariates = CovariateFactory(geomorpho)
+
 ## Main Processing Loop
+# Region-years whose export tasks were started (reported to the command line runner)
+launched = 0
+
 # Iterate over each region ID in the extracted list
 for region in regions_list:
     # Print a status message indicating the current region being processed
     print(f'Processing region: {region}')
 
+    # Look up which years are missing for the current region
+    missing_i = missing_by_region.get(region, [])
+
+    if len(missing_i) == 0:
+        print(f'Region {region}: all assets already exist. Skipping region.')
+        continue
+
+    print('Missing assets in region:', len(missing_i))
+
     # Filter the regions feature collection to isolate the current region
     region_i_fc = regions_vec.filter(ee.Filter.eq('mapb', int(region)))
 
@@ -131,36 +159,15 @@ for region in regions_list:
     # Create a binary raster mask derived exactly from the bounded geometry
     region_i_mask = ee.Image.constant(1).clip(region_i_geom).selfMask()
 
-    ## Covariates and Coordinates
-    # Extract pixel latitude and longitude coordinates
-    geo_coordinates = ee.Image.pixelLonLat().clip(region_i_geom)
-
-    # Compute auxiliary coordinates
-    coords = ee.Image.pixelLonLat().clip(region_i_geom)
-    lat = coords.select('latitude').add(5).multiply(-1).multiply(1000).toInt16()
-    lon_sin = coords.select('longitude').multiply(math.pi).divide(180).sin().multiply(-1).multiply(10000).toInt16().rename('longitude_sin')
-    lon_cos = coords.select('longitude').multiply(math.pi).divide(180).cos().multiply(-1).multiply(10000).toInt16().rename('longitude_cos')
-
-    # Construct a dictionary containing Geomorpho90m topographic covariates and MERIT DEM
-    # Source: Amatulli et al. 2019 - https://www.nature.com/articles/s41597-020-0479-6
-    geomorpho = {
-        'dem': ee.Image('MERIT/DEM/v1_0_3').select('dem').toInt64().rename('merit_dem'),
-        'aspect': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/aspect").mosaic().multiply(10000).round().rename('aspect').toInt64(),
-        'convergence': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/convergence").mosaic().multiply(10000).round().rename('convergence').toInt64(),
-        'pcurv': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/pcurv").mosaic().multiply(10000).round().rename('pcurv').toInt64(),
-        'tcurv': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/tcurv").mosaic().multiply(10000).round().rename('tcurv').toInt64(),
-        'roughness': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/roughness").mosaic().multiply(10000).round().rename('roughness').toInt64(),
-        'eastness': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/eastness").mosaic().multiply(10000).round().rename('eastness').toInt64(),
-        'northness': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/northness").mosaic().multiply(10000).round().rename('northness').toInt64(),
-        'dxx': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/dxx").mosaic().multiply(10000).round().rename('dxx').toInt64(),
-        'cti': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/cti").mosaic().multiply(10000).round().rename('cti').toInt64(),
-    }
-
-    # Identify exactly which expected output files are missing for the current region
-    missing_i = [item for item in missing if re.search(rf"CERRADO_{region}_[0-9]{{4}}_v{output_version}$", item)]
-
-    # Iterate through the list of years to reconstruct the mosaic and classify
-    for year in years:
+    # Fetch the class lists of all missing years of the current region in a single request
+    classes_by_year = prefetch_classes(
+        years=missing_i,
+        collection_for=lambda y: getTraining(region, y),
+        property='reference'
+    )
+
+    # Iterate through the missing years to reconstruct the mosaic and classify
+    for year in missing_i:
         # Print a sub-status message indicating the current year
         print(f'----> Processing: {year}')
 
@@ -226,27 +233,8 @@ for region in regions_list:
               img_suffix = rename_bands_for_suffix(image, suffix)
 
               # Apply all custom spectral index functions imported from the MapBiomas module
-              img_suffix = getNDVI(img_suffix)
-              img_suffix = getMNDWI(img_suffix)
-              img_suffix = getPRI(img_suffix)
-              img_suffix = getCAI(img_suffix)
-              img_suffix = getEVI2(img_suffix)
-              img_suffix = getGCVI(img_suffix)
-              img_suffix = getGRND(img_suffix)
-              img_suffix = getMSI(img_suffix)
-              img_suffix = getGARI(img_suffix)
-              img_suffix = getGNDVI(img_suffix)
-              img_suffix = getMSAVI(img_suffix)
-              img_suffix = getHallCover(img_suffix)
-              img_suffix = getHallHeigth(img_suffix)
-              img_suffix = getTGSI(img_suffix)
-              img_suffix = getNDVIRED(img_suffix)
-              img_suffix = getVI700(img_suffix)
-              img_suffix = getIRECI(img_suffix)
-              img_suffix = getCIRE(img_suffix)
-              img_suffix = getTCARI(img_suffix)
-              img_suffix = getSFDVI(img_suffix)
-              img_suffix = getNDRE(img_suffix)
+              for indexFunction in indexFunctions:
+                  img_suffix = indexFunction(img_suffix)
 
               # Re-attach the suffix to the newly calculated index bands to avoid name conflicts
               img_suffix = img_suffix.rename(img_suffix.bandNames().map(lambda b: ee.String(b).cat(f'_{suffix}')))
@@ -258,12 +246,8 @@ for region in regions_list:
         # Apply the indices calculation function to the base mosaic
         mosaic = apply_indices_all_suffixes(mosaic)
 
-        # Append the Google Embeddings and coordinate bands to the main mosaic
-        mosaic = mosaic.addBands(emb_mosaic).addBands(lat).addBands(lon_sin).addBands(lon_cos)
-
-        # Iterate through the geomorphology dictionary and append each band to the mosaic
-        for key in geomorpho:
-            mosaic = mosaic.addBands(geomorpho[key])
+        # Append the Google Embeddings, coordinate and geomorphology bands to the main mosaic
+        mosaic = mosaic.addBands(emb_mosaic).addBands(covariates.stack('coordinates', 'geomorpho'))
 
         # Store the fully assembled mosaic in the tracking dictionary
         mosaic_dict[year] = mosaic
@@ -279,11 +263,11 @@ for region in regions_list:
 
         ## Random Forest Training and Classification
         # Load the specific training samples feature collection for the current region and year
-        training_ij = ee.FeatureCollection(training_dir + f'v{samples_version}/train_col04_reg{region}_{year}_v{samples_version}')\
+        training_ij = getTraining(region, year)
 
-        # Extract the list of all band names present in the mosaic to serve as predictors
-        bandNames_list = mosaic.bandNames().getInfo()
-        print("Total bands:", mosaic.bandNames().size().getInfo())
+        # Get the list of all band names present in the mosaic to serve as predictors (verified once per run)
+        bandNames_list = feature_schema.verify(mosaic)
+        print("Total bands:", len(bandNames_list))
 
         # Initialize the SmileRandomForest classifier requesting MULTIPROBABILITY output
         classifier = ee.Classifier.smileRandomForest(
@@ -298,8 +282,8 @@ for region in regions_list:
         predicted = mosaic.classify(classifier).updateMask(region_i_mask)
 
         ## Probability Flattening and Discrete Class Mapping
-        # Retrieve an ordered list of all unique class IDs present in the training data
-        classes = sorted(training_ij.aggregate_array('reference').distinct().getInfo())
+        # Retrieve the ordered list of unique class IDs present in the training data (prefetched per region)
+        classes = classes_by_year[year]
 
         # Flatten the multiprobability array output into individual bands named after the numeric class IDs
         probabilities = predicted.arrayFlatten([list(map(str, classes))])
@@ -351,6 +335,7 @@ for region in regions_list:
 
         # Submit the classification export task to the Earth Engine servers
         task.start()
+        launched += 1
 
     print ('------------> NEXT REGION --------->')
 
@@ -7,7 +7,7 @@
 
 ## Initialization and Imports
 import ee            # Import the Earth Engine API
-import math          # Import math for trigonometric functions
+import sys           # Import system-specific parameters and functions
 
 # Authenticate the Earth Engine account (required in new environments)
 ee.Authenticate()
@@ -15,18 +15,24 @@ ee.Authenticate()
 # Initialize the Earth Engine session with the specified project
 ee.Initialize(project = 'ee-ipam')
 
+# Add the local copy of this repository to access the shared pipeline helpers
+sys.path.append("/content/brazil-cerrado")
+from pipeline.covariates import CovariateFactory
+from pipeline.parameters import parameter
+from pipeline.schema import sentinel_rocky_schema
+
 ## Parameters and Asset Paths
 # Define the input version for the sample points
-version_in = '1'
+version_in = parameter('version_in', '1')
 
 # Define the output version for the generated training data
-version_out = '1'
+version_out = parameter('version_out', '1')
 
 # Define the base output folder path for storing the generated training assets in GEE
 dirout = f'projects/ee-barbarasilvaipam/assets/collection-04_rocky-outcrop/trainings/v{version_out}/'
 
 # Define the list of years to be processed
-years = list(range(2017, 2026))
+years = parameter('years', list(range(2017, 2026)))
 
 # Define the Earth Engine asset ID for the Google Satellite Embedding dataset
 # Source: https://developers.google.com/earth-engine/datasets/catalog/GOOGLE_SATELLITE_EMBEDDING_V1_ANNUAL?hl=pt-br
@@ -78,20 +84,21 @@ def asset_exists(asset_id):
         print(f"Error checking asset: {e}")
         return False
 
+# Mosaic band schema derived locally from the feature stack (verified against the server on the first task)
+feature_schema = sentinel_rocky_schema(geomorpho)
+
+# Static covariates (coordinates, geomorpho) built once per process and clipped with the final mosaic
+covariates = CovariateFactory(geomorpho)
+
 ## Main Processing Loop
+# Region-years whose export tasks were started (reported to the command line runner)
+launched = 0
+
 # Iterate over each year defined in the processing list
 for year in years:
     # Print a status message indicating the current year
     print(f"--> Processing year: {year}")
 
-    # Extract pixel latitude and longitude coordinates
-    coords = ee.Image.pixelLonLat().clip(aoi_vec)
-
-    lat = coords.select('latitude').add(5).multiply(-1).multiply(1000).toInt16()
-    lon_sin = coords.select('longitude').multiply(math.pi).divide(180).sin().multiply(-1).multiply(10000).toInt16().rename('longitude_sin')
-    lon_cos = coords.select('longitude').multiply(math.pi).divide(180).cos().multiply(-1).multiply(10000).toInt16().rename('longitude_cos')
-
-
     ## Mosaic Assembly 
 
     # Define the start date based on the current iteration year
@@ -106,12 +113,8 @@ for year in years:
     # Assign the embedded mosaic as the base image for the final composition
     mosaic = collection
 
-    # Append the processed geographic coordinate bands to the mosaic
-    mosaic = mosaic.addBands(lat).addBands(lon_sin).addBands(lon_cos)
-    
-    # Iterate through the geomorphology dictionary and append each topographic band to the mosaic
-    for key in geomorpho:
-        mosaic = mosaic.addBands(geomorpho[key])
+    # Append the coordinate and topographic bands to the mosaic
+    mosaic = mosaic.addBands(covariates.stack('coordinates', 'geomorpho'))
 
     # Store the assembled multi-band composite in the tracking dictionary
     mosaic_dict[year] = mosaic
@@ -143,7 +146,7 @@ for year in years:
     print('Number of training points: ' + str(training_samples.size().getInfo()))
 
     # Filter the extracted collection to strictly remove points that returned null values for any band
-    training_i = training_i.filter(ee.Filter.notNull(mosaic.bandNames().getInfo()))
+    training_i = training_i.filter(ee.Filter.notNull(feature_schema.verify(mosaic)))
 
     # Construct the exact expected asset ID for the current year's export
     asset_id = f'{dirout}train_col04_rocky_{year}_v{version_out}'
@@ -162,6 +165,7 @@ for year in years:
 
     # Submit the export task to the Earth Engine servers
     task.start()
+    launched += 1
     
     print('============================================')
 
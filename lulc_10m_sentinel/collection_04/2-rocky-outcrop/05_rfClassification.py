@@ -8,6 +8,7 @@
 ## Initialization and Imports
 import ee            # Import the Earth Engine API
 import math          # Import math for trigonometric functions
+import sys           # Import system-specific parameters and functions
 
 # Authenticate the Earth Engine account (required in new environments)
 ee.Authenticate()
@@ -15,18 +16,24 @@ ee.Authenticate()
 # Initialize the Earth Engine session with the specified project
 ee.Initialize(project = 'ee-barbarasilvaipam')
 
+# Add the local copy of this repository to access the shared pipeline helpers
+sys.path.append("/content/brazil-cerrado")
+from pipeline.covariates import CovariateFactory
+from pipeline.parameters import parameter
+from pipeline.schema import sentinel_rocky_schema
+
 ## Parameters and Asset Management
 # Define the input version for the training samples
-samples_version = '1'
+samples_version = parameter('samples_version', '1')
 
 # Define the output version for the final classification assets
-output_version  = '1'
+output_version  = parameter('output_version', '1')
 
 # Define the base output folder path for storing the classification assets in GEE
 output_asset = 'projects/ee-ipam/assets/MAPBIOMAS/LULC/CERRADO_DEV/COL_11/SENTINEL/C04_ROCKY-GENERAL-MAP-PROBABILITY/'
 
 # Define the list of years to be processed
-years = list(range(2017, 2026))
+years = parameter('years', list(range(2017, 2026)))
 
 # Define a dictionary mapping numeric class IDs to descriptive labels for the probability bands
 classDict = {
@@ -70,19 +77,21 @@ geomorpho = {
 # Initialize an empty dictionary to temporarily store computed mosaics by year
 mosaic_dict = {}
 
+# Mosaic band schema derived locally from the feature stack (verified against the server on the first task)
+feature_schema = sentinel_rocky_schema(geomorpho)
+
+# Static covariates (coordinates, geomorpho) built once per process and clipped with the final mosaic
+covariates = CovariateFactory(geomorpho)
+
 ## Main Processing Loop
+# Region-years whose export tasks were started (reported to the command line runner)
+launched = 0
+
 # Iterate over each year defined in the processing list
 for year in years:
     # Print a status message indicating the current year
     print(f"--> Processing year: {year}")
 
-    # Extract pixel latitude and longitude coordinates
-    coords = ee.Image.pixelLonLat().clip(aoi_vec)
-    lat = coords.select('latitude').add(5).multiply(-1).multiply(1000).toInt16()
-    lon_sin = coords.select('longitude').multiply(math.pi).divide(180).sin().multiply(-1).multiply(10000).toInt16().rename('longitude_sin')
-    lon_cos = coords.select('longitude').multiply(math.pi).divide(180).cos().multiply(-1).multiply(10000).toInt16().rename('longitude_cos')
-
-
     ## Mosaic Assembly
 
     # Define the start date based on the current iteration year
@@ -97,12 +106,8 @@ for year in years:
     # Assign the embedded mosaic as the base image for classification
     mosaic = collection
 
-    # Append the processed geographic coordinate bands to the mosaic
-    mosaic = mosaic.addBands(lat).addBands(lon_sin).addBands(lon_cos)
-    
-    # Iterate through the geomorphology dictionary and append each topographic band to the mosaic
-    for key in geomorpho:
-        mosaic = mosaic.addBands(geomorpho[key])
+    # Append the coordinate and topographic bands to the mosaic
+    mosaic = mosaic.addBands(covariates.stack('coordinates', 'geomorpho'))
 
     # Store the assembled multi-band composite in the tracking dictionary
     mosaic_dict[year] = mosaic
@@ -124,11 +129,11 @@ for year in years:
     # Load the training samples feature collection
     training = ee.FeatureCollection(training_path)
 
-    # Extract the list of all band names present in the mosaic to serve as predictors
-    band_names = mosaic.bandNames().getInfo()
+    # Get the list of all band names present in the mosaic to serve as predictors (verified once per run)
+    band_names = feature_schema.verify(mosaic)
     
     # Print diagnostic information regarding the predictor bands
-    print("Total bands:", mosaic.bandNames().size().getInfo())
+    print("Total bands:", len(band_names))
 
     # Initialize the SmileRandomForest classifier requesting MULTIPROBABILITY output
     classifier = ee.Classifier.smileRandomForest(
@@ -189,5 +194,6 @@ for year in years:
     
     # Submit the classification export task to the Earth Engine servers
     task.start()
+    launched += 1
 
 print('✅ All classification export tasks started. Now wait a few hours and have fun :)')
@@ -9,11 +9,7 @@
 
 ## Initialization and Imports
 import ee            # Import the Earth Engine API
-import math          # Import math for trigonometric functions
-import pandas as pd  # Import pandas for data manipulation 
 import sys           # Import system-specific parameters and functions
-import os            # Import operating system functionalities
-import re            # Import regular expression operations for string parsing
 
 
 # Authenticate the Earth Engine account (required in new environments)
@@ -22,10 +18,12 @@ ee.Authenticate()
 # Initialize the Earth Engine session with the specified project
 ee.Initialize(project = 'ee-ipam')
 
-# Clone the MapBiomas GitHub repository to access custom helper functions
-!rm -rf /content/mapbiomas-mosaic
-!git clone https://github.com/costa-barbara/mapbiomas-mosaic.git
-sys.path.append("/content/mapbiomas-mosaic")
+# Add the local copy of this repository to access the shared pipeline helpers
+sys.path.append("/content/brazil-cerrado")
+from pipeline.module_cache import LANDSAT_COMMIT, LANDSAT_HASH, load_modules
+
+# Load the MapBiomas mosaic helper modules from the local cache (cloned only when missing or modified)
+load_modules('landsat', commit=LANDSAT_COMMIT, expected_hash=LANDSAT_HASH)
 
 # Import custom MapBiomas modules for mosaicking and spectral metrics
 from modules.SpectralIndexes import *
@@ -33,47 +31,80 @@ from modules.Miscellaneous import *
 from modules.Mosaic import *
 from modules.SmaAndNdfi import *
 from modules.ThreeYearMetrics import *
-from modules import Map
+
+# Import the shared pipeline helpers
+from pipeline.covariates import CovariateFactory
+from pipeline.manifest import AssetManifest
+from pipeline.monitor import TaskMonitor, escalate_tile_scale, reduce_fraction
+from pipeline.parameters import parameter
+from pipeline.plan import LaunchPlan
+from pipeline.scheduler import CostModel, region_areas, sample_counts
+from pipeline.schema import landsat_general_schema
+from pipeline.three_year import ThreeYearWindow, plan_years
 
 ## Parameters and Asset Management
 # Define the input version for the sample points
-version_in = '14'
+version_in = parameter('version_in', '14')
 
 # Define the output version for the generated training data
-version_out  = '17'
+version_out  = parameter('version_out', '17')
 
 # Define output folder path
 dirout = f'projects/mapbiomas-brazil/assets/LAND-COVER/COLLECTION-11/GENERAL/SAMPLES/CERRADO/v{version_out}/'
 
 # Define the range of years to be processed
-years = list(range(1985, 2026))
+years = parameter('years', list(range(1985, 2026)))
 
 # Define the list of regions to be processed
-regions = list(range(1, 39))
+regions = parameter('regions', list(range(1, 39)))
 
 # Regions requiring sample reduction to prevent memory/computation limits in GEE
 reduced_regions = [8, 10, 14, 15, 20, 21, 29, 32]
 
-# List existing assets in the output folder
-files = ee.data.listAssets({'parent': dirout})
-files = [asset['name'] for asset in files['assets']]
+# Local file caching the listing of the output folder
+manifest_path = parameter('manifest_path', '/content/asset_manifest.sqlite')
+
+# Reuse a listing of the output folder younger than this many seconds (set by the command line runner,
+# which lists the folder once for all of its jobs); None lists it on every run
+manifest_max_age = parameter('manifest_max_age')
+
+# Local file recording the started tasks and their outcomes
+monitor_path = parameter('monitor_path', '/content/task_monitor.sqlite')
+
+# Local file with the recorded task durations used to predict the cost of each region-year
+cost_model_path = parameter('cost_model_path', '/content/task_costs.sqlite')
+
+# Wait for the exports and retry failed region-years (escalated tileScale, fewer samples) before exiting
+monitor_tasks = parameter('monitor_tasks', False)
+
+# Attempts per region-year and total number of retries allowed in a run
+max_attempts = parameter('max_attempts', 3)
+retry_budget = parameter('retry_budget', 50)
+
+# Plan mode: print the task counts, bands, samples, graph sizes and estimated cost without submitting anything
+plan_launch = parameter('plan', False)
+
+# Number of region-years whose task graphs are built and profiled in plan mode
+plan_graph_samples = 3
 
-# Remove the prefix from asset names
-files = [file.replace('projects/earthengine-legacy/assets/', '') for file in files]
+# Refresh the local manifest of existing assets (paginated folder listing)
+manifest = AssetManifest(manifest_path)
+manifest.refresh(dirout, max_age=manifest_max_age)
 
-# Generate expected asset list
-expected = [
-    (
+# Generate expected asset list, keyed by (region, year)
+expected = {
+    (region, year): (
         f'projects/mapbiomas-brazil/assets/LAND-COVER/COLLECTION-11/GENERAL/SAMPLES/CERRADO/v{version_out}/'
         f'train_col11_reg{region}_{year}_v{version_out}'
     )
     for region in regions
     for year in years
-]
+}
+
+# Identify missing years per region
+missing_by_region = manifest.missing_by_region(dirout, expected)
 
-# Identify missing assets
-missing = [entry for entry in expected if entry not in files]
-missing_set = set(missing)
+print('Total missing assets:', sum(len(y) for y in missing_by_region.values()))
 
 # Load biome layer raster data
 biomes = ee.Image('projects/mapbiomas-workspace/AUXILIAR/biomas-2019-raster')
@@ -115,6 +146,20 @@ geomorpho = {
     'cti': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/cti").mosaic().rename('cti').toInt64(),
 }
 
+# Fraction-based and selected spectral indices applied to the Landsat collection, in order
+indexFunctions = [
+    getNDFI, getSEFI, getWEFI, getFNS,
+    getNDVI, getNBR, getMNDWI, getPRI, getCAI, getEVI2,
+    getGCVI, getGRND, getMSI, getGARI, getGNDVI, getMSAVI,
+    getHallCover, getHallHeigth
+]
+
+# Mosaic band schema derived locally from the feature stack (verified against the server on the first task)
+feature_schema = landsat_general_schema(['getFractions'] + indexFunctions, geomorpho)
+
+# Static covariates (coordinates, HAND, geomorpho) built once per process and clipped with the final mosaic
+covariates = CovariateFactory(geomorpho)
+
 ## Helper Functions
 # Assigns the correct training sample points asset based on the processing year.
 def get_sample_asset_by_year(year):
@@ -146,15 +191,10 @@ def buildAnnualMosaic(year, region_i):
         .copyProperties(image, ['system:time_start', 'system:time_end'])
     )
 
-    # Apply Spectral Mixture Analysis and indices
+    # Apply Spectral Mixture Analysis, fraction-based and selected spectral indices
     collection = collection.map(lambda image: getFractions(image, endmembers))
-    collection = collection.map(getNDFI).map(getSEFI).map(getWEFI).map(getFNS)
-
-    # Selected spectral indices
-    collection = collection\
-        .map(getNDVI).map(getNBR).map(getMNDWI).map(getPRI).map(getCAI).map(getEVI2)\
-        .map(getGCVI).map(getGRND).map(getMSI).map(getGARI).map(getGNDVI).map(getMSAVI)\
-        .map(getHallCover).map(getHallHeigth)
+    for indexFunction in indexFunctions:
+        collection = collection.map(indexFunction)
 
     # Build the final reduced mosaic using percentile combinations
     # NDVI is used as the target band for dry/wet seasonal percentiles
@@ -171,132 +211,184 @@ def buildAnnualMosaic(year, region_i):
 
     return mosaic
 
-# Keeps only the two previous years required for trailing three-year metrics
-# Manages memory for trailing three-year metrics by removing years older than (current_year - 2) 
-def cleanThreeYearDict(mosaic_dict_3yr, year):
-    # Identify keys (years) that fall outside the 3-year trailing window
-    years_to_remove = [
-        y for y in mosaic_dict_3yr.keys()
-        if y < year - 2]
-    
-    # Delete the obsolete years from the dictionary
-    for y in years_to_remove:
-        del mosaic_dict_3yr[y]
+# Builds the annual mosaic with its structural context (input of the trailing three-year metrics)
+def buildContextMosaic(year, region_i):
+    mosaic = buildAnnualMosaic(
+        year=year,
+        region_i=region_i
+    )
+
+    return getStructuralContext(mosaic)
 
-    return mosaic_dict_3yr
+# Per-region geometry and lazy three-year window, shared by the first attempts and the retries
+region_context = {}
 
-## Main Processing Loop
-# Iterate over each unique classification region
-for region_list in regions:
-    # Check if region is fully processed
-    region_missing = [
-        asset for asset in missing
-        if f'_reg{region_list}_' in asset
-    ]
-
-    if len(region_missing) == 0:
-        print(f'Region {region_list}: all assets already exist. Skipping region.')
-        continue
-
-    print('--------------------------------')
-    print('Processing region [', region_list, ']')
-    print('Missing assets in region:', len(region_missing))
-
-    # Filter spatial geometry
-    region_i = regionsCollection.filterMetadata('mapb','equals',region_list).geometry()
-    region_fc = regionsCollection.filterMetadata('mapb','equals',region_list)
-    region_i_img = ee.Image('projects/barbaracosta-ipam/assets/base/CERRADO_CLASSIFICATION_REGIONS').eq(region_list).selfMask()
-
-    # Extract pixel latitude and longitude coordinates
-    coords = ee.Image.pixelLonLat().clip(region_i)
-
-    # Compute auxiliary coordinates
-    coords = ee.Image.pixelLonLat().clip(region_i)
-    lat = coords.select('latitude').add(5).multiply(-1).multiply(1000).toInt16().rename('latitude')
-    lon_sin = coords.select('longitude').multiply(math.pi).divide(180).sin().multiply(-1).multiply(10000).toInt16().rename('longitude_sin')
-    lon_cos = coords.select('longitude').multiply(math.pi).divide(180).cos().multiply(-1).multiply(10000).toInt16().rename('longitude_cos')
-    hand = ee.ImageCollection("users/gena/global-hand/hand-100").mosaic().toInt16().clip(region_i).rename('hand')
-
-    # Reduced dictionary for trailing 3-year metrics
-    mosaic_dict_3yr = {}
-
-    # Iterate over each year
-    for year in years:
-        asset_id = (dirout +'train_col11_reg' + str(region_list) + '_' + str(year) + '_v' + version_out)
-        print('Processing year [', year, ']')
-
-        # Build Base Mosaic & Context Metrics
-        mosaic = buildAnnualMosaic(
-            year=year,
-            region_i=region_i
+def getRegionContext(region_list):
+    if region_list not in region_context:
+        # Filter spatial geometry
+        region_i = regionsCollection.filterMetadata('mapb','equals',region_list).geometry()
+        region_fc = regionsCollection.filterMetadata('mapb','equals',region_list)
+
+        # Lazy trailing 3-year window: builds only the mosaics of missing years and of their two previous years
+        window = ThreeYearWindow(
+            build=lambda y: buildContextMosaic(year=y, region_i=region_i),
+            reduce=getThreeYearReducedImage,
+            years=years
         )
+        region_context[region_list] = (region_i, region_fc, window)
 
-        mosaic = getStructuralContext(mosaic)
+    return region_context[region_list]
 
-        # Add trailing three-year temporal metrics
-        mosaic = addThreeYearMetrics(
-            year=year,
-            mosaic=mosaic,
-            mosaic_dict_3yr=mosaic_dict_3yr
-        )
+# Fraction of the sample points kept on the first attempt
+def baseSampleFraction(region_list):
+    return 0.70 if region_list in reduced_regions else 1.0
 
-        # Store reduced annual image for subsequent years only
-        mosaic_dict_3yr[year] = getThreeYearReducedImage(mosaic)
-        mosaic_dict_3yr = cleanThreeYearDict(mosaic_dict_3yr, year)
-
-        # Skip export if asset already exists (but we had to process the image for the 3-year temporal lag)
-        if asset_id not in missing_set:
-            print('Asset already exists. Temporal image stored, export skipped.')
-            continue
-
-        # Append the Coordinates bands and other ancillary to the main mosaic
-        mosaic = getSlope(mosaic)
-
-        mosaic = mosaic.addBands(lat).addBands(lon_sin).addBands(lon_cos).addBands(hand) \
-                        .addBands(fire_age.select(f'classification_{year}').rename('fire_age').clip(region_i))
-
-        # Iterate through the geomorphology dictionary and append each band to the mosaic
-        for key in geomorpho:
-            mosaic = mosaic.addBands(geomorpho[key])
-
-        # Final Formatting
-        mosaic = mosaic.multiply(100).round().toInt32()
-        mosaic = mosaic.addBands(ee.Image(year).int16().rename('year'))
-        mosaic = mosaic.clip(region_i)
-
-        ## Sampling and Export
-        # Extract Feature Space from Points
-        samples = ee.FeatureCollection(get_sample_asset_by_year(year))
-        training_samples = samples.filterBounds(region_fc)
-
-        # Sample reduction for large/problematic regions
-        if region_list in reduced_regions:
-            training_samples = training_samples.randomColumn("random")
-            training_samples = training_samples.filter(
-                ee.Filter.lt("random", 0.70)
-            )
-
-        # Extract the mosaic pixel values at the locations of the training points
-        training_i = mosaic.sampleRegions(
-            collection = training_samples,
-            scale = 30,
-            geometries = True,
-            tileScale = 8
-        )
+# Builds the feature stack (mosaic, metrics and covariates) of one region-year
+def buildFeatureStack(region_list, year):
+    region_i, _, window = getRegionContext(region_list)
 
-        # Filter the extracted collection to remove points that returned null values for any band
-        band_names = mosaic.bandNames().getInfo()
-        training_i = training_i.filter(ee.Filter.notNull(band_names))
+    # Build Base Mosaic & Context Metrics (memoized by the window)
+    mosaic = window.mosaic(year)
 
-        # Export to Earth Engine
-        task = ee.batch.Export.table.toAsset(
-            collection=training_i,
-            description=('train_col11_reg' + str(region_list) + '_' + str(year) + '_v' + version_out),
-            assetId=asset_id
+    # Add trailing three-year temporal metrics
+    mosaic = addThreeYearMetrics(
+        year=year,
+        mosaic=mosaic,
+        mosaic_dict_3yr=window.previous(year)
+    )
+
+    # Append the Coordinates bands and other ancillary to the main mosaic
+    mosaic = getSlope(mosaic)
+
+    mosaic = mosaic.addBands(covariates.stack('coordinates', 'hand')) \
+                    .addBands(fire_age.select(f'classification_{year}').rename('fire_age'))
+
+    # Append the geomorphology stack (the mosaic is clipped once below)
+    mosaic = mosaic.addBands(covariates.geomorpho())
+
+    # Final Formatting
+    mosaic = mosaic.multiply(100).round().toInt32()
+    mosaic = mosaic.addBands(ee.Image(year).int16().rename('year'))
+    return mosaic.clip(region_i)
+
+# Builds the training-sample export task of one region-year.
+# Retries (attempt > 1) escalate the tileScale and sample a smaller fraction of the points.
+def buildTrainingTask(region_list, year, attempt=1):
+    _, region_fc, _ = getRegionContext(region_list)
+    asset_id = (dirout +'train_col11_reg' + str(region_list) + '_' + str(year) + '_v' + version_out)
+    mosaic = buildFeatureStack(region_list, year)
+
+    ## Sampling and Export
+    # Extract Feature Space from Points
+    samples = ee.FeatureCollection(get_sample_asset_by_year(year))
+    training_samples = samples.filterBounds(region_fc)
+
+    # Sample reduction for large/problematic regions, reduced further on each retry
+    sample_fraction = reduce_fraction(baseSampleFraction(region_list), attempt)
+    if sample_fraction < 1:
+        training_samples = training_samples.randomColumn("random")
+        training_samples = training_samples.filter(
+            ee.Filter.lt("random", sample_fraction)
         )
 
-        # Submit the export task to the Earth Engine servers
-        task.start()
-        print('------------> NEXT YEAR --------->')
+    # Extract the mosaic pixel values at the locations of the training points
+    training_i = mosaic.sampleRegions(
+        collection = training_samples,
+        scale = 30,
+        geometries = True,
+        tileScale = escalate_tile_scale(8, attempt)
+    )
+
+    # Filter the extracted collection to remove points that returned null values for any band
+    band_names = feature_schema.verify(mosaic)
+    training_i = training_i.filter(ee.Filter.notNull(band_names))
 
-print('✅ All tasks have been started. Now wait a few hours and have fun :)')
+    # Export to Earth Engine
+    return ee.batch.Export.table.toAsset(
+        collection=training_i,
+        description=('train_col11_reg' + str(region_list) + '_' + str(year) + '_v' + version_out),
+        assetId=asset_id
+    )
+
+# Track the started tasks locally and resubmit the failed region-years with escalated settings
+monitor = TaskMonitor(
+    monitor_path,
+    run=f'train_v{version_out}',
+    rebuild=lambda key, attempt: buildTrainingTask(*key, attempt=attempt),
+    max_attempts=max_attempts,
+    retry_budget=retry_budget
+)
+
+## Cost-weighted Scheduling
+# List the missing region-years
+jobs = [(region, year) for region in regions for year in missing_by_region.get(region, [])]
+print('Region-years to process:', len(jobs))
+print('Mosaics to build:', sum(len(plan_years(missing_by_region.get(region, []), years)) for region in regions))
+
+# Predict the cost of each region-year from the region area, its sample count and the band count
+cost_model = CostModel(cost_model_path)
+features = {}
+
+# Check the feature schema against the server on the first region-year (the tasks reuse the result),
+# so the costs and the plan use the band count the tasks will sample
+if jobs:
+    feature_schema.verify(buildFeatureStack(*jobs[0]))
+band_count = len(feature_schema.bands())
+
+if jobs:
+    # Fetched once per run and shared with the other jobs through the cost model file
+    region_area = region_areas(regionsCollection, 'mapb', cache=cost_model)
+    point_counts = sample_counts(
+        sorted(set(sample_assets_by_period.values())), regionsCollection, 'mapb', cache=cost_model
+    )
+
+    features = {
+        (region, year): {
+            'area': region_area.get(region, 0),
+            'samples': point_counts[get_sample_asset_by_year(year)].get(region, 0) * baseSampleFraction(region),
+            'bands': band_count
+        }
+        for region, year in jobs
+    }
+
+    # Submit the most expensive region-years first so the slowest tasks do not run alone at the tail of the launch
+    jobs = cost_model.order(jobs, features)
+
+## Main Processing Loop
+# Region-years whose export tasks were started (reported to the command line runner)
+launched = 0
+
+if plan_launch:
+    # Report what the launch would involve; tasks are only built to measure their graphs
+    plan = LaunchPlan(f'training samples v{version_out}', bands=band_count, cost_model=cost_model)
+    for key in jobs:
+        plan.add(key, area=features[key]['area'], samples=features[key]['samples'])
+    for key in jobs[:plan_graph_samples]:
+        plan.profile(key, buildTrainingTask(*key))
+    print(plan.report())
+else:
+    # Iterate over the missing region-years, longest first
+    for region_list, year in jobs:
+        print(f'Processing region [{region_list}] - year [{year}] '
+              f'(predicted cost: {cost_model.predict(features[(region_list, year)]):.0f} s)')
+
+        # Submit the export task to the Earth Engine servers and record it in the monitor
+        monitor.start(buildTrainingTask(region_list, year), key=(region_list, year))
+        launched += 1
+
+    if monitor_tasks:
+        # Poll the tasks until every region-year completed or ran out of attempts
+        summary = monitor.run()
+
+        # Record the completed exports in the manifest so the next run skips them without a new listing
+        completed = [key for key, (state, _, _) in monitor.outcomes().items() if state == 'COMPLETED']
+        manifest.add(dirout, [expected[key] for key in completed if key in expected])
+
+        # Learn from the recorded durations to improve the cost predictions of the next runs
+        cost_model.record_many(
+            (key, features[key], seconds)
+            for key, seconds in monitor.durations().items() if key in features
+        )
+        print('✅ Completed:', summary['completed'], '| Failed:', summary['failed'])
+    else:
+        print('✅ All tasks have been started. Now wait a few hours and have fun :)')
@@ -10,8 +10,6 @@
 import ee            # Import the Earth Engine API
 import math          # Import math for trigonometric functions
 import sys           # Import system-specific parameters and functions
-import os            # Import operating system functionalities
-import re            # Import regular expression operations for string parsing
 import itertools     # Import itertools for generating combinations
 
 # Authenticate the Earth Engine account (required in new environments)
@@ -20,15 +18,12 @@ ee.Authenticate()
 # Initialize the Earth Engine session with the specified project
 ee.Initialize(project = 'ee-ipam')
 
-# Clone the GitHub repository with helper functions
-!rm -rf /content/mapbiomas-mosaic
-!git clone https://github.com/costa-barbara/mapbiomas-mosaic.git
-sys.path.append("/content/mapbiomas-mosaic")
+# Add the local copy of this repository to access the shared pipeline helpers
+sys.path.append("/content/brazil-cerrado")
+from pipeline.module_cache import LANDSAT_COMMIT, LANDSAT_HASH, load_modules
 
-# Clone the MapBiomas GitHub repository to access custom helper functions
-!rm -rf /content/mapbiomas-mosaic
-!git clone https://github.com/costa-barbara/mapbiomas-mosaic.git
-sys.path.append("/content/mapbiomas-mosaic")
+# Load the MapBiomas mosaic helper modules from the local cache (cloned only when missing or modified)
+load_modules('landsat', commit=LANDSAT_COMMIT, expected_hash=LANDSAT_HASH)
 
 # Import custom MapBiomas modules for mosaicking and spectral metrics
 from modules.SpectralIndexes import *
@@ -36,15 +31,28 @@ from modules.Miscellaneous import *
 from modules.Mosaic import *
 from modules.SmaAndNdfi import *
 from modules.ThreeYearMetrics import *
-from modules import Map
+
+# Import the shared pipeline helpers
+from pipeline.covariates import CovariateFactory
+from pipeline.graph_profile import format_report, profile_tasks
+from pipeline.manifest import AssetManifest
+from pipeline.metadata import prefetch_classes
+from pipeline.parameters import parameter
+from pipeline.period import PERIOD, PeriodStack, check_mode, period_asset_name
+from pipeline.plan import LaunchPlan, collection_sizes
+from pipeline.scheduler import region_areas
+from pipeline.schema import landsat_general_schema
+from pipeline.sharding import Shard, ShardedSubmitter
+from pipeline.submitter import ExportSubmitter
+from pipeline.three_year import ThreeYearWindow, plan_years
 
 
 ## Parameters and Asset Management
 # Define the input version for the sample points
-samples_version = '17'
+samples_version = parameter('samples_version', '17')
 
 # Define the output version for the generated training data
-output_version  = '17'
+output_version  = parameter('output_version', '17')
 
 # Define output folder path
 output_asset = 'projects/ee-ipam/assets/MAPBIOMAS/LULC/CERRADO_DEV/COL_11/LANDSAT/C11-GENERAL-MAP-PROBABILITY/'
@@ -52,32 +60,68 @@ output_asset = 'projects/ee-ipam/assets/MAPBIOMAS/LULC/CERRADO_DEV/COL_11/LANDSA
 # Training samples path
 training_dir = 'projects/mapbiomas-brazil/assets/LAND-COVER/COLLECTION-11/GENERAL/SAMPLES/CERRADO/'
 
+# Local file caching the listing of the output folder
+manifest_path = parameter('manifest_path', '/content/asset_manifest.sqlite')
+
+# Reuse a listing of the output folder younger than this many seconds (set by the command line runner,
+# which lists the folder once for all of its jobs); None lists it on every run
+manifest_max_age = parameter('manifest_max_age')
+
 # Define the years to classify
-years = list(range(1985, 2026))
+years = parameter('years', list(range(1985, 2026)))
+
+# Export mode: 'annual' writes one asset per region and year; 'period' writes one multi-band asset per region
+# holding the classification_YYYY and probability bands of every year
+export_mode = check_mode(parameter('export_mode', 'annual'))
 
 # Load the Cerrado classification regions feature collection
 regionsCollection = ee.FeatureCollection('projects/ee-ipam-cerrado/assets/ancillary/collection_11_classification_regions_vector')
-regions_list = sorted(regionsCollection.aggregate_array('mapb').distinct().getInfo())
+regions_list = parameter('regions') or sorted(regionsCollection.aggregate_array('mapb').distinct().getInfo())
 regions_ic = 'users/dh-conciani/collection7/classification_regions/eachRegion_v2_10m/'
 
-# List existing output assets
-files = ee.data.listAssets({'parent': output_asset})
-files = [asset['name'] for asset in files['assets']]
-
-# Remove the prefix from asset names
-files = [file.replace('projects/earthengine-legacy/assets/', '') for file in files]
-
-# Generate expected asset list
-expected = [
-    f"{output_asset}CERRADO_{region}_{year}_v{output_version}"
-    for region, year in itertools.product(regions_list, years)
+# Refresh the local manifest of existing output assets (paginated folder listing)
+manifest = AssetManifest(manifest_path)
+manifest.refresh(output_asset, max_age=manifest_max_age)
+
+if export_mode == PERIOD:
+    # One whole-period asset per region: a missing asset means every year of the region is classified
+    expected = {
+        (region, PERIOD): output_asset + period_asset_name('CERRADO', region, years, output_version)
+        for region in regions_list
+    }
+    missing_by_region = {region: list(years) for region in manifest.missing_by_region(output_asset, expected)}
+else:
+    # Generate expected asset list, keyed by (region, year)
+    expected = {
+        (region, year): f"{output_asset}CERRADO_{region}_{year}_v{output_version}"
+        for region, year in itertools.product(regions_list, years)
+    }
+
+    # Identify missing years per region
+    missing_by_region = manifest.missing_by_region(output_asset, expected)
+
+print('Total missing assets:', sum(len(y) for y in missing_by_region.values()))
+
+# Maximum number of export tasks queued at once (the project's concurrent-task quota, or this job's share of it)
+max_in_flight = parameter('max_in_flight', 20)
+
+# Number of threads building region task graphs in parallel
+build_workers = 8
+
+# Earth Engine projects sharing the export workload, each with its own concurrent-task quota.
+# With more than one project the regions are split across them, one worker process per project.
+projects = [
+    Shard('ee-ipam', max_in_flight=max_in_flight, workers=build_workers),
 ]
 
-# Identify missing assets
-missing = [entry for entry in expected if entry not in files]
-missing_set = set(missing)
+# Profiling mode: build the task graphs and report their size instead of starting the exports
+profile_graphs = False
+
+# Plan mode: print the task counts, bands, samples, graph sizes and estimated cost without submitting anything
+plan_launch = parameter('plan', False)
 
-print('Total missing assets:', len(missing))
+# Number of regions whose task graphs are built and profiled in plan mode
+plan_graph_samples = 2
 
 # Define a dictionary mapping numeric class IDs to descriptive labels
 classDict = {
@@ -115,6 +159,20 @@ geomorpho = {
     'cti': ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/cti").mosaic().rename('cti').toInt64(),
 }
 
+# Fraction-based and selected spectral indices applied to the Landsat collection, in order
+indexFunctions = [
+    getNDFI, getSEFI, getWEFI, getFNS,
+    getNDVI, getNBR, getMNDWI, getPRI, getCAI, getEVI2,
+    getGCVI, getGRND, getMSI, getGARI, getGNDVI, getMSAVI,
+    getHallCover, getHallHeigth
+]
+
+# Mosaic band schema derived locally from the feature stack (verified against the server on the first task)
+feature_schema = landsat_general_schema(['getFractions'] + indexFunctions, geomorpho)
+
+# Static covariates (coordinates, HAND, geomorpho) built once per process and clipped with the final mosaic
+covariates = CovariateFactory(geomorpho)
+
 ## Helper Functions
 # Builds the annual Landsat mosaic with SMA and selected spectral indices.
 def buildAnnualMosaic(year, region_i):
@@ -133,15 +191,10 @@ def buildAnnualMosaic(year, region_i):
         .copyProperties(image, ['system:time_start', 'system:time_end'])
     )
 
-    # Apply Spectral Mixture Analysis and indices
+    # Apply Spectral Mixture Analysis, fraction-based and selected spectral indices
     collection = collection.map(lambda image: getFractions(image, endmembers))
-    collection = collection.map(getNDFI).map(getSEFI).map(getWEFI).map(getFNS)
-
-    # Selected spectral indices
-    collection = collection\
-        .map(getNDVI).map(getNBR).map(getMNDWI).map(getPRI).map(getCAI).map(getEVI2)\
-        .map(getGCVI).map(getGRND).map(getMSI).map(getGARI).map(getGNDVI).map(getMSAVI)\
-        .map(getHallCover).map(getHallHeigth)
+    for indexFunction in indexFunctions:
+        collection = collection.map(indexFunction)
 
     # Build the final reduced mosaic using percentile combinations
     # NDVI is used as the target band for dry/wet seasonal percentiles
@@ -158,20 +211,14 @@ def buildAnnualMosaic(year, region_i):
 
     return mosaic
 
-# Keeps only the two previous years required for trailing three-year metrics
-# Manages memory for trailing three-year metrics by removing years older than (current_year - 2) 
-def cleanThreeYearDict(mosaic_dict_3yr, year):
-    # Identify keys (years) that fall outside the 3-year trailing window
-    years_to_remove = [
-        y for y in mosaic_dict_3yr.keys()
-        if y < year - 2
-    ]
-
-    # Delete the obsolete years from the dictionary
-    for y in years_to_remove:
-        del mosaic_dict_3yr[y]
+# Builds the annual mosaic with its structural context (input of the trailing three-year metrics)
+def buildContextMosaic(year, region_i):
+    mosaic = buildAnnualMosaic(
+        year=year,
+        region_i=region_i
+    )
 
-    return mosaic_dict_3yr
+    return getStructuralContext(mosaic)
 
 # Return the annual training sample asset corresponding to region and year.
 def getTrainingAsset(region, year):
@@ -199,99 +246,88 @@ def balanceTrainingSamples(training_fc):
     # Merge the balanced water subset back into the main sample pool
     return non_water_samples.merge(water_samples)
 
-## Main Processing Loop
-# Iterate over each unique classification region
-for region in regions_list:
-    print('--------------------------------')
+# Loads the training samples of a region and year with the water class balancing applied.
+def getBalancedTraining(region, year):
+    training_fc = ee.FeatureCollection(getTrainingAsset(region, year))
+    return balanceTrainingSamples(training_fc)
+
+## Task Construction
+# Builds the export tasks of every missing year of a region (runs on a worker thread).
+# ``ee`` is the client of the project submitting the tasks when the launch is sharded across projects.
+def buildRegionTasks(region, ee=ee):
     print(f'Processing region [{region}]')
 
-    # Filter the global missing list to find missing assets specific to this region
-    region_missing = [
-        item for item in missing
-        if re.search(
-            rf"CERRADO_{region}_[0-9]{{4}}_v{output_version}$",
-            item
-        )
-    ]
+    # Collected export tasks for this region, started later by the submitter
+    tasks = []
+
+    # Annual images stacked into the whole-period asset (period export mode)
+    period_stack = PeriodStack()
+
+    # Look up the missing years of this region in the precomputed map
+    region_missing = missing_by_region.get(region, [])
 
     if len(region_missing) == 0:
         print(f'Region {region}: all assets already exist. Skipping region.')
-        continue
+        return tasks
 
     print('Missing assets in region:', len(region_missing))
 
     region_i_vec = (regionsCollection.filter(ee.Filter.eq('mapb', region)).first().geometry())
     region_i_ras = ee.Image(regions_ic + 'reg_' + str(region))
 
-    # Extract pixel latitude and longitude coordinates
-    coords = ee.Image.pixelLonLat().clip(region_i_vec)
-
-    # Compute auxiliary coordinates
-    lat = coords.select('latitude').add(5).multiply(-1).multiply(1000).toInt16().rename('latitude')
-    lon_sin = coords.select('longitude').multiply(math.pi).divide(180).sin().multiply(-1).multiply(10000).toInt16().rename('longitude_sin')
-    lon_cos = coords.select('longitude').multiply(math.pi).divide(180).cos().multiply(-1).multiply(10000).toInt16().rename('longitude_cos')
-    hand = ee.ImageCollection("users/gena/global-hand/hand-100").mosaic().toInt16().clip(region_i_vec).rename('hand')
+    # Lazy trailing 3-year window: builds only the mosaics of missing years and of their two previous years
+    window = ThreeYearWindow(
+        build=lambda y: buildContextMosaic(year=y, region_i=region_i_vec),
+        reduce=getThreeYearReducedImage,
+        years=years
+    )
+    print('Mosaics to build:', len(plan_years(region_missing, years)))
 
-    # Reduced dictionary for trailing 3-year metrics
-    mosaic_dict_3yr = {}
+    # Fetch the class lists of all missing years in a single request
+    classes_by_year = prefetch_classes(
+        years=region_missing,
+        collection_for=lambda y: getBalancedTraining(region, y),
+        property='reference'
+    )
 
-    # Iterate over each year
-    for year in years:
+    # Iterate over each missing year
+    for year in region_missing:
         # Define the strict filename template for the output asset
         file_name = f'CERRADO_{region}_{year}_v{output_version}'
         asset_id = output_asset + file_name
 
-        print(f'----> {year}')
-
-        # Build Base Mosaic & Context Metrics
-        mosaic = buildAnnualMosaic(
-            year = year,
-            region_i = region_i_vec
-        )
+        print(f'----> [{region}] {year}')
 
-        mosaic = getStructuralContext(mosaic)
+        # Build Base Mosaic & Context Metrics (memoized by the window)
+        mosaic = window.mosaic(year)
 
         # Add trailing three-year temporal metrics
         mosaic = addThreeYearMetrics(
             year=year,
             mosaic=mosaic,
-            mosaic_dict_3yr=mosaic_dict_3yr
+            mosaic_dict_3yr=window.previous(year)
         )
 
-        # Store reduced annual image for subsequent years only
-        mosaic_dict_3yr[year] = getThreeYearReducedImage(mosaic)
-        mosaic_dict_3yr = cleanThreeYearDict(mosaic_dict_3yr, year)
-
-        # Skip export if asset already exists (but we had to process the image for the 3-year temporal lag)
-        if asset_id not in missing_set:
-            print('Asset already exists. Temporal image stored, export skipped.')
-            continue
-
         # Append the Coordinates bands and other ancillary to the main mosaic
         mosaic = getSlope(mosaic)
 
-        mosaic = mosaic.addBands(lat).addBands(lon_sin).addBands(lon_cos).addBands(hand) \
-                        .addBands(fire_age.select(f'classification_{year}').rename('fire_age').clip(region_i_vec))
+        mosaic = mosaic.addBands(covariates.stack('coordinates', 'hand')) \
+                        .addBands(fire_age.select(f'classification_{year}').rename('fire_age'))
 
-        # Iterate through the geomorphology dictionary and append each band to the mosaic
-        for key in geomorpho:
-            mosaic = mosaic.addBands(geomorpho[key])
+        # Append the geomorphology stack (the mosaic is clipped once below)
+        mosaic = mosaic.addBands(covariates.geomorpho())
         
         # Final Formatting
         mosaic = mosaic.multiply(100).round().toInt32()
         mosaic = mosaic.addBands(ee.Image(year).int16().rename('year'))
         mosaic = mosaic.clip(region_i_vec)
 
-        # Fetch the previously created training FeatureCollection for a specific region
-        training_asset = getTrainingAsset(region, year)
-        training_fc = ee.FeatureCollection(training_asset)
-
-        # Apply the balancing for the water class
-        training_ij = balanceTrainingSamples(training_fc)
+        # Fetch the balanced training FeatureCollection for a specific region and year
+        training_ij = getBalancedTraining(region, year)
 
         ## Random Forest Training and Classification
-        # Extract the list of all band names present in the mosaic to serve as predictors
-        bandNames_list = mosaic.bandNames().getInfo()
+        # Get the list of all band names present in the mosaic to serve as predictors (verified once per run)
+        bandNames_list = feature_schema.verify(mosaic)
         print('Total bands:', len(bandNames_list))
 
         # Initialize the SmileRandomForest classifier requesting MULTIPROBABILITY output
@@ -307,8 +343,8 @@ for region in regions_list:
         predicted = (mosaic.classify(classifier).updateMask(region_i_ras))
 
         ## Probability Flattening and Discrete Class Mapping
-        # Retrieve an ordered list of all unique class IDs present in the training data
-        classes = sorted(training_ij.aggregate_array('reference').distinct().getInfo())
+        # Retrieve the ordered list of unique class IDs present in the training data (prefetched per region)
+        classes = classes_by_year[year]
 
         # Flatten the multiprobability array output into individual bands named after the numeric class IDs        
         probabilities = predicted.arrayFlatten([list(map(str, classes))])
@@ -343,15 +379,17 @@ for region in regions_list:
             .set('version', output_version)
             .set('biome', 'CERRADO')
             .set('mapb', int(region))
-            .set('year', int(year))
             .set('samples_version', samples_version)
         )
 
-        # Define the strict filename template for the output asset
-        file_name = f'CERRADO_{region}_{year}_v{output_version}'
+        if export_mode == PERIOD:
+            # Keep the year's bands for the whole-period asset exported after the loop (without the
+            # 'year' property, which Image.cat would copy from the first year to the period asset)
+            period_stack.add(year, toExport, ['classification'] + new_names)
+            continue
 
         task = ee.batch.Export.image.toAsset(
-            image = toExport,
+            image = toExport.set('year', int(year)),
             description = file_name,
             assetId = asset_id,
             scale = 30,
@@ -360,13 +398,105 @@ for region in regions_list:
             region = region_i_ras.geometry()
         )
 
-        # Submit the classification export task to the Earth Engine servers
-        task.start()
+        # Queue the classification export task for submission
+        tasks.append(task)
+
+    if export_mode == PERIOD:
+        # Single multi-band export with the classification and probability bands of all years
+        file_name = period_asset_name('CERRADO', region, years, output_version)
+
+        toExport = (
+            period_stack.image()
+            .set('collection', '11')
+            .set('version', output_version)
+            .set('biome', 'CERRADO')
+            .set('mapb', int(region))
+            .set('export_mode', PERIOD)
+            .set('first_year', period_stack.years[0])
+            .set('last_year', period_stack.years[-1])
+            .set('samples_version', samples_version)
+        )
+
+        tasks.append(ee.batch.Export.image.toAsset(
+            image = toExport,
+            description = file_name,
+            assetId = output_asset + file_name,
+            scale = 30,
+            maxPixels = 1e13,
+            pyramidingPolicy = {'.default': 'mode'},
+            region = region_i_ras.geometry()
+        ))
 
-    print('------------> NEXT REGION --------->')
+    print(f'------------> REGION [{region}] BUILT: {len(tasks)} task(s) --------->')
+    return tasks
 
-print('✅ All tasks have been started. Now wait a few hours and have fun :)')
+# Region-years exported by the tasks of the given regions (every missing year of each region)
+def countRegionYears(regions):
+    return sum(len(missing_by_region.get(region, [])) for region in regions)
 
+## Main Processing Loop
+# Region-years whose export tasks were started (reported to the command line runner)
+launched = 0
+
+# Build region task graphs on a thread pool and start them inside a bounded in-flight window
+if plan_launch:
+    # Report what the launch would involve; tasks are only built to measure their graphs.
+    # The tasks of the regions with the most missing years are built first: building them verifies the feature
+    # schema, so the plan uses the band count the tasks will classify
+    profiled = []
+    for region in sorted(regions_list, key=lambda r: len(missing_by_region.get(r, [])), reverse=True)[:plan_graph_samples]:
+        keys = [(region, PERIOD)] if export_mode == PERIOD else [(region, year) for year in missing_by_region.get(region, [])]
+        profiled.extend(zip(keys, buildRegionTasks(region)))
+
+    plan = LaunchPlan(f'classification v{output_version}', bands=len(feature_schema.bands()), slots=max_in_flight)
+    jobs = [(region, year) for region in regions_list for year in missing_by_region.get(region, [])]
+
+    # Region areas and training sample counts of every missing region-year, one request each
+    region_area = region_areas(regionsCollection, 'mapb')
+    training_counts = collection_sizes([getTrainingAsset(region, year) for region, year in jobs])
+
+    for region in regions_list:
+        region_missing = missing_by_region.get(region, [])
+        samples = [training_counts[getTrainingAsset(region, year)] for year in region_missing]
+        if export_mode == PERIOD and region_missing:
+            # A whole-period task classifies every missing year of the region
+            plan.add((region, PERIOD), area=region_area.get(region, 0) * len(region_missing), samples=sum(samples))
+        elif export_mode != PERIOD:
+            for year, count in zip(region_missing, samples):
+                plan.add((region, year), area=region_area.get(region, 0), samples=count)
+
+    # Profile the tasks of the regions with the most missing years
+    for key, task in profiled:
+        plan.profile(key, task)
+    print(plan.report())
+elif profile_graphs:
+    # Serialize each region-year graph and flag the largest ones (nothing is started)
+    profiles = profile_tasks(
+        (task for region in regions_list for task in buildRegionTasks(region)),
+        log = print
+    )
+    print(format_report(profiles))
+elif len(projects) > 1:
+    # Partition the regions across the projects by number of missing years (largest first)
+    sharded = ShardedSubmitter(
+        projects,
+        build = buildRegionTasks
+    )
+    summaries = sharded.run(
+        regions_list,
+        costs = {region: len(missing_by_region.get(region, [])) for region in regions_list}
+    )
+    launched = countRegionYears(region for summary in summaries.values() for region in summary.get('built', []))
+
+    print('✅ All tasks have been started. Now wait a few hours and have fun :)')
+else:
+    submitter = ExportSubmitter(
+        build = buildRegionTasks,
+        max_in_flight = max_in_flight,
+        workers = build_workers
+    )
+    submitter.run(regions_list)
+    launched = countRegionYears(region for region in regions_list if region not in submitter.build_errors)
 
-print('✅ All tasks have been started. Now wait a few hours and have fun :)')
+    print('✅ All tasks have been started. Now wait a few hours and have fun :)')
 
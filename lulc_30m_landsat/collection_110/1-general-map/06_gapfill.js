@@ -55,8 +55,28 @@ var buildCollection = function(input, version, startYear, endYear) {
   return collection;
 };
 
+// Define a function to read the whole-period assets (export_mode 'period' of 05_rfClassification.py),
+// which already hold one 'classification_YYYY' band per year for each region
+var buildCollectionFromPeriod = function(input, version, startYear, endYear) {
+  var years = ee.List.sequence({'start': startYear, 'end': endYear});
+  var bandNames = years.map(function(year_i) {
+    return ee.String('classification_').cat(ee.Number(year_i).format('%d'));
+  });
+
+  // Mosaic the regions once for all years
+  return input.filterMetadata('version', 'equals', version)
+              .filterMetadata('export_mode', 'equals', 'period')
+              .map(function(image) {
+                return image.select(bandNames);
+              })
+              .mosaic();
+};
+
+// Set to true when the classification was exported as whole-period assets
+var periodAssets = false;
+
 // Call the buildCollection function using the predefined parameters
-var collection = buildCollection(
+var collection = (periodAssets ? buildCollectionFromPeriod : buildCollection)(
   data,             // input collection
   inputVersion,     // version 
   1985,             // startYear
@@ -6,11 +6,7 @@
 
 ## Initialization and Imports
 import ee            # Import the Earth Engine API
-import math          # Import math for trigonometric functions
-import pandas as pd  # Import pandas for data manipulation 
 import sys           # Import system-specific parameters and functions
-import os            # Import operating system functionalities
-import re            # Import regular expression operations for string parsing
 
 # Authenticate the Earth Engine account (required in new environments)
 ee.Authenticate()
@@ -18,10 +14,12 @@ ee.Authenticate()
 # Initialize the Earth Engine session with the specified project
 ee.Initialize(project = 'ee-ipam')
 
-# Clone the MapBiomas GitHub repository to access custom helper functions
-!rm -rf /content/mapbiomas-mosaic
-!git clone https://github.com/costa-barbara/mapbiomas-mosaic.git
-sys.path.append("/content/mapbiomas-mosaic")
+# Add the local copy of this repository to access the shared pipeline helpers
+sys.path.append("/content/brazil-cerrado")
+from pipeline.module_cache import LANDSAT_COMMIT, LANDSAT_HASH, load_modules
+
+# Load the MapBiomas mosaic helper modules from the local cache (cloned only when missing or modified)
+load_modules('landsat', commit=LANDSAT_COMMIT, expected_hash=LANDSAT_HASH)
 
 # Import custom MapBiomas modules for mosaicking and spectral metrics
 from modules.SpectralIndexes import *
@@ -29,20 +27,24 @@ from modules.Miscellaneous import *
 from modules.Mosaic import *
 from modules.SmaAndNdfi import *
 from modules.ThreeYearMetrics import *
-from modules import Map
+
+# Import the shared pipeline helpers
+from pipeline.covariates import CovariateFactory
+from pipeline.parameters import parameter
+from pipeline.schema import landsat_rocky_schema
 
 ## Parameters and Asset Paths
 # Define the input version for the sample points
-version_in = '3'
+version_in = parameter('version_in', '3')
 
 # Define the output version for the generated training data
-version_out = '3'
+version_out = parameter('version_out', '3')
 
 # Define the base output folder path for storing the generated training assets in GEE
 dirout = f'projects/ee-ipam/assets/MAPBIOMAS/LULC/CERRADO_DEV/COL_11/LANDSAT/trainings_rocky/v{version_out}/'
 
 # Define the list of years to be processed
-years = list(range(1985, 2026))
+years = parameter('years', list(range(1985, 2026)))
 
 # Landsat mosaic parameters
 collectionId = 'LANDSAT/COMPOSITES/C02/T1_L2_32DAY'
@@ -75,25 +77,27 @@ def asset_exists(asset_id):
         print(f"Error checking asset: {e}")
         return False
 
+# Spectral index functions applied to the Landsat collection, in order
+indexFunctions = [
+    getNDVI, getNBR, getMNDWI, getEVI2, getMSI,
+    getTGSI, getBSI, getNDRI, getHallCover, getHallHeight
+]
+
+# Mosaic band schema derived locally from the feature stack (verified against the server on the first task)
+feature_schema = landsat_rocky_schema(indexFunctions)
+
+# Static covariates (coordinates, HAND, TPI) built once per process instead of once per year
+covariates = CovariateFactory()
+
 ## Main Processing Loop
+# Region-years whose export tasks were started (reported to the command line runner)
+launched = 0
+
 # Iterate over each year defined in the processing list
 for year in years:
     # Print a status message indicating the current year
     print(f"--> Processing year: {year}")
 
-    # Extract pixel latitude and longitude coordinates
-    coords = ee.Image.pixelLonLat().clip(aoi_vec)
-
-    lat = coords.select('latitude').add(5).multiply(-1).multiply(1000).toInt16()
-    lon_sin = coords.select('longitude').multiply(math.pi).divide(180).sin().multiply(-1).multiply(10000).toInt16().rename('longitude_sin')
-    lon_cos = coords.select('longitude').multiply(math.pi).divide(180).cos().multiply(-1).multiply(10000).toInt16().rename('longitude_cos')
-
-    # Load HAND data (height above nearest drainage)
-    hand = ee.ImageCollection("users/gena/global-hand/hand-100").mosaic().toInt16().clip(aoi_vec).rename('hand')
-
-    # Load TPI data (Topographic Position Index, Geomorpho 90m) 
-    tpi = ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/tpi").mosaic().multiply(10000).round().rename('tpi').toInt64(),
-       
     ## Mosaic Assembly 
     # Set the best temporal window for the Cerrado biome
     dateStart = ee.Date.fromYMD(year, 4, 1)
@@ -109,10 +113,8 @@ for year in years:
     collection = collection.map(lambda image: image.multiply(10000).copyProperties(image, ['system:time_start', 'system:time_end']))
 
     # Apply spectral indexes function
-    collection = collection\
-      .map(getNDVI).map(getNBR).map(getMNDWI).map(getEVI2)\
-      .map(getMSI).map(getTGSI).map(getBSI).map(getNDRI)\
-      .map(getHallCover).map(getHallHeight)
+    for indexFunction in indexFunctions:
+        collection = collection.map(indexFunction)
     
     # Generate mosaic using specific criteria
     mosaic = getMosaic(
@@ -131,7 +133,7 @@ for year in years:
     mosaic = getSpatialContext(mosaic)
 
     # Append the processed geographic coordinate bands to the mosaic
-    mosaic = mosaic.addBands(lat).addBands(lon_sin).addBands(lon_cos).addBands(hand).addBands(tpi)
+    mosaic = mosaic.addBands(covariates.stack('coordinates', 'hand', 'tpi'))
     
     # Store the assembled multi-band composite in the tracking dictionary
     mosaic_dict[year] = mosaic
@@ -160,7 +162,7 @@ for year in years:
     print('Number of training points: ' + str(samples.size().getInfo()))
 
     # Filter the extracted collection to strictly remove points that returned null values for any band
-    training_i = training_i.filter(ee.Filter.notNull(mosaic.bandNames().getInfo()))
+    training_i = training_i.filter(ee.Filter.notNull(feature_schema.verify(mosaic)))
 
     # Construct the exact expected asset ID for the current year's export
     asset_id = f'{dirout}train_col11_rocky_{year}_v{version_out}'
@@ -179,6 +181,7 @@ for year in years:
 
     # Submit the export task to the Earth Engine servers
     task.start()
+    launched += 1
     
     print('============================================')
 
@@ -9,9 +9,6 @@
 import ee            # Import the Earth Engine API
 import math          # Import math for trigonometric functions
 import sys           # Import system-specific parameters and functions
-import os            # Import operating system functionalities
-import re            # Import regular expression operations for string parsing
-import itertools     # Import itertools for generating combinations
 
 # Authenticate the Earth Engine account (required in new environments)
 ee.Authenticate()
@@ -19,10 +16,12 @@ ee.Authenticate()
 # Initialize the Earth Engine session with the specified project
 ee.Initialize(project = 'ee-barbarasilvaipam')
 
-# Clone the MapBiomas GitHub repository to access custom helper functions
-!rm -rf /content/mapbiomas-mosaic
-!git clone https://github.com/costa-barbara/mapbiomas-mosaic.git
-sys.path.append("/content/mapbiomas-mosaic")
+# Add the local copy of this repository to access the shared pipeline helpers
+sys.path.append("/content/brazil-cerrado")
+from pipeline.module_cache import LANDSAT_COMMIT, LANDSAT_HASH, load_modules
+
+# Load the MapBiomas mosaic helper modules from the local cache (cloned only when missing or modified)
+load_modules('landsat', commit=LANDSAT_COMMIT, expected_hash=LANDSAT_HASH)
 
 # Import custom MapBiomas modules for mosaicking and spectral metrics
 from modules.SpectralIndexes import *
@@ -30,20 +29,24 @@ from modules.Miscellaneous import *
 from modules.Mosaic import *
 from modules.SmaAndNdfi import *
 from modules.ThreeYearMetrics import *
-from modules import Map
+
+# Import the shared pipeline helpers
+from pipeline.covariates import CovariateFactory
+from pipeline.parameters import parameter
+from pipeline.schema import landsat_rocky_schema
 
 ## Parameters and Asset Management
 # Define the input version for the training samples
-samples_version = '3'
+samples_version = parameter('samples_version', '3')
 
 # Define the output version for the final classification assets
-output_version  = '4'
+output_version  = parameter('output_version', '4')
 
 # Define the base output folder path for storing the classification assets in GEE
 output_asset = 'projects/ee-ipam/assets/MAPBIOMAS/LULC/CERRADO_DEV/COL_11/LANDSAT/C11-ROCKY-GENERAL-MAP-PROBABILITY/'
 
 # Define the list of years to be processed
-years = list(range(1985, 2026))
+years = parameter('years', list(range(1985, 2026)))
 
 # Define a dictionary mapping numeric class IDs to descriptive labels for the probability bands
 classDict = {
@@ -69,24 +72,27 @@ spectralBands = ['blue', 'red', 'green', 'nir', 'swir1', 'swir2']
 # Initialize an empty dictionary to store computed mosaics by year temporarily
 mosaic_dict = {}
 
+# Spectral index functions applied to the Landsat collection, in order
+indexFunctions = [
+    getNDVI, getNBR, getMNDWI, getEVI2, getMSI,
+    getTGSI, getBSI, getNDRI, getHallCover, getHallHeight
+]
+
+# Mosaic band schema derived locally from the feature stack (verified against the server on the first task)
+feature_schema = landsat_rocky_schema(indexFunctions)
+
+# Static covariates (coordinates, HAND, TPI) built once per process instead of once per year
+covariates = CovariateFactory()
+
 ## Main Processing Loop
+# Region-years whose export tasks were started (reported to the command line runner)
+launched = 0
+
 # Iterate over each year defined in the processing list
 for year in years:
     # Print a status message indicating the current year
     print(f"--> Processing year: {year}")
 
-    # Extract pixel latitude and longitude coordinates
-    coords = ee.Image.pixelLonLat().clip(aoi_vec)
-    lat = coords.select('latitude').add(5).multiply(-1).multiply(1000).toInt16()
-    lon_sin = coords.select('longitude').multiply(math.pi).divide(180).sin().multiply(-1).multiply(10000).toInt16().rename('longitude_sin')
-    lon_cos = coords.select('longitude').multiply(math.pi).divide(180).cos().multiply(-1).multiply(10000).toInt16().rename('longitude_cos')
-
-    # Load HAND data (height above nearest drainage)
-    hand = ee.ImageCollection("users/gena/global-hand/hand-100").mosaic().toInt16().clip(aoi_vec).rename('hand')
-     
-    # Load TPI data (Topographic Position Index, Geomorpho 90m) 
-    tpi = ee.ImageCollection("projects/sat-io/open-datasets/Geomorpho90m/tpi").mosaic().multiply(10000).round().rename('tpi').toInt64(),
-     
     ## Mosaic Assembly
     # Set the best temporal window for the Cerrado biome
     dateStart = ee.Date.fromYMD(year, 4, 1)
@@ -102,10 +108,8 @@ for year in years:
     collection = collection.map(lambda image: image.multiply(10000).copyProperties(image, ['system:time_start', 'system:time_end']))
 
     # Apply spectral indexes function
-    collection = collection\
-      .map(getNDVI).map(getNBR).map(getMNDWI).map(getEVI2)\
-      .map(getMSI).map(getTGSI).map(getBSI).map(getNDRI)\
-      .map(getHallCover).map(getHallHeight)
+    for indexFunction in indexFunctions:
+        collection = collection.map(indexFunction)
     
     # Generate mosaic using specific criteria
     mosaic = getMosaic(
@@ -124,7 +128,7 @@ for year in years:
     mosaic = getSpatialContext(mosaic)
     
     # Append the processed geographic coordinate bands to the mosaic
-    mosaic = mosaic.addBands(lat).addBands(lon_sin).addBands(lon_cos).addBands(hand).addBands(tpi)
+    mosaic = mosaic.addBands(covariates.stack('coordinates', 'hand', 'tpi'))
         
     # Store the assembled multi-band composite in the tracking dictionary
     mosaic_dict[year] = mosaic
@@ -146,11 +150,11 @@ for year in years:
     # Load the training samples feature collection
     training = ee.FeatureCollection(training_path)
 
-    # Extract the list of all band names present in the mosaic to serve as predictors
-    band_names = mosaic.bandNames().getInfo()
+    # Get the list of all band names present in the mosaic to serve as predictors (verified once per run)
+    band_names = feature_schema.verify(mosaic)
     
     # Print diagnostic information regarding the predictor bands
-    print("Total bands:", mosaic.bandNames().size().getInfo())
+    print("Total bands:", len(band_names))
 
     # Initialize the SmileRandomForest classifier requesting MULTIPROBABILITY output
     classifier = ee.Classifier.smileRandomForest(
@@ -210,5 +214,6 @@ for year in years:
     
     # Submit the classification export task to the Earth Engine servers
     task.start()
+    launched += 1
 
 print('✅ All classification export tasks started. Now wait a few hours and have fun :)')
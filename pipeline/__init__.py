@@ -0,0 +1,6 @@
+"""Shared Python helpers for the MapBiomas Cerrado classification drivers.
+
+The step scripts (``04_trainingSamples.py``, ``05_rfClassification.py``)
+import these modules after adding a local copy of this repository to
+``sys.path``.
+"""
@@ -0,0 +1,14 @@
+"""Resolve the Earth Engine module used by the helpers.
+
+Every helper accepts an optional ``ee`` argument so it can be driven by a
+local stand-in instead of the real ``earthengine-api`` package.
+"""
+
+
+def resolve_ee(ee=None):
+    # Return the injected module, falling back to the real Earth Engine API
+    if ee is not None:
+        return ee
+
+    import ee as earthengine
+    return earthengine
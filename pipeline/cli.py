@@ -0,0 +1,322 @@
+"""Command line runner of the training-sample and classification drivers.
+
+Runs ``04_trainingSamples.py`` (``sample``) or ``05_rfClassification.py``
+(``classify``) of a sensor, collection and map for a range of regions and
+years, one job per region (general map) or a single job (rocky outcrop
+map, whose three-year metrics read the mosaics of neighbouring years),
+over a pool of worker processes. The driver parameters are overridden
+through ``pipeline/parameters.py``, and each job gets an equal share of
+the project's concurrent-task quota (``max_in_flight``).
+
+For the general map, the runner lists the output folder and fetches the
+region areas once before the jobs start; the jobs reuse both, and the
+regions are submitted by predicted cost, longest first. Each job writes
+its output to its own log file, and the run ends with a JSON summary of
+every job and the throughput of every worker, counted on the region-years
+the driver reports as launched (its ``launched`` variable).
+
+``--plan`` runs the driver once in plan mode and prints what the launch
+would involve without submitting anything::
+
+    python -m pipeline.cli sample --sensor landsat --regions 1-38 --years 1985-2025 --version-out 17 --workers 4
+    python -m pipeline.cli classify --regions 1-38 --years 1985-2025 --version-out 18 --plan
+    python -m pipeline.cli classify --sensor sentinel --map rocky --years 2017-2025 --version-out 2
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import runpy
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from ._ee import resolve_ee
+from .manifest import AssetManifest
+from .parameters import ENV_VAR, encode
+from .scheduler import CostModel, region_areas
+from .submitter import DEFAULT_MAX_IN_FLIGHT
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Current collection of each sensor
+COLLECTIONS = {'landsat': '110', 'sentinel': '04'}
+
+DRIVERS = {
+    ('landsat', '110', 'general', 'sample'): 'lulc_30m_landsat/collection_110/1-general-map/04_trainingSamples.py',
+    ('landsat', '110', 'general', 'classify'): 'lulc_30m_landsat/collection_110/1-general-map/05_rfClassification.py',
+    ('landsat', '110', 'rocky', 'sample'): 'lulc_30m_landsat/collection_110/2-rocky-outcrop/04_trainingSamples.py',
+    ('landsat', '110', 'rocky', 'classify'): 'lulc_30m_landsat/collection_110/2-rocky-outcrop/05_rfClassification.py',
+    ('sentinel', '04', 'general', 'sample'): 'lulc_10m_sentinel/collection_04/1-general-map/04_trainingSamples.py',
+    ('sentinel', '04', 'general', 'classify'): 'lulc_10m_sentinel/collection_04/1-general-map/05_rfClassification.py',
+    ('sentinel', '04', 'rocky', 'sample'): 'lulc_10m_sentinel/collection_04/2-rocky-outcrop/04_trainingSamples.py',
+    ('sentinel', '04', 'rocky', 'classify'): 'lulc_10m_sentinel/collection_04/2-rocky-outcrop/05_rfClassification.py',
+}
+
+# Drivers with a plan mode (``--plan``)
+PLAN_DRIVERS = {
+    ('landsat', '110', 'general', 'sample'),
+    ('landsat', '110', 'general', 'classify'),
+}
+
+# Output folder of each general map driver ({version} is its output version)
+OUTPUT_FOLDERS = {
+    ('landsat', '110', 'general', 'sample'):
+        'projects/mapbiomas-brazil/assets/LAND-COVER/COLLECTION-11/GENERAL/SAMPLES/CERRADO/v{version}/',
+    ('landsat', '110', 'general', 'classify'):
+        'projects/ee-ipam/assets/MAPBIOMAS/LULC/CERRADO_DEV/COL_11/LANDSAT/C11-GENERAL-MAP-PROBABILITY/',
+    ('sentinel', '04', 'general', 'sample'):
+        'projects/ee-ipam/assets/MAPBIOMAS/LULC/CERRADO_DEV/COL_11/SENTINEL/trainings/',
+    ('sentinel', '04', 'general', 'classify'):
+        'projects/ee-ipam/assets/MAPBIOMAS/LULC/CERRADO_DEV/COL_11/SENTINEL/C04_GENERAL-MAP-PROBABILITY/',
+}
+
+# Classification regions of the general map
+REGIONS = 'projects/ee-ipam-cerrado/assets/ancillary/collection_11_classification_regions_vector'
+
+# Age (s) under which the jobs reuse the listing made by the runner; the jobs
+# of a run never write each other's assets, so the listing stays valid for them
+JOB_MANIFEST_MAX_AGE = 24 * 3600
+
+# Names of the input and output versions in the drivers of each step
+VERSION_PARAMETERS = {
+    'sample': ('version_in', 'version_out'),
+    'classify': ('samples_version', 'output_version'),
+}
+
+
+def parse_range(text):
+    """Parse ``'1-10,12'`` into ``[1, ..., 10, 12]``."""
+    values = []
+    for part in text.split(','):
+        first, _, last = part.strip().partition('-')
+        values.extend(range(int(first), int(last or first) + 1))
+    return sorted(set(values))
+
+
+def driver_path(sensor, collection, map, step):
+    key = (sensor, collection or COLLECTIONS[sensor], map, step)
+    if key not in DRIVERS:
+        raise KeyError(f'No {step} driver for {sensor} collection {key[1]} ({map} map)')
+    return os.path.join(ROOT, DRIVERS[key])
+
+
+def plan_launch(path, parameters):
+    """Run the driver at ``path`` once in plan mode, in this process."""
+    os.environ[ENV_VAR] = encode(dict(parameters, plan=True))
+    runpy.run_path(path, run_name='__main__')
+
+
+def plan_jobs(map, regions, years):
+    """Split the run into jobs: one per region (general map) or a single job (rocky outcrop map).
+
+    The rocky outcrop drivers build the mosaic of every year before the
+    three-year metrics, which read the two previous years, so their years
+    stay in one job.
+    """
+    if map == 'general':
+        return [{'regions': [region], 'years': years} for region in regions]
+    return [{'years': years}]
+
+
+def order_regions(regions, parameters, ee=None):
+    """Return ``regions`` sorted by predicted cost, longest first.
+
+    The costs come from the region areas (fetched once and stored in the
+    cost model file, where the jobs find them) and the recorded durations.
+    """
+    ee = resolve_ee(ee)
+    cost_model = CostModel(parameters['cost_model_path'])
+    areas = region_areas(ee.FeatureCollection(REGIONS), 'mapb', ee=ee, cache=cost_model)
+    return cost_model.order(regions, {region: {'area': areas.get(region, 0)} for region in regions})
+
+
+def job_label(job):
+    if 'regions' in job:
+        return f"region_{job['regions'][0]}"
+    return f"years_{job['years'][0]}_{job['years'][-1]}"
+
+
+def run_job(path, values, log_path):
+    """Run the driver at ``path`` with the parameters ``values``; return its outcome."""
+    os.environ[ENV_VAR] = encode(values)
+    started_at = time.time()
+    error = None
+
+    # Region-years the driver started tasks for (those already exported are skipped)
+    launched = 0
+
+    with open(log_path, 'w') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            launched = runpy.run_path(path, run_name='__main__').get('launched', 0)
+        except (Exception, SystemExit):
+            error = traceback.format_exc()
+            print(error)
+
+    return {
+        'worker': os.getpid(),
+        'started_at': started_at,
+        'seconds': time.time() - started_at,
+        'region_years': launched,
+        'log': log_path,
+        'error': error,
+    }
+
+
+def worker_throughput(results):
+    """Jobs, busy time and completed region-years per hour of every worker process."""
+    workers = {}
+    for result in results:
+        stats = workers.setdefault(result['worker'], {'jobs': 0, 'region_years': 0, 'seconds': 0.0})
+        stats['jobs'] += 1
+        if not result['error']:
+            stats['region_years'] += result['region_years']
+        stats['seconds'] += result['seconds']
+
+    for stats in workers.values():
+        stats['region_years_per_hour'] = stats['region_years'] / max(stats['seconds'], 1e-9) * 3600
+    return workers
+
+
+def run(path, jobs, parameters, workers=4, state_dir='/content', max_in_flight=DEFAULT_MAX_IN_FLIGHT, log=print):
+    """Run ``jobs`` of the driver at ``path`` over ``workers`` processes; return the summary.
+
+    ``max_in_flight`` is the concurrent-task quota of the project, shared
+    equally by the jobs running at once.
+    """
+    log_dir = os.path.join(state_dir, 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+
+    started_at = time.time()
+    results = []
+    share = max(1, max_in_flight // max(1, min(workers, len(jobs))))
+
+    # Forked workers start from this process without re-importing the runner
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = {}
+        for job in jobs:
+            label = job_label(job)
+            values = dict(parameters, max_in_flight=share, **job)
+            # Each job tracks its own tasks, so concurrent monitors never poll each other's
+            values['monitor_path'] = os.path.join(state_dir, f'task_monitor_{label}.sqlite')
+            log_path = os.path.join(log_dir, f'{label}.log')
+            futures[pool.submit(run_job, path, values, log_path)] = label
+
+        for future in as_completed(futures):
+            label = futures[future]
+            result = dict(future.result(), job=label)
+            results.append(result)
+            status = 'failed' if result['error'] else 'done'
+            log(f"[{label}] {status} in {result['seconds']:.0f} s on worker {result['worker']} "
+                f"({len(results)}/{len(jobs)})")
+
+    seconds = time.time() - started_at
+    summary = {
+        'driver': os.path.relpath(path, ROOT),
+        'parameters': parameters,
+        'workers': workers,
+        'max_in_flight_per_job': share,
+        'seconds': seconds,
+        'jobs': sorted(results, key=lambda result: result['started_at']),
+        'failed': sorted(result['job'] for result in results if result['error']),
+        'throughput': worker_throughput(results),
+        'region_years_per_hour': sum(
+            result['region_years'] for result in results if not result['error']
+        ) / max(seconds, 1e-9) * 3600,
+    }
+
+    for worker, stats in summary['throughput'].items():
+        log(f"worker {worker}: {stats['jobs']} job(s), {stats['region_years']} region-year(s), "
+            f"{stats['region_years_per_hour']:.1f} region-years/h")
+    log(f"{len(results) - len(summary['failed'])}/{len(results)} job(s) done in {seconds:.0f} s "
+        f"({summary['region_years_per_hour']:.1f} region-years/h)")
+    return summary
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m pipeline.cli', description=__doc__.split('\n\n')[0])
+    parser.add_argument('step', choices=sorted(VERSION_PARAMETERS))
+    parser.add_argument('--sensor', choices=sorted(COLLECTIONS), default='landsat')
+    parser.add_argument('--collection', help='collection of the sensor (default: the current one)')
+    parser.add_argument('--map', choices=('general', 'rocky'), default='general')
+    parser.add_argument('--regions', type=parse_range, help="classification regions, e.g. '1-38' or '8,10,14'")
+    parser.add_argument('--years', type=parse_range, required=True, help="years, e.g. '1985-2025'")
+    parser.add_argument('--version-in', help='version of the input samples')
+    parser.add_argument('--version-out', help='version of the output assets')
+    parser.add_argument('--workers', type=int, default=4, help='number of worker processes')
+    parser.add_argument('--project', default='ee-ipam', help='Earth Engine project of the runner')
+    parser.add_argument('--max-in-flight', type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help='concurrent-task quota of the project, shared by the workers')
+    parser.add_argument('--state-dir', default='/content', help='folder of the local manifests, logs and summary')
+    parser.add_argument('--summary', help='path of the JSON run summary')
+    parser.add_argument('--plan', action='store_true', help='print the plan of the launch without submitting anything')
+    return parser
+
+
+def main(argv=None, ee=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        path = driver_path(args.sensor, args.collection, args.map, args.step)
+    except KeyError as error:
+        parser.error(str(error))
+
+    if args.map == 'general' and not args.regions:
+        parser.error('--regions is required for the general map')
+    if args.map == 'rocky' and args.regions:
+        parser.error('the rocky outcrop map covers a single area; --regions does not apply')
+
+    parameters = {
+        'manifest_path': os.path.join(args.state_dir, 'asset_manifest.sqlite'),
+        'cost_model_path': os.path.join(args.state_dir, 'task_costs.sqlite'),
+    }
+    version_in, version_out = VERSION_PARAMETERS[args.step]
+    if args.version_in:
+        parameters[version_in] = args.version_in
+    if args.version_out:
+        parameters[version_out] = args.version_out
+
+    if args.plan:
+        if (args.sensor, args.collection or COLLECTIONS[args.sensor], args.map, args.step) not in PLAN_DRIVERS:
+            parser.error('--plan is available for the Landsat collection 11 general map drivers')
+        plan_launch(path, dict(parameters, regions=args.regions, years=args.years, max_in_flight=args.max_in_flight))
+        return 0
+
+    regions = args.regions
+    folder = OUTPUT_FOLDERS.get((args.sensor, args.collection or COLLECTIONS[args.sensor], args.map, args.step))
+    if folder:
+        if '{version}' in folder and not args.version_out:
+            parser.error('--version-out is required to list the output folder of this driver')
+
+        ee = resolve_ee(ee)
+        ee.Initialize(project=args.project)
+
+        # List the output folder once here instead of once per job
+        folder = folder.format(version=args.version_out)
+        added, removed = AssetManifest(parameters['manifest_path'], ee=ee).refresh(folder)
+        print(f'Manifest of {folder}: {added} asset(s) added, {removed} removed')
+        parameters['manifest_max_age'] = JOB_MANIFEST_MAX_AGE
+
+        regions = order_regions(regions, parameters, ee=ee)
+        print('Regions by predicted cost:', ', '.join(map(str, regions)))
+
+    jobs = plan_jobs(args.map, regions, args.years)
+    summary = run(path, jobs, parameters, args.workers, args.state_dir, args.max_in_flight)
+
+    summary_path = args.summary or os.path.join(
+        args.state_dir, f"run_{args.step}_{args.sensor}_{args.map}_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    with open(summary_path, 'w') as file:
+        json.dump(summary, file, indent=2)
+    print(f'Run summary written to {summary_path}')
+
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Shared factory of the static covariates appended to the mosaics.
+
+The coordinate bands (``latitude``, ``longitude_sin``, ``longitude_cos``),
+HAND, TPI and the ``geomorpho`` stack do not change with the year, but the
+drivers rebuilt them (already clipped) inside the region and year loops.
+The factory builds each covariate once per process, unclipped, so every
+task graph references the same subexpressions; the final ``clip`` of the
+mosaic is the only one applied. The factory is shared by the threads that
+build task graphs, so its memoized images are guarded by a lock.
+"""
+
+import math
+import threading
+
+from ._ee import resolve_ee
+
+HAND_COLLECTION = 'users/gena/global-hand/hand-100'
+TPI_COLLECTION = 'projects/sat-io/open-datasets/Geomorpho90m/tpi'
+
+
+def build_coordinates(ee):
+    # Scaled latitude and sine/cosine of the longitude, cast to Int16
+    coords = ee.Image.pixelLonLat()
+    longitude = coords.select('longitude').multiply(math.pi).divide(180)
+
+    lat = coords.select('latitude').add(5).multiply(-1).multiply(1000).toInt16().rename('latitude')
+    lon_sin = longitude.sin().multiply(-1).multiply(10000).toInt16().rename('longitude_sin')
+    lon_cos = longitude.cos().multiply(-1).multiply(10000).toInt16().rename('longitude_cos')
+
+    return ee.Image.cat([lat, lon_sin, lon_cos])
+
+
+def build_hand(ee):
+    # Height above the nearest drainage
+    return ee.ImageCollection(HAND_COLLECTION).mosaic().toInt16().rename('hand')
+
+
+def build_tpi(ee):
+    # Topographic Position Index (Geomorpho90m)
+    return ee.ImageCollection(TPI_COLLECTION).mosaic().multiply(10000).round().rename('tpi').toInt64()
+
+
+# Builders of the covariates available by name
+BUILDERS = {
+    'coordinates': build_coordinates,
+    'hand': build_hand,
+    'tpi': build_tpi,
+}
+
+
+class CovariateFactory:
+    """Static covariates built once per process.
+
+    ``geomorpho`` is the driver's dictionary of topographic images; it is
+    available as the ``'geomorpho'`` covariate, concatenated in key order.
+    """
+
+    def __init__(self, geomorpho=None, ee=None):
+        self.ee = resolve_ee(ee)
+        self.geomorpho_images = dict(geomorpho or {})
+        self.images = {}
+        self.stacks = {}
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        """Return the unclipped covariate ``name``, building it on first use."""
+        with self.lock:
+            if name not in self.images:
+                if name == 'geomorpho':
+                    self.images[name] = self.ee.Image.cat(list(self.geomorpho_images.values()))
+                elif name in BUILDERS:
+                    self.images[name] = BUILDERS[name](self.ee)
+                else:
+                    raise KeyError(f'Unknown covariate: {name}')
+            return self.images[name]
+
+    def coordinates(self):
+        return self.get('coordinates')
+
+    def hand(self):
+        return self.get('hand')
+
+    def tpi(self):
+        return self.get('tpi')
+
+    def geomorpho(self):
+        return self.get('geomorpho')
+
+    def stack(self, *names):
+        """Return the unclipped concatenation of the covariates ``names``, in order."""
+        images = [self.get(name) for name in names]
+        with self.lock:
+            if names not in self.stacks:
+                self.stacks[names] = images[0] if len(images) == 1 else self.ee.Image.cat(images)
+            return self.stacks[names]
@@ -0,0 +1,455 @@
+"""Offline stand-in for the Earth Engine Python API.
+
+``FakeEarthEngine`` behaves like the ``ee`` module closely enough to drive
+the classification helpers and driver loops without network access or
+credentials. Every API call builds a node of a local computation graph;
+``getInfo`` and ``ee.data`` requests are counted as server round trips, and
+``ee.batch.Export`` creates tasks whose serialized graph size can be read
+back. The stand-in is used for benchmarking and profiling the drivers.
+
+    fake = FakeEarthEngine()
+    fake.respond('bandNames', ['blue_median', 'year'])
+    submitter = ExportSubmitter(build, ee=fake)
+
+``install()`` registers an instance as ``sys.modules['ee']`` so unmodified
+scripts that ``import ee`` use it.
+"""
+
+import hashlib
+import inspect
+import itertools
+import json
+import sys
+import threading
+from collections import Counter
+
+# Task states, as reported by ``ee.data.getTaskStatus``
+ACTIVE_STATES = ('READY', 'RUNNING')
+
+# Operation state of each task state, as reported by ``ee.data.listOperations``
+OPERATION_STATES = {
+    'READY': 'PENDING',
+    'RUNNING': 'RUNNING',
+    'COMPLETED': 'SUCCEEDED',
+    'FAILED': 'FAILED',
+    'CANCELLED': 'CANCELLED',
+}
+
+
+class Node:
+    """One call of the computation graph (constructor, static function or method)."""
+
+    def __init__(self, fake, func, args=(), kwargs=None, receiver=None):
+        self._fake = fake
+        self.func = func
+        self.receiver = receiver
+        self.args = tuple(encode_argument(fake, arg) for arg in args)
+        self.kwargs = {
+            name: encode_argument(fake, value)
+            for name, value in (kwargs or {}).items()
+        }
+        self._key = None
+
+    def __getattr__(self, name):
+        # Any method call on a node returns a new node
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        def method(*args, **kwargs):
+            return Node(self._fake, name, args, kwargs, receiver=self)
+
+        return method
+
+    def __repr__(self):
+        return f'<fake {self.func}>'
+
+    def children(self):
+        # Nodes referenced by this call, receiver first
+        nodes = [self.receiver] if self.receiver is not None else []
+        for value in itertools.chain(self.args, self.kwargs.values()):
+            nodes.extend(find_nodes(value))
+        return nodes
+
+    def key(self):
+        """Structural hash of the subgraph rooted at this node."""
+        if self._key is None:
+            payload = json.dumps(self.encode(lambda node: node.key()), sort_keys=True)
+            self._key = hashlib.sha1(payload.encode()).hexdigest()
+        return self._key
+
+    def encode(self, reference):
+        # Encode the call, replacing child nodes with ``reference(node)``
+        return {
+            'func': self.func,
+            'receiver': reference(self.receiver) if self.receiver is not None else None,
+            'args': [encode_value(value, reference) for value in self.args],
+            'kwargs': {name: encode_value(value, reference) for name, value in sorted(self.kwargs.items())},
+        }
+
+    def getInfo(self):
+        return self._fake.get_info(self)
+
+    def serialize(self, dedupe=True):
+        return serialize(self, dedupe=dedupe)
+
+
+class Variable(Node):
+    """Placeholder argument used to trace functions passed to ``map``/``iterate``."""
+
+    def __init__(self, fake, name):
+        super().__init__(fake, 'Variable', (name,))
+
+
+def encode_argument(fake, value):
+    # Trace Python callables into graph nodes, as the real client library does
+    if callable(value) and not isinstance(value, (Node, Namespace)):
+        try:
+            arity = len(inspect.signature(value).parameters) or 1
+        except (TypeError, ValueError):
+            arity = 1
+        placeholders = [Variable(fake, f'_MAPPING_VAR_{i}') for i in range(arity)]
+        return Node(fake, 'Function', (), {'body': value(*placeholders), 'arity': arity})
+    if isinstance(value, (list, tuple)):
+        return [encode_argument(fake, item) for item in value]
+    if isinstance(value, dict):
+        return {name: encode_argument(fake, item) for name, item in value.items()}
+    return value
+
+
+def find_nodes(value):
+    if isinstance(value, Node):
+        return [value]
+    if isinstance(value, list):
+        return [node for item in value for node in find_nodes(item)]
+    if isinstance(value, dict):
+        return [node for item in value.values() for node in find_nodes(item)]
+    return []
+
+
+def encode_value(value, reference):
+    if isinstance(value, Node):
+        return reference(value)
+    if isinstance(value, list):
+        return [encode_value(item, reference) for item in value]
+    if isinstance(value, dict):
+        return {name: encode_value(item, reference) for name, item in value.items()}
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return repr(value)
+
+
+def serialize(root, dedupe=True):
+    """Serialize a graph to JSON.
+
+    With ``dedupe`` identical subexpressions are stored once in a value table
+    and referenced by id (as the Earth Engine serializer does); otherwise the
+    graph is written as a plain expression tree.
+    """
+    if not dedupe:
+        def inline(node):
+            return node.encode(inline)
+        return json.dumps(inline(root), separators=(',', ':'))
+
+    values = {}
+    ids = {}
+
+    def reference(node):
+        key = node.key()
+        if key not in ids:
+            encoded = node.encode(reference)
+            ids[key] = str(len(ids))
+            values[ids[key]] = encoded
+        return {'valueReference': ids[key]}
+
+    result = reference(root)['valueReference']
+    return json.dumps({'result': result, 'values': values}, separators=(',', ':'))
+
+
+class Namespace:
+    """Callable path such as ``ee.Image`` or ``ee.Algorithms.Image.Segmentation``."""
+
+    def __init__(self, fake, path):
+        self._fake = fake
+        self._path = path
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return Namespace(self._fake, f'{self._path}.{name}')
+
+    def __call__(self, *args, **kwargs):
+        # Constructors applied to a node are casts and keep the node itself
+        if len(args) == 1 and not kwargs and isinstance(args[0], Node):
+            return args[0]
+        return Node(self._fake, self._path, args, kwargs)
+
+
+class FakeTask:
+    """Export task recorded by the stand-in."""
+
+    def __init__(self, fake, task_type, config):
+        self._fake = fake
+        self.task_type = task_type
+        self.config = config
+        self.id = None
+        self.state = 'UNSUBMITTED'
+        self.polls = 0
+        self.error_message = None
+
+    @property
+    def description(self):
+        return self.config.get('description')
+
+    @property
+    def graph(self):
+        return self.config.get('image') or self.config.get('collection')
+
+    def graph_size(self):
+        """Size in bytes of the serialized task graph."""
+        return len(serialize(self.graph)) if isinstance(self.graph, Node) else 0
+
+    def start(self):
+        self._fake.start_task(self)
+
+    def status(self):
+        return self._fake.task_status(self)
+
+    def active(self):
+        return self.state in ACTIVE_STATES
+
+    def cancel(self):
+        self.state = 'CANCELLED'
+
+
+class Export:
+    """``ee.batch.Export`` with the ``image`` and ``table`` destinations."""
+
+    def __init__(self, fake):
+        self.image = ExportDestination(fake, 'EXPORT_IMAGE')
+        self.table = ExportDestination(fake, 'EXPORT_FEATURES')
+
+
+class ExportDestination:
+    def __init__(self, fake, task_type):
+        self._fake = fake
+        self._task_type = task_type
+
+    def toAsset(self, *args, **kwargs):
+        return self._fake.create_task(self._task_type, 'asset', args, kwargs)
+
+    def toDrive(self, *args, **kwargs):
+        return self._fake.create_task(self._task_type, 'drive', args, kwargs)
+
+
+class Batch:
+    def __init__(self, fake):
+        self.Export = Export(fake)
+        self.Task = TaskNamespace(fake)
+
+
+class TaskNamespace:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def list(self):
+        self._fake.count('Task.list')
+        return list(self._fake.tasks.values())
+
+
+class Data:
+    """``ee.data`` requests answered from the in-memory asset and task tables."""
+
+    def __init__(self, fake):
+        self._fake = fake
+
+    def listAssets(self, params):
+        fake = self._fake
+        fake.count('listAssets')
+
+        parent = params['parent'].rstrip('/')
+        names = sorted(
+            name for name in fake.assets
+            if name.rsplit('/', 1)[0] == parent
+        )
+
+        start = int(params.get('pageToken') or 0)
+        size = params.get('pageSize') or fake.page_size
+        page = names[start:start + size]
+
+        response = {'assets': [{'name': name, 'type': 'IMAGE', 'id': name} for name in page]}
+        if start + size < len(names):
+            response['nextPageToken'] = str(start + size)
+        return response
+
+    def getList(self, params):
+        self._fake.count('getList')
+        parent = params['id'].rstrip('/')
+        return [
+            {'id': name, 'type': 'Image'}
+            for name in sorted(self._fake.assets)
+            if name.rsplit('/', 1)[0] == parent
+        ]
+
+    def getAsset(self, asset_id):
+        self._fake.count('getAsset')
+        if asset_id not in self._fake.assets:
+            raise self._fake.EEException(f'Asset not found: {asset_id}')
+        return {'id': asset_id, 'name': asset_id}
+
+    def getTaskStatus(self, task_ids):
+        # The client library requests the operation of every id, one round trip each
+        if isinstance(task_ids, str):
+            task_ids = [task_ids]
+        statuses = []
+        for task_id in task_ids:
+            self._fake.count('getTaskStatus')
+            task = self._fake.tasks.get(task_id)
+            statuses.append(self._fake.task_status(task) if task else {'id': task_id, 'state': 'UNKNOWN'})
+        return statuses
+
+    def listOperations(self, project=None):
+        # One listing of every operation of the project (the client follows the pages)
+        self._fake.count('listOperations')
+        project = project or self._fake.project or 'earthengine-legacy'
+        operations = []
+        for task in list(self._fake.tasks.values()):
+            status = self._fake.task_status(task)
+            operation = {
+                'name': f'projects/{project}/operations/{task.id}',
+                'metadata': {'state': OPERATION_STATES[status['state']], 'description': task.description},
+            }
+            if status.get('error_message'):
+                operation['error'] = {'message': status['error_message']}
+            operations.append(operation)
+        return operations
+
+    def newTaskId(self, count=1):
+        return [self._fake.new_task_id() for _ in range(count)]
+
+
+class FakeEarthEngine:
+    """In-memory replacement of the ``ee`` module.
+
+    ``assets`` is the set of existing asset ids. Started tasks advance one
+    state per status poll (``READY`` -> ``RUNNING`` -> final state), and
+    ``outcome(task)`` decides the final state (``COMPLETED`` by default).
+    """
+
+    class EEException(Exception):
+        pass
+
+    def __init__(self, assets=(), page_size=1000, outcome=None, polls_to_finish=2, project=None):
+        self.assets = set(assets)
+        self.page_size = page_size
+        self.outcome = outcome or (lambda task: 'COMPLETED')
+        self.polls_to_finish = polls_to_finish
+        self.project = project
+
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.responses = {}
+        self.tasks = {}
+        self.task_ids = itertools.count(1)
+
+        self.data = Data(self)
+        self.batch = Batch(self)
+
+    def __getattr__(self, name):
+        # ee.Image, ee.Filter, ee.Reducer, ... are namespaces of graph constructors
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return Namespace(self, name)
+
+    ## Session
+    def Authenticate(self, *args, **kwargs):
+        pass
+
+    def Initialize(self, *args, project=None, **kwargs):
+        self.project = project or self.project
+
+    ## Round trips
+    def count(self, name):
+        with self.lock:
+            self.calls[name] += 1
+
+    @property
+    def round_trips(self):
+        return sum(self.calls.values())
+
+    def respond(self, func, value):
+        """Answer ``getInfo`` on nodes produced by ``func`` with ``value`` (or ``value(node)``).
+
+        ``getInfo`` on a node of any other function raises ``KeyError``.
+        """
+        self.responses[func] = value
+
+    def get_info(self, node):
+        self.count('getInfo')
+        if node.func not in self.responses:
+            # A silent None would only fail later, far from the request that needed a response
+            raise KeyError(f'No getInfo response registered for {node.func!r}; use respond({node.func!r}, value)')
+        response = self.responses[node.func]
+        return response(node) if callable(response) else response
+
+    ## Tasks
+    def new_task_id(self):
+        with self.lock:
+            return f'FAKE{next(self.task_ids):08d}'
+
+    def create_task(self, task_type, destination, args, kwargs):
+        config = dict(kwargs)
+        if args:
+            config.setdefault('image' if task_type == 'EXPORT_IMAGE' else 'collection', args[0])
+        config['destination'] = destination
+        return FakeTask(self, task_type, config)
+
+    def start_task(self, task):
+        self.count('startProcessing')
+        task.id = task.id or self.new_task_id()
+        task.state = 'READY'
+        with self.lock:
+            self.tasks[task.id] = task
+
+    def task_status(self, task):
+        # Every poll moves an active task one step towards its final state
+        with self.lock:
+            if task.state in ACTIVE_STATES:
+                task.polls += 1
+                if task.polls >= self.polls_to_finish:
+                    task.state = self.outcome(task)
+                    if task.state == 'COMPLETED' and task.config.get('assetId'):
+                        self.assets.add(task.config['assetId'])
+                    elif task.state == 'FAILED':
+                        task.error_message = task.error_message or 'Simulated failure'
+                else:
+                    task.state = 'RUNNING'
+
+        status = {'id': task.id, 'state': task.state, 'description': task.description,
+                  'task_type': task.task_type}
+        if task.error_message and task.state == 'FAILED':
+            status['error_message'] = task.error_message
+        return status
+
+    def finish_all(self):
+        """Drive every active task to its final state."""
+        for task in list(self.tasks.values()):
+            while task.active():
+                self.task_status(task)
+
+    ## Reporting
+    def report(self):
+        """Round trips per request type and graph size per started task."""
+        return {
+            'round_trips': dict(self.calls),
+            'tasks': {
+                task.description: task.graph_size()
+                for task in self.tasks.values()
+            },
+        }
+
+
+def install(fake=None):
+    """Register ``fake`` (or a new stand-in) as the ``ee`` module and return it."""
+    fake = fake or FakeEarthEngine()
+    sys.modules['ee'] = fake
+    return fake
@@ -0,0 +1,155 @@
+"""Size profile of the computation graphs of export tasks.
+
+Large graphs are a known cause of "computation timed out" and memory
+errors. The profiler reads the serialized graph of each task (the
+``values``/``valueReference`` table produced by ``serialize()``, for both
+the real API and ``pipeline.fake_ee``) and reports its byte size, number of
+distinct nodes, size when expanded as a tree, depth and the subexpressions
+referenced more than once, then ranks the tasks to flag the largest.
+"""
+
+import json
+from collections import Counter
+
+# Keys of the task configuration that may hold the exported graph
+GRAPH_KEYS = ('image', 'collection', 'element', 'expression')
+
+# Default thresholds above which a task is flagged
+MAX_BYTES = 1_000_000
+MAX_DEPTH = 300
+
+
+def task_graph(task):
+    # Exported object of a task, as stored by ``ee.batch.Export``
+    config = getattr(task, 'config', {}) or {}
+    for key in GRAPH_KEYS:
+        if config.get(key) is not None:
+            return config[key]
+    raise ValueError(f'No graph found in task {getattr(task, "id", task)}')
+
+
+def serialized(obj):
+    """Return the serialized graph of ``obj`` as a string."""
+    if isinstance(obj, str):
+        return obj
+    if isinstance(obj, dict):
+        return json.dumps(obj, separators=(',', ':'))
+    return obj.serialize()
+
+
+def references(value):
+    # Ids referenced by ``valueReference`` entries anywhere inside ``value``
+    if isinstance(value, dict):
+        if 'valueReference' in value and len(value) == 1:
+            return [value['valueReference']]
+        return [ref for item in value.values() for ref in references(item)]
+    if isinstance(value, list):
+        return [ref for item in value for ref in references(item)]
+    return []
+
+
+def function_name(value):
+    # Function of a graph value, in the real or the fake serialization format
+    if 'func' in value:
+        return value['func']
+    invocation = value.get('functionInvocationValue')
+    if invocation:
+        return invocation.get('functionName') or 'function'
+    return next(iter(value), 'value')
+
+
+def graph_stats(graph):
+    """Return the size statistics of one serialized graph.
+
+    ``nodes`` counts distinct values and ``tree_nodes`` the nodes of the
+    graph expanded as a tree; ``duplicates`` maps the function of each
+    subexpression referenced more than once to the number of such references.
+    """
+    text = serialized(graph)
+    data = json.loads(text)
+    values = data.get('values', {})
+
+    children = {key: references(value) for key, value in values.items()}
+    referenced = Counter(ref for refs in children.values() for ref in refs)
+
+    # Post-order walk, iterative to cope with deep addBands chains
+    depth = {}
+    tree = {}
+    stack = [(data['result'], False)]
+    while stack:
+        key, expanded = stack.pop()
+        if key in depth:
+            continue
+        if not expanded:
+            stack.append((key, True))
+            stack.extend((child, False) for child in children[key] if child not in depth)
+            continue
+        depth[key] = 1 + max((depth[child] for child in children[key]), default=0)
+        tree[key] = 1 + sum(tree[child] for child in children[key])
+
+    duplicates = Counter()
+    for key, count in referenced.items():
+        if count > 1:
+            duplicates[function_name(values[key])] += count - 1
+
+    return {
+        'bytes': len(text.encode()),
+        'nodes': len(values),
+        'tree_nodes': tree[data['result']],
+        'depth': depth[data['result']],
+        'duplicates': dict(duplicates.most_common()),
+    }
+
+
+def profile_tasks(tasks, log=None):
+    """Profile every task and return a list of rows keyed by task description."""
+    profiles = []
+    for task in tasks:
+        stats = graph_stats(task_graph(task))
+        stats['task'] = task.config.get('description') or getattr(task, 'id', None)
+        profiles.append(stats)
+        if log:
+            log(f"{stats['task']}: {stats['bytes']} bytes, {stats['nodes']} nodes, depth {stats['depth']}")
+    return profiles
+
+
+def top_offenders(profiles, n=10, key='bytes'):
+    """Return the ``n`` profiles with the largest ``key``."""
+    return sorted(profiles, key=lambda row: row[key], reverse=True)[:n]
+
+
+def flagged(profiles, max_bytes=MAX_BYTES, max_depth=MAX_DEPTH):
+    """Return the profiles above the byte or depth thresholds."""
+    return [
+        row for row in profiles
+        if row['bytes'] > max_bytes or row['depth'] > max_depth
+    ]
+
+
+def format_report(profiles, n=10, max_bytes=MAX_BYTES, max_depth=MAX_DEPTH):
+    """Format a text summary of the profiles and their top offenders."""
+    if not profiles:
+        return 'No tasks profiled.'
+
+    total = sum(row['bytes'] for row in profiles)
+    lines = [
+        f'Tasks profiled: {len(profiles)}',
+        f'Total graph size: {total / 1e6:.2f} MB (mean {total / len(profiles) / 1e3:.1f} kB)',
+        '',
+        f'Top {min(n, len(profiles))} tasks by graph size:',
+        f"{'task':<40} {'kB':>9} {'nodes':>7} {'tree':>9} {'depth':>6}  most duplicated",
+    ]
+    for row in top_offenders(profiles, n):
+        repeated = ', '.join(f'{name} x{count}' for name, count in list(row['duplicates'].items())[:3])
+        lines.append(
+            f"{str(row['task']):<40} {row['bytes'] / 1e3:>9.1f} {row['nodes']:>7} "
+            f"{row['tree_nodes']:>9} {row['depth']:>6}  {repeated}"
+        )
+
+    over = flagged(profiles, max_bytes, max_depth)
+    if over:
+        lines.append('')
+        lines.append(f'Flagged ({len(over)}): above {max_bytes / 1e3:.0f} kB or depth {max_depth}')
+        lines.extend(f"  {row['task']}" for row in top_offenders(over, len(over)))
+
+    return '\n'.join(lines)
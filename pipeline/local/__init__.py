@@ -0,0 +1,9 @@
+"""Local NumPy engines of the post-classification filters.
+
+The JavaScript filters (``06_gapfill.js`` onwards) run one server-side
+expression per year and class. These modules apply the same rules to the
+annual classification stack exported as a ``(years, rows, cols)`` uint8
+array (see ``stack.py``, or the chunked store of ``cube.py``), processed
+in spatial chunks so stacks larger than memory can be filtered from
+memory-mapped files. They need ``numpy``.
+"""
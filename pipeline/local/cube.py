@@ -0,0 +1,251 @@
+"""Chunked on-disk store of annual classification stacks.
+
+The temporal rules read the whole series of a few pixels and the spatial
+filters read wide windows of one year, so no single ``.npy`` layout suits
+both. A cube is a directory holding ``(years, rows, cols)`` uint8 data as
+one file per chunk, with a configurable ``(time, y, x)`` chunk shape and
+optional ``zlib`` compression, described by a small JSON file::
+
+    classification_v17.cube/
+        .cube.json      shape, chunks, dtype, compression, fill value
+        0.0.0           chunk (0, 0, 0), always of the full chunk shape
+        0.0.1
+        ...
+
+Missing chunks read as the fill value (NoData), and reading never creates
+them. A cube is indexed with slices like a stack, so it can take the place
+of a memory map in ``tiling.run_tiled`` or the ``*_filter`` functions.
+Uncompressed chunks are opened as memory maps (``chunk_view``), giving
+views into the chunk file without copies. ``rechunk`` copies a stack or
+cube into a new chunk shape through blocks aligned with both chunk shapes,
+so every chunk is read and written once.
+"""
+
+import itertools
+import json
+import math
+import os
+import zlib
+
+import numpy as np
+
+from .stack import FIRST_YEAR, LAST_YEAR, NODATA
+
+META = '.cube.json'
+
+# One year of 1024 x 1024 pixels: whole windows for the spatial filters
+SPATIAL_CHUNKS = (1, 1024, 1024)
+
+# Every year of 64 x 64 pixels: whole series for the temporal rules
+TEMPORAL_CHUNKS = (LAST_YEAR - FIRST_YEAR + 1, 64, 64)
+
+COMPRESSIONS = (None, 'zlib')
+
+
+def chunk_ranges(start, stop, size):
+    """Yield ``(chunk, in_chunk, in_selection)`` along one axis for ``start:stop``."""
+    for chunk in range(start // size, (stop - 1) // size + 1 if stop > start else start // size):
+        low, high = max(start, chunk * size), min(stop, (chunk + 1) * size)
+        yield chunk, slice(low - chunk * size, high - chunk * size), slice(low - start, high - start)
+
+
+class CubeStore:
+    """Chunked ``(years, rows, cols)`` store in the directory ``path``.
+
+    Use ``create_cube`` and ``open_cube`` rather than the constructor.
+    """
+
+    def __init__(self, path, shape, chunks, dtype='uint8', compression=None, level=1, fill=NODATA, mode='r'):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f'Unknown compression {compression!r}; expected one of {COMPRESSIONS}')
+        if len(shape) != 3 or len(chunks) != 3:
+            raise ValueError('Expected a (years, rows, cols) shape and chunk shape')
+        self.path = path
+        self.shape = tuple(shape)
+        self.chunks = tuple(chunks)
+        self.dtype = np.dtype(dtype)
+        self.compression = compression
+        self.level = level
+        self.fill = fill
+        self.mode = mode
+        self.ndim = 3
+
+    @property
+    def grid(self):
+        """Number of chunks along each axis."""
+        return tuple(math.ceil(size / chunk) for size, chunk in zip(self.shape, self.chunks))
+
+    def metadata(self):
+        return {
+            'shape': list(self.shape),
+            'chunks': list(self.chunks),
+            'dtype': self.dtype.str,
+            'compression': self.compression,
+            'level': self.level,
+            'fill': self.fill,
+        }
+
+    def chunk_path(self, index):
+        return os.path.join(self.path, '.'.join(str(i) for i in index))
+
+    def check_writable(self):
+        if self.mode == 'r':
+            raise ValueError(f'{self.path} is open read-only')
+
+    def read_chunk(self, index):
+        """Full chunk ``index`` as a new array (the fill value when it was never written)."""
+        path = self.chunk_path(index)
+        if not os.path.exists(path):
+            return np.full(self.chunks, self.fill, dtype=self.dtype)
+        with open(path, 'rb') as handle:
+            data = handle.read()
+        if self.compression == 'zlib':
+            data = zlib.decompress(data)
+        return np.frombuffer(data, dtype=self.dtype).reshape(self.chunks).copy()
+
+    def write_chunk(self, index, data):
+        """Write the full chunk ``index`` (through a temporary file, so readers never see half a chunk)."""
+        self.check_writable()
+        data = np.ascontiguousarray(data, dtype=self.dtype)
+        if data.shape != self.chunks:
+            raise ValueError(f'Chunk of shape {data.shape}; expected {self.chunks}')
+        payload = data.tobytes()
+        if self.compression == 'zlib':
+            payload = zlib.compress(payload, self.level)
+
+        path = self.chunk_path(index)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as handle:
+            handle.write(payload)
+        os.replace(temporary, path)
+
+    def chunk_view(self, index):
+        """Chunk ``index`` of an uncompressed cube as a memory map (writable unless read-only)."""
+        if self.compression is not None:
+            raise ValueError('Compressed chunks cannot be viewed without a copy; use read_chunk')
+        path = self.chunk_path(index)
+        if not os.path.exists(path):
+            if self.mode == 'r':
+                return np.full(self.chunks, self.fill, dtype=self.dtype)
+            self.write_chunk(index, np.full(self.chunks, self.fill, dtype=self.dtype))
+        return np.memmap(path, dtype=self.dtype, mode='r' if self.mode == 'r' else 'r+', shape=self.chunks)
+
+    def selection(self, key):
+        """``(start, stop)`` of every axis and the axes indexed by an integer."""
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > 3:
+            raise IndexError('Too many indices for a (years, rows, cols) cube')
+        key = key + (slice(None),) * (3 - len(key))
+
+        bounds, dropped = [], []
+        for axis, (item, size) in enumerate(zip(key, self.shape)):
+            if isinstance(item, slice):
+                start, stop, step = item.indices(size)
+                if step != 1:
+                    raise IndexError('Cube slices must have a step of 1')
+                bounds.append((start, max(start, stop)))
+            else:
+                index = int(item) + size if int(item) < 0 else int(item)
+                if not 0 <= index < size:
+                    raise IndexError(f'Index {item} out of range for axis {axis} of size {size}')
+                bounds.append((index, index + 1))
+                dropped.append(axis)
+        return bounds, tuple(dropped)
+
+    def overlaps(self, bounds):
+        # Chunks intersecting the selection, with the slices in the chunk and in the selection
+        ranges = [list(chunk_ranges(start, stop, size)) for (start, stop), size in zip(bounds, self.chunks)]
+        for parts in itertools.product(*ranges):
+            yield (
+                tuple(part[0] for part in parts),
+                tuple(part[1] for part in parts),
+                tuple(part[2] for part in parts),
+            )
+
+    def __getitem__(self, key):
+        bounds, dropped = self.selection(key)
+        out = np.empty([stop - start for start, stop in bounds], dtype=self.dtype)
+        for index, in_chunk, in_selection in self.overlaps(bounds):
+            if not os.path.exists(self.chunk_path(index)):
+                # Never written: the fill value, without creating the chunk (``chunk_view`` would in r+ mode)
+                out[in_selection] = self.fill
+                continue
+            chunk = self.chunk_view(index) if self.compression is None else self.read_chunk(index)
+            out[in_selection] = chunk[in_chunk]
+        return out.squeeze(axis=dropped) if dropped else out
+
+    def __setitem__(self, key, value):
+        self.check_writable()
+        bounds, dropped = self.selection(key)
+        shape = [stop - start for start, stop in bounds]
+        value = np.asarray(value, dtype=self.dtype)
+        if dropped:
+            value = np.expand_dims(value, dropped) if value.ndim == 3 - len(dropped) else value
+        value = np.broadcast_to(value, shape)
+
+        for index, in_chunk, in_selection in self.overlaps(bounds):
+            if self.compression is None:
+                chunk = self.chunk_view(index)
+                chunk[in_chunk] = value[in_selection]
+                chunk.flush()
+                continue
+            covered = all(part.stop - part.start == size for part, size in zip(in_chunk, self.chunks))
+            chunk = np.empty(self.chunks, dtype=self.dtype) if covered else self.read_chunk(index)
+            chunk[in_chunk] = value[in_selection]
+            self.write_chunk(index, chunk)
+
+    def flush(self):
+        # Chunks are written (or flushed) as soon as they are assigned
+        pass
+
+    def stored_bytes(self):
+        """Bytes of the chunk files on disk."""
+        return sum(
+            os.path.getsize(os.path.join(self.path, name))
+            for name in os.listdir(self.path) if name != META and not name.endswith('.tmp')
+        )
+
+
+def create_cube(path, shape, chunks=SPATIAL_CHUNKS, compression=None, level=1, fill=NODATA, dtype=np.uint8):
+    """Create an empty cube in the directory ``path`` and return it open for writing."""
+    chunks = tuple(min(chunk, size) for chunk, size in zip(chunks, shape))
+    cube = CubeStore(path, shape, chunks, dtype, compression, level, fill, mode='r+')
+    os.makedirs(path, exist_ok=False)
+    with open(os.path.join(path, META), 'w') as handle:
+        json.dump(cube.metadata(), handle, indent=2)
+    return cube
+
+
+def open_cube(path, mode='r'):
+    """Open the cube in the directory ``path`` (``mode`` ``'r'`` or ``'r+'``)."""
+    with open(os.path.join(path, META)) as handle:
+        meta = json.load(handle)
+    return CubeStore(
+        path, meta['shape'], meta['chunks'], meta['dtype'], meta['compression'], meta['level'], meta['fill'], mode
+    )
+
+
+def rechunk(source, path, chunks, compression=None, level=1, log=print):
+    """Copy ``source`` (a stack, memory map or cube) into a new cube of ``chunks``.
+
+    The copy runs over blocks whose shape is a multiple of both chunk shapes
+    along every axis, so each source and target chunk is read or written once.
+    One block is held in memory (e.g. ``(41, 1024, 1024)`` between
+    ``SPATIAL_CHUNKS`` and ``TEMPORAL_CHUNKS``).
+    """
+    is_cube = isinstance(source, CubeStore)
+    target = create_cube(path, source.shape, chunks, compression, level, source.fill if is_cube else NODATA)
+    source_chunks = source.chunks if is_cube else target.chunks
+    block = tuple(
+        min(math.lcm(a, b), size) for a, b, size in zip(source_chunks, target.chunks, source.shape)
+    )
+
+    starts = [range(0, size, step) for size, step in zip(source.shape, block)]
+    count = 0
+    for origin in itertools.product(*starts):
+        key = tuple(slice(start, min(start + step, size)) for start, step, size in zip(origin, block, source.shape))
+        target[key] = np.asarray(source[key])
+        count += 1
+    log(f'Rechunked {source.shape} into chunks of {target.chunks} over {count} block(s) of {block}')
+    return target
@@ -0,0 +1,123 @@
+"""Per-trajectory deduplication of the local temporal rules.
+
+The temporal rules (``12_frequency``, ``13_temporal``, ``14_falseRegrowth``)
+only read the series of each pixel, and large areas share the same
+41-year series (stable forest, stable pasture). ``TrajectoryCache`` keys
+every pixel by the bytes of its uint8 series, runs the rule chain once per
+unique series of a tile that is not already cached, and scatters the
+results back through the inverse index of ``np.unique``. Results are kept
+in a bounded LRU cache across tiles, so the common series of a region are
+evaluated once per run. The statistics of every tile (pixels, unique
+series, cache hits and the dedup ratio) are returned and logged.
+
+Any per-pixel step that takes and returns a ``(years, rows, cols)`` chunk
+can be part of the chain; spatial filters cannot.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+from . import frequency, regrowth, temporal
+from .stack import CHUNK_ROWS, create_stack, open_stack, row_chunks
+
+# Per-pixel rules in the order of the collection_110 chain
+TEMPORAL_CHAIN = [frequency.filter_chunk, temporal.filter_chunk, regrowth.filter_chunk]
+
+# Cached series (41 bytes each, plus the result and the dictionary overhead)
+MAX_ENTRIES = 1_000_000
+
+
+class TrajectoryCache:
+    """LRU cache of the results of a rule chain, keyed by the series of a pixel."""
+
+    def __init__(self, chain=TEMPORAL_CHAIN, max_entries=MAX_ENTRIES):
+        self.chain = list(chain)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def evaluate(self, series):
+        """Run the chain on ``(n, years)`` series; return the filtered ``(n, years)`` series."""
+        chunk = np.ascontiguousarray(series.T)[:, :, None]
+        for step in self.chain:
+            chunk = step(chunk)
+        return np.ascontiguousarray(chunk[:, :, 0].T)
+
+    def lookup(self, unique):
+        """Filtered series of every row of ``unique``, from the cache or evaluated."""
+        results = np.empty(unique.shape, dtype=np.uint8)
+        keys = [row.tobytes() for row in unique]
+        missing = []
+
+        for i, key in enumerate(keys):
+            cached = self.entries.get(key)
+            if cached is None:
+                missing.append(i)
+            else:
+                self.entries.move_to_end(key)
+                results[i] = np.frombuffer(cached, dtype=np.uint8)
+
+        if missing:
+            results[missing] = self.evaluate(unique[missing])
+            for i in missing:
+                self.entries[keys[i]] = results[i].tobytes()
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        return results, len(keys) - len(missing)
+
+    def apply(self, chunk):
+        """Filter a ``(years, rows, cols)`` chunk; return the filtered chunk and its statistics."""
+        years, rows, cols = chunk.shape
+        series = np.ascontiguousarray(chunk.reshape(years, rows * cols).T)
+
+        # One fixed-size bytes value per pixel, so rows can be compared as a whole
+        keys = series.view(np.dtype((np.void, years))).ravel()
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        unique = unique_keys.view(np.uint8).reshape(-1, years)
+
+        results, hits = self.lookup(unique)
+        out = results[inverse.ravel()].T.reshape(years, rows, cols)
+
+        stats = {
+            'pixels': rows * cols,
+            'unique': len(unique),
+            'hits': hits,
+            'evaluated': len(unique) - hits,
+            'ratio': rows * cols / max(len(unique), 1),
+        }
+        return out, stats
+
+
+def dedup_filter(stack, out=None, cache=None, chunk_rows=CHUNK_ROWS, log=print):
+    """Apply the chain of ``cache`` to ``stack`` chunk by chunk.
+
+    Returns the filtered stack and the statistics of every chunk.
+    """
+    if out is None:
+        out = np.empty(stack.shape, dtype=np.uint8)
+    if cache is None:
+        cache = TrajectoryCache()
+
+    tiles = []
+    for rows_slice in row_chunks(stack.shape[1], chunk_rows):
+        out[:, rows_slice], stats = cache.apply(np.array(stack[:, rows_slice]))
+        tiles.append(stats)
+        log(
+            f"Rows {rows_slice.start}-{rows_slice.stop}: {stats['unique']:,} unique series in "
+            f"{stats['pixels']:,} pixels (dedup {stats['ratio']:.1f}x), {stats['evaluated']:,} evaluated"
+        )
+    return out, tiles
+
+
+def dedup_filter_file(input_path, output_path, cache=None, chunk_rows=CHUNK_ROWS, log=print):
+    """Filter the ``.npy`` stack at ``input_path`` into a new ``.npy`` file."""
+    stack = open_stack(input_path)
+    out = create_stack(output_path, stack.shape)
+    _, tiles = dedup_filter(stack, out, cache, chunk_rows, log)
+    out.flush()
+    return output_path, tiles
@@ -0,0 +1,138 @@
+"""Local engine of the ``12_frequency.js`` native frequency filter.
+
+The script computes the frequency of every native class with one
+``eq(classId).reduce(sum)`` per class. Here the classes are mapped to a
+small class axis with a lookup table and counted for every pixel of a
+chunk in one ``bincount`` over ``class * pixels + pixel``. Pixels that are
+native in at least ``STABLE_NATIVE_THRESHOLD`` percent of their valid years
+get a stable native class from the per-class thresholds (later thresholds
+win, as the chained ``where`` of the script), and every native year of
+such a pixel that is not part of a run of three equal years is replaced by
+that class.
+
+Frequencies are compared as integers (``count * 100 > threshold * valid``),
+which gives the same result as the percentages of the script. The memory
+used is bounded by ``CHUNK_PIXELS`` pixel-years per chunk.
+"""
+
+import numpy as np
+
+from .stack import NODATA, create_stack, open_stack, row_chunks
+
+NATIVE_CLASSES = [3, 4, 11, 12, 50]
+
+# Minimum frequency (%) of the native classes together for a pixel to be stable native
+STABLE_NATIVE_THRESHOLD = 95
+
+# Stable class thresholds (%), applied in order; later rules overwrite earlier ones
+CLASS_THRESHOLDS = [
+    (4, '>', 40),    # savanna
+    (50, '>=', 60),  # sandbank
+    (12, '>', 50),   # grassland
+    (11, '>=', 40),  # wetland
+    (3, '>=', 60),   # forest
+]
+
+# Pixel-years per chunk (the bincount index uses 8 bytes per pixel-year)
+CHUNK_PIXELS = 16_000_000
+
+
+def class_lookup(classes, nodata=NODATA):
+    """Lookup table from class value to its position on the class axis.
+
+    The counted classes take positions 0 .. n - 1, NoData takes n and any
+    other class n + 1.
+    """
+    lookup = np.full(256, len(classes) + 1, dtype=np.intp)
+    lookup[list(classes)] = np.arange(len(classes))
+    lookup[nodata] = len(classes)
+    return lookup
+
+
+def class_counts(chunk, classes=NATIVE_CLASSES, nodata=NODATA):
+    """Per-pixel counts of ``classes`` and of valid years in one pass.
+
+    Returns ``(counts, valid)``: ``counts`` has one ``(rows, cols)`` plane per
+    class and ``valid`` is the number of years that are not NoData.
+    """
+    years, rows, cols = chunk.shape
+    pixels = rows * cols
+    size = len(classes) + 2
+
+    index = class_lookup(classes, nodata)[chunk.reshape(years, pixels)]
+    index *= pixels
+    index += np.arange(pixels)
+    counts = np.bincount(index.ravel(), minlength=size * pixels).reshape(size, rows, cols)
+
+    valid = years - counts[len(classes)]
+    return counts[:len(classes)], valid
+
+
+def exceeds(count, valid, operator, threshold):
+    # count / valid * 100 compared with the threshold, in integers
+    if operator == '>':
+        return count * 100 > threshold * valid
+    return count * 100 >= threshold * valid
+
+
+def stable_native_class(counts, valid, classes=NATIVE_CLASSES,
+                        stable_threshold=STABLE_NATIVE_THRESHOLD, thresholds=CLASS_THRESHOLDS):
+    """Stable native class of every pixel (0 where there is none)."""
+    position = {class_id: i for i, class_id in enumerate(classes)}
+    stable = (valid > 0) & exceeds(counts.sum(axis=0), valid, '>=', stable_threshold)
+
+    result = np.zeros(valid.shape, dtype=np.uint8)
+    for class_id, operator, threshold in thresholds:
+        mask = stable & exceeds(counts[position[class_id]], valid, operator, threshold)
+        result[mask] = class_id
+    return result
+
+
+def persistent(chunk):
+    """True for the years that belong to a run of at least three equal years."""
+    same = chunk[1:] == chunk[:-1]
+    pairs = same[1:] & same[:-1]
+
+    # A year is persistent when a three-year window ending, centred or starting on it is constant
+    result = np.zeros(chunk.shape, dtype=bool)
+    result[2:] |= pairs
+    result[1:-1] |= pairs
+    result[:-2] |= pairs
+    return result
+
+
+def filter_chunk(chunk, classes=NATIVE_CLASSES, nodata=NODATA, **options):
+    """Apply the frequency filter to a ``(years, rows, cols)`` chunk in place and return it."""
+    counts, valid = class_counts(chunk, classes, nodata)
+    stable = stable_native_class(counts, valid, classes, **options)
+
+    native = np.isin(chunk, classes)
+    mask = native & ~persistent(chunk) & (stable != 0)
+    np.copyto(chunk, stable, where=mask)
+    return chunk
+
+
+def chunk_rows_for(shape, chunk_pixels=CHUNK_PIXELS):
+    """Rows per chunk that keep a chunk within ``chunk_pixels`` pixel-years."""
+    years, _, cols = shape
+    return max(1, chunk_pixels // (years * cols))
+
+
+def frequency_filter(stack, out=None, chunk_pixels=CHUNK_PIXELS, **options):
+    """Apply the frequency filter to ``stack`` chunk by chunk; return the filtered stack."""
+    if out is None:
+        out = np.empty(stack.shape, dtype=np.uint8)
+
+    for rows_slice in row_chunks(stack.shape[1], chunk_rows_for(stack.shape, chunk_pixels)):
+        out[:, rows_slice] = filter_chunk(np.array(stack[:, rows_slice]), **options)
+
+    return out
+
+
+def frequency_filter_file(input_path, output_path, chunk_pixels=CHUNK_PIXELS, **options):
+    """Filter the ``.npy`` stack at ``input_path`` into a new ``.npy`` file."""
+    stack = open_stack(input_path)
+    out = create_stack(output_path, stack.shape)
+    frequency_filter(stack, out, chunk_pixels, **options)
+    out.flush()
+    return output_path
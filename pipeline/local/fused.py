@@ -0,0 +1,140 @@
+"""Fused post-classification chain: every local filter applied per tile in memory.
+
+The collection_110 chain exports a full asset after every filter, so the
+annual stack is written and read again at each step. Here the tile of the
+input stack is read once with the halo of the whole chain, passed through
+every step in memory and only its core is written, with optional
+checkpoints (the core of the tile after chosen steps).
+
+Spatial steps need a halo around the pixels they decide (``Step.halo``),
+and each spatial step narrows the part of the window that is exact by
+its halo. The window therefore carries the sum of the halos of the chain,
+which keeps the core exact whatever the tile size. Per-pixel steps have no
+halo.
+
+The steps follow the order of the collection_110 chain. The filters that
+have no local engine yet (``08_topographic``, ``10_sandbankVegetation``,
+``11_trajectories``, ``15_silviculture`` and ``16_spatialShape``) are
+not part of it.
+"""
+
+import time
+
+import numpy as np
+
+from . import frequency, gapfill, regrowth, spatial, temporal, transitions
+from .stack import create_stack, open_stack
+from .tiling import required_halo, tiles
+
+# Rows and columns of a tile (without the halo); a tile holds every year
+TILE_SIZE = 512
+
+
+class Step:
+    """A filter of the chain applied to a ``(years, rows, cols)`` window.
+
+    ``apply`` returns the filtered window; ``halo`` is the margin (in
+    pixels) it needs to be exact at a pixel.
+    """
+
+    def __init__(self, name, apply, halo=0):
+        self.name = name
+        self.apply = apply
+        self.halo = halo
+
+
+def spatial_window(window, **options):
+    # 07_1stSpatial / 17_2ndSpatial: every year of the window as a single tile
+    return np.stack([spatial.filter_plane(window[t], **options) for t in range(window.shape[0])])
+
+
+# 16_spatialShape (no local engine yet): maxObjectPixels and the 150 m context mode (5 pixels at 30 m)
+SHAPE_MAX_OBJECT_PIXELS = 128
+SHAPE_CONTEXT_RADIUS = 5
+
+# Halo of every spatial filter of the collection_110 chain, from the constants of its engine
+HALOS = {
+    '07_1stSpatial': required_halo(spatial.KERNEL_RADIUS, spatial.MIN_MAPPED_PIXELS),
+    '09_transitions': required_halo(max_patch_pixels=transitions.MAX_PATCH_PIXELS),
+    '16_spatialShape': required_halo(SHAPE_CONTEXT_RADIUS, SHAPE_MAX_OBJECT_PIXELS, context=True),
+    '17_2ndSpatial': required_halo(spatial.KERNEL_RADIUS, spatial.MIN_MAPPED_PIXELS),
+}
+
+STEPS = [
+    Step('gapfill', lambda window: gapfill.fill_chunk(window)[0]),
+    Step('spatial', spatial_window, HALOS['07_1stSpatial']),
+    Step('transitions', transitions.filter_window, HALOS['09_transitions']),
+    Step('frequency', frequency.filter_chunk),
+    Step('temporal', temporal.filter_chunk),
+    Step('regrowth', regrowth.filter_chunk),
+    Step('spatial_2', spatial_window, HALOS['17_2ndSpatial']),
+]
+
+
+def chain_halo(steps):
+    """Halo of the window that keeps the core exact after every step."""
+    return sum(step.halo for step in steps)
+
+
+def run_window(window, steps, timings=None):
+    """Pass a window through every step; yield ``(step, window)`` after each step."""
+    for step in steps:
+        start = time.perf_counter()
+        window = step.apply(window)
+        if timings is not None:
+            timings[step.name] = timings.get(step.name, 0.0) + time.perf_counter() - start
+        yield step, window
+
+
+def fused_filter(stack, out=None, steps=STEPS, checkpoints=None, tile_size=TILE_SIZE, log=print):
+    """Apply ``steps`` to ``stack`` tile by tile; return the filtered stack and a summary.
+
+    ``checkpoints`` maps step names to arrays (or memory maps) of the
+    stack's shape that receive the stack after that step.
+    """
+    if out is None:
+        out = np.empty(stack.shape, dtype=np.uint8)
+    checkpoints = checkpoints or {}
+    unknown = set(checkpoints) - {step.name for step in steps}
+    if unknown:
+        raise ValueError(f'Checkpoints of steps not in the chain: {sorted(unknown)}')
+
+    years, rows, cols = stack.shape
+    halo = chain_halo(steps)
+    summary = {'tiles': 0, 'halo': halo, 'bytes_read': 0, 'bytes_written': 0, 'step_seconds': {}}
+
+    for window, core, inner in tiles(rows, cols, tile_size, halo):
+        data = np.array(stack[(slice(None),) + window])
+        summary['bytes_read'] += data.nbytes
+
+        for step, data in run_window(data, steps, summary['step_seconds']):
+            if step.name in checkpoints:
+                checkpoints[step.name][(slice(None),) + core] = data[(slice(None),) + inner]
+                summary['bytes_written'] += data[(slice(None),) + inner].nbytes
+
+        out[(slice(None),) + core] = data[(slice(None),) + inner]
+        summary['bytes_written'] += data[(slice(None),) + inner].nbytes
+        summary['tiles'] += 1
+
+    log(
+        f"{summary['tiles']} tile(s), halo {halo} px: read {summary['bytes_read'] / 1e9:.2f} GB, "
+        f"wrote {summary['bytes_written'] / 1e9:.2f} GB"
+    )
+    return out, summary
+
+
+def fused_filter_file(input_path, output_path, checkpoints=None, steps=STEPS, tile_size=TILE_SIZE, log=print):
+    """Run the chain on the ``.npy`` stack at ``input_path`` into a new ``.npy`` file.
+
+    ``checkpoints`` maps step names to the ``.npy`` paths of the stacks
+    written after those steps.
+    """
+    stack = open_stack(input_path)
+    out = create_stack(output_path, stack.shape)
+    maps = {name: create_stack(path, stack.shape) for name, path in (checkpoints or {}).items()}
+
+    _, summary = fused_filter(stack, out, steps, maps, tile_size, log)
+    out.flush()
+    for checkpoint in maps.values():
+        checkpoint.flush()
+    return output_path, summary
@@ -0,0 +1,68 @@
+"""Local gap-fill engine equivalent to ``06_gapfill.js``.
+
+The script fills the NoData pixels of every year with the value of the
+previous year (forward pass, ``t0`` to ``tn``) and then fills the gaps left
+at the start of the series with the value of the next year (backward pass,
+``tn`` to ``t0``). Each pass is a last-valid-observation carry: one
+vectorized ``copyto`` per year over a chunk of rows, instead of one chained
+``unmask`` per band on the server. Pixels without any valid year stay
+NoData. The engine also returns the number of years filled in every pixel.
+"""
+
+import numpy as np
+
+from .stack import CHUNK_ROWS, NODATA, create_stack, open_stack, row_chunks
+
+
+def fill_chunk(chunk, out=None, nodata=NODATA):
+    """Gap-fill a ``(years, rows, cols)`` chunk; return the filled chunk and the years filled."""
+    if out is None:
+        out = np.array(chunk, copy=True)
+    elif out is not chunk:
+        out[...] = chunk
+
+    # Forward pass: a gap takes the (already filled) value of the previous year
+    gaps = (out[0] == nodata).astype(np.uint8)
+    for t in range(1, out.shape[0]):
+        mask = out[t] == nodata
+        gaps += mask
+        np.copyto(out[t], out[t - 1], where=mask)
+
+    # Backward pass: gaps left before the first valid year take the value of the next year
+    for t in range(out.shape[0] - 2, -1, -1):
+        np.copyto(out[t], out[t + 1], where=out[t] == nodata)
+
+    # Every gap is filled except in the pixels without any valid year
+    gaps[gaps == out.shape[0]] = 0
+    return out, gaps
+
+
+def gapfill(stack, out=None, filled=None, chunk_rows=CHUNK_ROWS, nodata=NODATA):
+    """Gap-fill ``stack`` chunk by chunk.
+
+    ``out`` (same shape as ``stack``) and ``filled`` (``(rows, cols)``)
+    may be memory maps; they are allocated in memory when not given.
+    Returns ``(out, filled)``.
+    """
+    years, rows, cols = stack.shape
+    if out is None:
+        out = np.empty(stack.shape, dtype=stack.dtype)
+    if filled is None:
+        filled = np.empty((rows, cols), dtype=np.uint8)
+
+    for rows_slice in row_chunks(rows, chunk_rows):
+        chunk = np.asarray(stack[:, rows_slice])
+        _, filled[rows_slice] = fill_chunk(chunk, out[:, rows_slice], nodata)
+
+    return out, filled
+
+
+def gapfill_file(input_path, output_path, filled_path, chunk_rows=CHUNK_ROWS, nodata=NODATA):
+    """Gap-fill the ``.npy`` stack at ``input_path`` into new ``.npy`` files."""
+    stack = open_stack(input_path)
+    out = create_stack(output_path, stack.shape)
+    filled = create_stack(filled_path, stack.shape[1:])
+    gapfill(stack, out, filled, chunk_rows, nodata)
+    out.flush()
+    filled.flush()
+    return output_path, filled_path
@@ -0,0 +1,407 @@
+"""Local engine of the ``14_falseRegrowth.js`` rule set.
+
+The script evaluates its block rules year by year, with one image
+expression per year, block length and position in the block. Here the
+series of every pixel of a chunk is converted to run-length form (the
+value, start and length of each run, as flat arrays over all pixels), and
+a block rule becomes a condition on a run and its neighbouring runs:
+
+- rule 6 (11/12 before deforestation): a run of 11/12 years of at most
+  ``MAX_INTERMEDIATE_NATIVE_BEFORE_DEFORESTATION`` years after 3/4 and
+  before ``MIN_21_AFTER_INTERMEDIATE`` years of 21 (or a one-year 25
+  bridge to 21, which also becomes 21);
+- rule 7 (21 commission): a run of 21 of at most ``MAX_21_COMMISSION``
+  years between classes 4, 11 or 12 takes the class of the next year;
+- rule 8 (short regeneration): a run of native years of at most
+  ``MAX_REGENERATION_BLOCK`` years between runs of at least
+  ``MIN_21_BLOCK_FOR_REGENERATION`` years of 21 becomes 21;
+- rule 9 (wetland after 21): class 11 becomes 21 in every run after the
+  first run of at least ``WETLAND_MIN_PREVIOUS_21`` years of 21.
+
+Rules that mix classes (11 and 12, or the native classes) are run over a
+key that maps those classes to one value. The corrections of each run are
+expanded back to years with ``np.repeat``, so a rule costs time linear in
+the number of runs instead of the square of the block length. The other
+rules only read a few fixed years or the class counts of every pixel and
+are applied to the series directly. ``reference_filter`` is a transcription
+of the script kept to check the engine (``parity``).
+"""
+
+import numpy as np
+
+from .stack import CHUNK_ROWS, FIRST_YEAR, LAST_YEAR, create_stack, open_stack, row_chunks
+
+NATIVE_IDS = [3, 4, 11, 12]
+NATIVE_FOR_21_COMMISSION_IDS = [4, 11, 12]
+REGENERATION_IDS = [3, 4, 11, 12]
+
+MAX_INTERMEDIATE_NATIVE_BEFORE_DEFORESTATION = 3
+MIN_21_AFTER_INTERMEDIATE = 3
+MIN_21_AFTER_25_BRIDGE = 1
+MAX_21_COMMISSION = 3
+GRASSLAND_REFERENCE_END_YEAR = 2024
+MIN_YEARS_LONG_TRAJECTORY = 13
+MIN_21_BLOCK_FOR_REGENERATION = 4
+MAX_REGENERATION_BLOCK = 3
+WETLAND_MIN_PREVIOUS_21 = 3
+RESTINGA_REFERENCE_YEAR = 2014
+RESTINGA_ID = 50
+RESTINGA_ASSOCIATED_IDS = [4, 11, 12]
+
+# Value of the years before the first and after the last year (the padding of the script)
+PAD = -1
+
+
+def key_lookup(merged):
+    """Lookup table from class to run key, where each ``{key: classes}`` group shares one key."""
+    lookup = np.arange(256, dtype=np.int16)
+    for key, classes in merged.items():
+        lookup[classes] = key
+    return lookup
+
+
+def encode(series, lookup=None):
+    """Run-length form of a ``(pixels, years)`` series.
+
+    Returns ``(pixel, value, start, length)`` arrays with one entry per run,
+    ordered by pixel and start year. With ``lookup``, runs are made over
+    ``lookup[series]`` instead of the classes.
+    """
+    values = series.astype(np.int16) if lookup is None else lookup[series]
+    pixels, years = values.shape
+
+    starts = np.ones(values.shape, dtype=bool)
+    starts[:, 1:] = values[:, 1:] != values[:, :-1]
+    pixel, start = np.nonzero(starts)
+
+    flat = pixel * years + start
+    length = np.diff(np.append(flat, pixels * years))
+    return pixel, values[pixel, start], start, length
+
+
+def decode(series, runs, replacement):
+    """Expand ``replacement`` (one value per run, 0 to keep the series) back to years."""
+    expanded = np.repeat(replacement, runs[3]).reshape(series.shape)
+    return np.where(expanded != 0, expanded, series).astype(series.dtype)
+
+
+def shift(runs, values, k, fill=PAD):
+    """``values`` of the run ``k`` positions later (earlier when negative) of the same pixel."""
+    pixel = runs[0]
+    out = np.full(values.shape, fill, dtype=values.dtype)
+    if k > 0:
+        same = pixel[k:] == pixel[:-k]
+        out[:-k][same] = values[k:][same]
+    elif k < 0:
+        same = pixel[-k:] == pixel[:k]
+        out[-k:][same] = values[:k][same]
+    return out
+
+
+def initial_12_from_1987(series, first_year=FIRST_YEAR):
+    # Rule 1: 12 in 1987 and not in 1985 nor 1986 fills both years with 12
+    y1985, y1986, y1987 = (series[:, year - first_year] for year in (1985, 1986, 1987))
+    mask = (y1987 == 12) & (y1985 != 12) & (y1986 != 12)
+    series[mask, 1985 - first_year] = 12
+    series[mask, 1986 - first_year] = 12
+
+
+def initial_25_from_1987(series, first_year=FIRST_YEAR):
+    # Rule 2: 1985 and 1986 take the class of 1987 when exactly one of the two years is 25
+    y1987 = series[:, 1987 - first_year].copy()
+    for year in (1985, 1986):
+        current = series[:, year - first_year]
+        mask = (current == 25) != (y1987 == 25)
+        current[mask] = y1987[mask]
+
+
+def wetland_origin(series):
+    # Rule 3: native series from 11 to 12 keep 11 in their grassland years
+    mask = (series[:, 0] == 11) & (series[:, -1] == 12) & np.isin(series, NATIVE_IDS).all(axis=1)
+    series[(series == 12) & mask[:, None]] = 11
+
+
+def backward_grassland(series):
+    # Rule 4: native series (not starting as 11) ending as 12 become 12 in every year
+    start = series[:, 0]
+    mask = np.isin(start, NATIVE_IDS) & (start != 11) & (series[:, -1] == 12)
+    series[mask] = 12
+
+
+def long_grassland(series, first_year=FIRST_YEAR):
+    # Rule 5: series starting as 21/25 with long 12 presence up to the reference year become 12
+    mask = (
+        np.isin(series[:, 0], [21, 25])
+        & ((series == 12).sum(axis=1) >= MIN_YEARS_LONG_TRAJECTORY)
+        & (series[:, GRASSLAND_REFERENCE_END_YEAR - first_year] == 12)
+    )
+    series[mask] = 12
+
+
+def intermediate_before_deforestation(series):
+    """Rule 6: short 11/12 blocks between 3/4 and 21 (directly or through a 25 bridge) become 21."""
+    runs = encode(series, key_lookup({11: [11, 12], 3: [3, 4]}))
+    _, value, _, length = runs
+    following, following_length = shift(runs, value, 1), shift(runs, length, 1, 0)
+
+    block = (value == 11) & (length <= MAX_INTERMEDIATE_NATIVE_BEFORE_DEFORESTATION) & (shift(runs, value, -1) == 3)
+    after_21 = (following == 21) & (following_length >= MIN_21_AFTER_INTERMEDIATE)
+    bridge = (
+        (following == 25) & (following_length == 1)
+        & (shift(runs, value, 2) == 21) & (shift(runs, length, 2, 0) >= MIN_21_AFTER_25_BRIDGE)
+    )
+
+    replacement = np.zeros(value.shape, dtype=np.int16)
+    replacement[block & (after_21 | bridge)] = 21
+    # The 25 of the bridge becomes 21 as well
+    replacement[shift(runs, block & bridge, -1, False)] = 21
+    return decode(series, runs, replacement)
+
+
+def commission_21(series):
+    """Rule 7: short runs of 21 between classes 4, 11 and 12 take the class of the next year."""
+    runs = encode(series)
+    _, value, _, length = runs
+    following = shift(runs, value, 1)
+
+    mask = (
+        (value == 21) & (length <= MAX_21_COMMISSION)
+        & np.isin(shift(runs, value, -1), NATIVE_FOR_21_COMMISSION_IDS)
+        & np.isin(following, NATIVE_FOR_21_COMMISSION_IDS)
+    )
+    return decode(series, runs, np.where(mask, following, 0))
+
+
+def short_regeneration(series):
+    """Rule 8: short native runs between long runs of 21 become 21."""
+    runs = encode(series, key_lookup({3: REGENERATION_IDS}))
+    _, value, _, length = runs
+
+    mask = (
+        (value == 3) & (length <= MAX_REGENERATION_BLOCK)
+        & (shift(runs, value, -1) == 21) & (shift(runs, length, -1, 0) >= MIN_21_BLOCK_FOR_REGENERATION)
+        & (shift(runs, value, 1) == 21) & (shift(runs, length, 1, 0) >= MIN_21_BLOCK_FOR_REGENERATION)
+    )
+    return decode(series, runs, np.where(mask, 21, 0))
+
+
+def wetland_after_21(series):
+    """Rule 9: 11 becomes 21 after the first run of ``WETLAND_MIN_PREVIOUS_21`` years of 21."""
+    runs = encode(series)
+    pixel, value, _, length = runs
+
+    trigger = ((value == 21) & (length >= WETLAND_MIN_PREVIOUS_21)).astype(np.int32)
+    # Triggers seen in the earlier runs of the same pixel
+    seen = np.cumsum(trigger) - trigger
+    first_run = np.ones(pixel.shape, dtype=bool)
+    first_run[1:] = pixel[1:] != pixel[:-1]
+    seen -= seen[first_run][np.cumsum(first_run) - 1]
+
+    return decode(series, runs, np.where((value == 11) & (seen > 0), 21, 0))
+
+
+def restinga_fixed_area(series, first_year=FIRST_YEAR):
+    # Rule 10: restinga of the reference year in every year; elsewhere it takes the associated mode
+    inside = series[:, RESTINGA_REFERENCE_YEAR - first_year] == RESTINGA_ID
+    series[inside] = RESTINGA_ID
+
+    outside = ~inside & (series == RESTINGA_ID).any(axis=1)
+    if outside.any():
+        counts = np.stack([(series[outside] == class_id).sum(axis=1) for class_id in RESTINGA_ASSOCIATED_IDS])
+        # Lowest class on ties; 12 without any associated year
+        mode = np.array(RESTINGA_ASSOCIATED_IDS, dtype=series.dtype)[counts.argmax(axis=0)]
+        mode[counts.max(axis=0) == 0] = 12
+        rows = series[outside]
+        series[outside] = np.where(rows == RESTINGA_ID, mode[:, None], rows)
+
+
+def filter_series(series, first_year=FIRST_YEAR):
+    """Apply the ten rules to a ``(pixels, years)`` series in order; return the filtered series."""
+    initial_12_from_1987(series, first_year)
+    initial_25_from_1987(series, first_year)
+    wetland_origin(series)
+    backward_grassland(series)
+    long_grassland(series, first_year)
+    series = intermediate_before_deforestation(series)
+    series = commission_21(series)
+    series = short_regeneration(series)
+    series = wetland_after_21(series)
+    restinga_fixed_area(series, first_year)
+    return series
+
+
+def filter_chunk(chunk, first_year=FIRST_YEAR):
+    """Apply the rules to a ``(years, rows, cols)`` chunk; return the filtered chunk."""
+    years, rows, cols = chunk.shape
+    series = np.ascontiguousarray(chunk.reshape(years, rows * cols).T)
+    return filter_series(series, first_year).T.reshape(years, rows, cols)
+
+
+def regrowth_filter(stack, out=None, chunk_rows=CHUNK_ROWS, **options):
+    """Apply the false regrowth rules to ``stack`` chunk by chunk; return the filtered stack."""
+    if out is None:
+        out = np.empty(stack.shape, dtype=np.uint8)
+
+    for rows_slice in row_chunks(stack.shape[1], chunk_rows):
+        out[:, rows_slice] = filter_chunk(np.array(stack[:, rows_slice]), **options)
+
+    return out
+
+
+def regrowth_filter_file(input_path, output_path, chunk_rows=CHUNK_ROWS, **options):
+    """Filter the ``.npy`` stack at ``input_path`` into a new ``.npy`` file."""
+    stack = open_stack(input_path)
+    out = create_stack(output_path, stack.shape)
+    regrowth_filter(stack, out, chunk_rows, **options)
+    out.flush()
+    return output_path
+
+
+def reference_filter(stack, first_year=FIRST_YEAR, last_year=LAST_YEAR):
+    """Year-by-year transcription of ``14_falseRegrowth.js`` (slow; used by ``parity``).
+
+    The padding years of the script are the zeros returned by ``sel``.
+    """
+    years = list(range(first_year, last_year + 1))
+
+    def sel(img, year):
+        if first_year <= year <= last_year:
+            return img[year - first_year].astype(np.int16)
+        return np.zeros(img.shape[1:], dtype=np.int16)
+
+    def in_list(band, ids):
+        return np.isin(band, ids)
+
+    def all_class(img, start, length, class_id):
+        mask = np.ones(img.shape[1:], dtype=bool)
+        for k in range(length):
+            mask &= sel(img, start + k) == class_id
+        return mask
+
+    def all_in_list(img, start, length, ids):
+        mask = np.ones(img.shape[1:], dtype=bool)
+        for k in range(length):
+            mask &= in_list(sel(img, start + k), ids)
+        return mask
+
+    img = np.array(stack, dtype=np.int16)
+
+    # 1
+    y1985, y1986, y1987 = sel(img, 1985), sel(img, 1986), sel(img, 1987)
+    mask = (y1987 == 12) & (y1985 != 12) & (y1986 != 12)
+    img[0] = np.where(mask, y1987, y1985)
+    img[1] = np.where(mask, y1987, y1986)
+
+    # 2
+    y1985, y1986, y1987 = sel(img, 1985), sel(img, 1986), sel(img, 1987)
+    img[0] = np.where(((y1985 == 25) & (y1987 != 25)) | ((y1985 != 25) & (y1987 == 25)), y1987, y1985)
+    img[1] = np.where(((y1986 == 25) & (y1987 != 25)) | ((y1986 != 25) & (y1987 == 25)), y1987, y1986)
+
+    # 3
+    native = np.all([in_list(sel(img, year), NATIVE_IDS) for year in years], axis=0)
+    mask = (sel(img, first_year) == 11) & (sel(img, last_year) == 12) & native
+    img = np.array([np.where(mask & (sel(img, year) == 12), 11, sel(img, year)) for year in years])
+
+    # 4
+    start = sel(img, first_year)
+    traj = in_list(start, NATIVE_IDS) & (start != 11) & (sel(img, last_year) == 12)
+    result = {last_year: sel(img, last_year)}
+    for year in range(last_year - 1, first_year - 1, -1):
+        cur = sel(img, year)
+        result[year] = np.where(traj & (result[year + 1] == 12) & (cur != 12), 12, cur)
+    img = np.array([result[year] for year in years])
+
+    # 5
+    start = sel(img, first_year)
+    stable = (
+        ((start == 21) | (start == 25))
+        & (np.sum([sel(img, year) == 12 for year in years], axis=0) >= MIN_YEARS_LONG_TRAJECTORY)
+        & (sel(img, GRASSLAND_REFERENCE_END_YEAR) == 12)
+    )
+    img = np.array([np.where(stable, 12, sel(img, year)) for year in years])
+
+    # 6
+    out = []
+    for year in years:
+        cur = sel(img, year)
+        mask = np.zeros(cur.shape, dtype=bool)
+        for length in range(1, MAX_INTERMEDIATE_NATIVE_BEFORE_DEFORESTATION + 1):
+            for pos in range(length):
+                start = year - pos
+                before = in_list(sel(img, start - 1), [3, 4])
+                block = all_in_list(img, start, length, [11, 12])
+                after_21 = all_class(img, start + length, MIN_21_AFTER_INTERMEDIATE, 21)
+                bridge = (sel(img, start + length) == 25) & all_class(
+                    img, start + length + 1, MIN_21_AFTER_25_BRIDGE, 21
+                )
+                mask |= in_list(cur, [11, 12]) & before & block & (after_21 | bridge)
+            block_start = year - length
+            mask |= (
+                (cur == 25) & in_list(sel(img, block_start - 1), [3, 4])
+                & all_in_list(img, block_start, length, [11, 12])
+                & all_class(img, year + 1, MIN_21_AFTER_25_BRIDGE, 21)
+            )
+        out.append(np.where(mask, 21, cur))
+    img = np.array(out)
+
+    # 7
+    out = []
+    for year in years:
+        cur = sel(img, year)
+        mask = np.zeros(cur.shape, dtype=bool)
+        replacement = cur
+        for length in range(1, MAX_21_COMMISSION + 1):
+            for pos in range(length):
+                start = year - pos
+                this = (
+                    (cur == 21) & in_list(sel(img, start - 1), NATIVE_FOR_21_COMMISSION_IDS)
+                    & all_class(img, start, length, 21)
+                    & in_list(sel(img, start + length), NATIVE_FOR_21_COMMISSION_IDS)
+                )
+                mask |= this
+                replacement = np.where(this, sel(img, start + length), replacement)
+        out.append(np.where(mask, replacement, cur))
+    img = np.array(out)
+
+    # 8
+    out = []
+    for year in years:
+        cur = sel(img, year)
+        mask = np.zeros(cur.shape, dtype=bool)
+        for length in range(1, MAX_REGENERATION_BLOCK + 1):
+            for pos in range(length):
+                start = year - pos
+                mask |= (
+                    in_list(cur, REGENERATION_IDS)
+                    & all_class(img, start - MIN_21_BLOCK_FOR_REGENERATION, MIN_21_BLOCK_FOR_REGENERATION, 21)
+                    & all_in_list(img, start, length, REGENERATION_IDS)
+                    & all_class(img, start + length, MIN_21_BLOCK_FOR_REGENERATION, 21)
+                )
+        out.append(np.where(mask, 21, cur))
+    img = np.array(out)
+
+    # 9
+    state = np.zeros(img.shape[1:], dtype=bool)
+    out = [sel(img, first_year)]
+    for year in years[1:]:
+        cur = sel(img, year)
+        state |= all_class(img, year - WETLAND_MIN_PREVIOUS_21, WETLAND_MIN_PREVIOUS_21, 21)
+        out.append(np.where(state & (cur == 11), 21, cur))
+    img = np.array(out)
+
+    # 10
+    inside = sel(img, RESTINGA_REFERENCE_YEAR) == RESTINGA_ID
+    counts = np.stack([(img == class_id).sum(axis=0) for class_id in RESTINGA_ASSOCIATED_IDS])
+    mode = np.where(counts.max(axis=0) > 0, np.array(RESTINGA_ASSOCIATED_IDS)[counts.argmax(axis=0)], 12)
+    out = []
+    for year in years:
+        fixed = np.where(inside, RESTINGA_ID, sel(img, year))
+        out.append(np.where(~inside & (fixed == RESTINGA_ID), mode, fixed))
+
+    return np.array(out).astype(np.uint8)
+
+
+def parity(stack):
+    """Number of pixel-years where the engine and ``reference_filter`` differ."""
+    engine = regrowth_filter(stack)
+    return int(np.count_nonzero(engine != reference_filter(stack)))
@@ -0,0 +1,163 @@
+"""Local engine of the ``07_1stSpatial.js`` (and ``17_2ndSpatial.js``) spatial filter.
+
+For every year, classes 15 and 18 are merged into 21, then patches of at
+most ``MIN_MAPPED_PIXELS`` pixels are replaced by the focal mode of a
+``(2 * radius + 1)`` square window: 8-connected patches of any class but
+21 and the protected classes, and 4-connected patches of class 21.
+``PROTECTED_CLASSES`` are never changed.
+
+Patch sizes come from connected-component labelling of every class and
+are exact (``connectedPixelCount`` stops counting at 50). The focal mode
+counts each class in the window with box sums over a zero-padded
+indicator, ignores NoData, and breaks ties towards the lowest class value.
+
+Large years are processed in tiles with the halo of ``tiling.py``
+(``max(radius, MIN_MAPPED_PIXELS)`` pixels), so tiles give the same result
+as the whole year.
+Years are independent and run in a process pool on ``.npy`` stacks.
+Labelling needs ``scipy``.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import ndimage
+
+from .stack import NODATA, create_stack, open_stack
+from .tiling import required_halo, tiles
+
+# Minimum mapped unit in pixels (~1 ha at 30 m)
+MIN_MAPPED_PIXELS = 11
+
+# Forest, wetland and water are never filtered
+PROTECTED_CLASSES = [3, 11, 33]
+
+# Pasture and agriculture are filtered as mosaic of uses
+MERGED_INTO_21 = [15, 18]
+
+# Radius of the focal mode window (4 is a 9 x 9 window)
+KERNEL_RADIUS = 4
+
+# Rows and columns of a tile (without the halo) when a year is filtered alone
+TILE_SIZE = 2048
+
+STRUCTURES = {
+    8: np.ones((3, 3), dtype=bool),
+    4: ndimage.generate_binary_structure(2, 1),
+}
+
+
+def patch_sizes(plane, connectivity=8, nodata=NODATA):
+    """Size of the connected patch of equal class of every pixel (0 for NoData)."""
+    sizes = np.zeros(plane.shape, dtype=np.int64)
+    for class_id in np.unique(plane):
+        if class_id == nodata:
+            continue
+        mask = plane == class_id
+        labels, _ = ndimage.label(mask, structure=STRUCTURES[connectivity])
+        sizes[mask] = np.bincount(labels.ravel())[labels[mask]]
+    return sizes
+
+
+def box_sum(values, radius):
+    """Sum of ``values`` over the ``(2 * radius + 1)`` square window of every pixel."""
+    size = 2 * radius + 1
+    # Small kernels: the count of a window fits in a byte, summed from shifted slices
+    dtype = np.uint8 if size * size <= 255 else np.int32
+    padded = np.pad(values.astype(dtype), radius)
+    rows, cols = values.shape
+
+    # Separable sums: along rows, then along columns
+    vertical = padded[:rows].copy()
+    for k in range(1, size):
+        vertical += padded[k:k + rows]
+    total = vertical[:, :cols].copy()
+    for k in range(1, size):
+        total += vertical[:, k:k + cols]
+    return total
+
+
+def focal_mode(plane, radius=KERNEL_RADIUS, nodata=NODATA):
+    """Most frequent class of the square window of every pixel (lowest class on ties)."""
+    best_count = np.zeros(plane.shape, dtype=np.int32)
+    mode = np.full(plane.shape, nodata, dtype=plane.dtype)
+
+    for class_id in np.unique(plane):
+        if class_id == nodata:
+            continue
+        count = box_sum(plane == class_id, radius)
+        # Classes are visited in increasing order, so ties keep the lower class
+        better = count > best_count
+        mode[better] = class_id
+        best_count[better] = count[better]
+    return mode
+
+
+def filter_plane(plane, radius=KERNEL_RADIUS, min_pixels=MIN_MAPPED_PIXELS,
+                 protected=PROTECTED_CLASSES, nodata=NODATA):
+    """Apply the spatial filter to one year; return the filtered plane."""
+    image = plane.copy()
+    image[np.isin(image, MERGED_INTO_21)] = 21
+
+    valid = image != nodata
+    is_21 = image == 21
+    is_protected = np.isin(image, protected)
+
+    general = valid & ~is_21 & ~is_protected & (patch_sizes(image, 8, nodata) <= min_pixels)
+    small_21 = is_21 & (patch_sizes(image, 4, nodata) <= min_pixels)
+    target = general | small_21
+    if not target.any():
+        return image
+
+    # Pixels whose window holds only NoData keep their class (the masked mode does not blend)
+    mode = focal_mode(image, radius, nodata)
+    target &= mode != nodata
+    image[target] = mode[target]
+    return image
+
+
+def filter_tiled(plane, out=None, tile_size=TILE_SIZE, radius=KERNEL_RADIUS, min_pixels=MIN_MAPPED_PIXELS, **options):
+    """Apply the spatial filter to one year tile by tile (``plane`` may be a memory map)."""
+    if out is None:
+        out = np.empty(plane.shape, dtype=np.uint8)
+
+    halo = required_halo(radius, min_pixels)
+    for window, core, inner in tiles(plane.shape[0], plane.shape[1], tile_size, halo):
+        filtered = filter_plane(np.asarray(plane[window]), radius, min_pixels, **options)
+        out[core] = filtered[inner]
+    return out
+
+
+def spatial_filter(stack, out=None, tile_size=TILE_SIZE, **options):
+    """Apply the spatial filter to every year of an in-memory stack."""
+    if out is None:
+        out = np.empty(stack.shape, dtype=np.uint8)
+    for index in range(stack.shape[0]):
+        filter_tiled(stack[index], out[index], tile_size, **options)
+    return out
+
+
+def filter_year_file(input_path, output_path, index, tile_size, options):
+    # Worker: each process maps both files and writes the plane of its year
+    stack = open_stack(input_path)
+    out = open_stack(output_path, mode='r+')
+    filter_tiled(stack[index], out[index], tile_size, **options)
+    out.flush()
+    return index
+
+
+def spatial_filter_file(input_path, output_path, workers=4, tile_size=TILE_SIZE, log=print, **options):
+    """Filter the ``.npy`` stack at ``input_path`` into a new ``.npy`` file, one year per worker."""
+    stack = open_stack(input_path)
+    create_stack(output_path, stack.shape).flush()
+
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = [
+            pool.submit(filter_year_file, input_path, output_path, index, tile_size, options)
+            for index in range(stack.shape[0])
+        ]
+        for done, future in enumerate(futures, start=1):
+            log(f'Year band {future.result()} filtered ({done}/{len(futures)})')
+    return output_path
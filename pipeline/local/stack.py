@@ -0,0 +1,47 @@
+"""Memory-mapped annual classification stacks.
+
+A stack holds one uint8 band per year, ordered from ``FIRST_YEAR`` on, with
+shape ``(years, rows, cols)`` and 0 as NoData (the masked pixels of the
+``classification_YYYY`` bands). Stacks are stored as ``.npy`` files, so they
+can be opened as memory maps and filtered chunk by chunk.
+"""
+
+import numpy as np
+
+# Years of the Collection 11 Landsat series
+FIRST_YEAR = 1985
+LAST_YEAR = 2025
+
+# Value of the masked (NoData) pixels
+NODATA = 0
+
+# Rows per chunk: 41 years x 256 rows x 8192 columns is ~86 MB of uint8
+CHUNK_ROWS = 256
+
+
+def years(first_year=FIRST_YEAR, last_year=LAST_YEAR):
+    return list(range(first_year, last_year + 1))
+
+
+def year_index(year, first_year=FIRST_YEAR):
+    """Position of ``year`` along the first axis of a stack."""
+    return year - first_year
+
+
+def open_stack(path, mode='r'):
+    """Open a ``.npy`` stack as a memory map."""
+    stack = np.load(path, mmap_mode=mode)
+    if stack.ndim != 3 or stack.dtype != np.uint8:
+        raise ValueError(f'{path}: expected a (years, rows, cols) uint8 stack, got {stack.dtype} {stack.shape}')
+    return stack
+
+
+def create_stack(path, shape, dtype=np.uint8):
+    """Create a ``.npy`` file of ``shape`` and return it as a writable memory map."""
+    return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=tuple(shape))
+
+
+def row_chunks(rows, chunk_rows=CHUNK_ROWS):
+    """Yield the ``slice`` of every chunk of ``chunk_rows`` rows."""
+    for start in range(0, rows, chunk_rows):
+        yield slice(start, min(start + chunk_rows, rows))
@@ -0,0 +1,194 @@
+"""Local engine of the ``13_temporal.js`` window rules.
+
+The script builds one image per year, class and window size from nested
+band selections. Here every rule is evaluated for all years of a chunk at
+once: the window conditions are shifted views of one ``stack == class``
+array along the year axis, combined into a mask covering every centre
+year. The rules and their order follow the script:
+
+1. 5-, 4- and 3-year windows (``C-X-X-X-C``, ``C-X-X-C``, ``C-X-C``) for
+   every class of ``CLASS_ORDER``, the centre years ending at ``MID_END``;
+2. unstable two-year tails (``A-A-X-X`` with ``X`` in 12 or 25);
+3. the last year (``A-A-X``, except when ``X`` is 21);
+4. the recent class 21 anchor of the last year;
+5. the first year (``X-A-A``) for every class of ``FIRST_YEAR_ORDER``;
+6. a final one-year pulse cleanup (``C-X-C``) over the whole series.
+
+As in the script, a window pass of a class reads the stack as it was
+before the pass, and native classes never overwrite class 21 from
+``PROTECT_21_FROM`` on. The input is a gap-filled stack (``06_gapfill``),
+whose pixels are valid in every year or NoData in every year.
+``reference_filter`` is a year-by-year transcription of the script kept to
+check the engine (``parity``).
+"""
+
+import numpy as np
+
+from .stack import CHUNK_ROWS, FIRST_YEAR, LAST_YEAR, create_stack, open_stack, row_chunks
+
+# Overwrite priority of the window rules: later classes win conflicts
+CLASS_ORDER = [33, 25, 21, 12, 11, 50, 4, 3]
+
+# Priority of the first-year correction
+FIRST_YEAR_ORDER = [12, 11, 50, 4, 3]
+
+# Native vegetation classes
+NATIVE_IDS = [3, 4, 11, 12, 50]
+
+# Last centre year of the sliding windows (for the 3-year window)
+MID_END = 2023
+
+# From this year on, native classes do not overwrite class 21 (recent conversions)
+PROTECT_21_FROM = 2023
+
+WINDOW_SIZES = (5, 4, 3)
+
+
+def window_pass(stack, class_id, size, first, last, protect_from=None):
+    """Replace the first year of every ``C-X...-C`` gap of ``size`` years with ``class_id``.
+
+    ``first`` and ``last`` are the indexes of the first and last centre
+    years; from index ``protect_from`` on, class 21 is never replaced.
+    """
+    if last < first:
+        return stack
+
+    eq = stack == class_id
+    count = last - first + 1
+
+    # Window of centre year i: i - 1 and i + size - 2 are the class, i .. i + size - 3 are not
+    mask = eq[first - 1:first - 1 + count] & eq[first + size - 2:first + size - 2 + count]
+    for k in range(size - 2):
+        mask &= ~eq[first + k:first + k + count]
+
+    if protect_from is not None and protect_from <= last:
+        start = max(protect_from - first, 0)
+        mask[start:] &= stack[first + start:last + 1] != 21
+
+    np.copyto(stack[first:last + 1], np.uint8(class_id), where=mask)
+    return stack
+
+
+def edge_tail(stack):
+    # A-A-X-X in the last four years, X being 12 or 25: carry A into the last two years
+    a, b, c, d = stack[-4], stack[-3], stack[-2], stack[-1]
+    mask = (c == d) & ((c == 12) | (c == 25)) & (a == b) & (b != c)
+    np.copyto(stack[-2], b, where=mask)
+    np.copyto(stack[-1], b, where=mask)
+
+
+def last_year(stack):
+    # A-A-X in the last three years, X not 21: the last year takes A
+    b, c, d = stack[-3], stack[-2], stack[-1]
+    mask = (b == c) & (d != c) & (d != 21)
+    np.copyto(stack[-1], c, where=mask)
+
+
+def recent_21_anchor(stack):
+    # 21 in the year before last with support two or three years before: the last year becomes 21
+    a, b, c, d = stack[-4], stack[-3], stack[-2], stack[-1]
+    mask = (c == 21) & ((a == 21) | (b == 21)) & (d != 21)
+    stack[-1][mask] = 21
+
+
+def first_year(stack, order=FIRST_YEAR_ORDER):
+    # X-A-A in the first three years: the first year takes A, class by class
+    for class_id in order:
+        mask = (stack[0] != class_id) & (stack[1] == class_id) & (stack[2] == class_id)
+        stack[0][mask] = class_id
+
+
+def filter_chunk(stack, first_year_value=FIRST_YEAR, mid_end=MID_END, protect_21_from=PROTECT_21_FROM,
+                 class_order=CLASS_ORDER, first_year_order=FIRST_YEAR_ORDER, native_ids=NATIVE_IDS):
+    """Apply every rule to a ``(years, rows, cols)`` chunk in place and return it."""
+    years = stack.shape[0]
+    protect = protect_21_from - first_year_value
+
+    for size in WINDOW_SIZES:
+        last = mid_end - (size - 3) - first_year_value
+        for class_id in class_order:
+            window_pass(stack, class_id, size, 1, last, protect if class_id in native_ids else None)
+
+    edge_tail(stack)
+    last_year(stack)
+    recent_21_anchor(stack)
+    first_year(stack, first_year_order)
+
+    for class_id in class_order:
+        window_pass(stack, class_id, 3, 1, years - 2, protect if class_id in native_ids else None)
+
+    return stack
+
+
+def temporal_filter(stack, out=None, chunk_rows=CHUNK_ROWS, **options):
+    """Apply the temporal rules to ``stack`` chunk by chunk; return the filtered stack.
+
+    ``out`` may be a memory map (or ``stack`` itself to filter in place).
+    ``options`` are passed to ``filter_chunk``.
+    """
+    if out is None:
+        out = np.empty(stack.shape, dtype=np.uint8)
+
+    for rows_slice in row_chunks(stack.shape[1], chunk_rows):
+        chunk = np.array(stack[:, rows_slice])
+        out[:, rows_slice] = filter_chunk(chunk, **options)
+
+    return out
+
+
+def temporal_filter_file(input_path, output_path, chunk_rows=CHUNK_ROWS, **options):
+    """Filter the ``.npy`` stack at ``input_path`` into a new ``.npy`` file."""
+    stack = open_stack(input_path)
+    out = create_stack(output_path, stack.shape)
+    temporal_filter(stack, out, chunk_rows, **options)
+    out.flush()
+    return output_path
+
+
+def reference_filter(stack, first_year_value=FIRST_YEAR, last_year_value=LAST_YEAR):
+    """Year-by-year transcription of ``13_temporal.js`` (slow; used by ``parity``)."""
+    img = {year: np.array(stack[year - first_year_value]) for year in range(first_year_value, last_year_value + 1)}
+
+    def apply_win_class(img, class_id, win_size, y1):
+        result = dict(img)
+        for year in range(first_year_value + 1, y1 + 1):
+            cur = img[year]
+            mask = (img[year - 1] == class_id) & (img[year + win_size - 2] == class_id)
+            for k in range(win_size - 2):
+                mask = mask & (img[year + k] != class_id)
+            if class_id in NATIVE_IDS and year >= PROTECT_21_FROM:
+                mask = mask & ~(cur == 21)
+            result[year] = np.where(mask, class_id, cur).astype(np.uint8)
+        return result
+
+    for win_size in WINDOW_SIZES:
+        for class_id in CLASS_ORDER:
+            img = apply_win_class(img, class_id, win_size, MID_END - (win_size - 3))
+
+    end = last_year_value
+    y2022, y2023, y2024, y2025 = img[end - 3], img[end - 2], img[end - 1], img[end]
+    mask = (y2022 == y2023) & (y2023 != y2024) & (y2024 == y2025) & ((y2024 == 12) | (y2024 == 25))
+    img[end - 1] = np.where(mask, y2023, y2024)
+    img[end] = np.where(mask, y2023, y2025)
+
+    y2023, y2024, y2025 = img[end - 2], img[end - 1], img[end]
+    img[end] = np.where((y2023 == y2024) & (y2025 != y2024) & (y2025 != 21), y2024, y2025)
+
+    y2022, y2023, y2024, y2025 = img[end - 3], img[end - 2], img[end - 1], img[end]
+    img[end] = np.where((y2024 == 21) & ((y2022 == 21) | (y2023 == 21)) & (y2025 != 21), 21, y2025)
+
+    start = first_year_value
+    for class_id in FIRST_YEAR_ORDER:
+        mask = (img[start] != class_id) & (img[start + 1] == class_id) & (img[start + 2] == class_id)
+        img[start] = np.where(mask, class_id, img[start]).astype(np.uint8)
+
+    for class_id in CLASS_ORDER:
+        img = apply_win_class(img, class_id, 3, end - 1)
+
+    return np.stack([img[year] for year in sorted(img)]).astype(np.uint8)
+
+
+def parity(stack):
+    """Number of pixel-years where the engine and ``reference_filter`` differ."""
+    engine = temporal_filter(stack)
+    return int(np.count_nonzero(engine != reference_filter(stack)))
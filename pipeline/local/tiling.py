@@ -0,0 +1,103 @@
+"""Halo-aware tiling of the local spatial filters.
+
+Filters built on connected patches or focal windows decide a pixel from
+its neighbourhood, so a tile is read with a halo around its core and only
+the core is written. ``required_halo`` gives the margin a filter needs:
+
+- a focal window of radius ``r`` reads ``r`` pixels around the pixel;
+- a patch of at most ``n`` pixels spans fewer than ``n`` pixels from any of
+  its pixels, and a patch cut by the window edge at ``n`` pixels from the
+  pixel has more than ``n`` pixels inside the window, so the decision
+  ``size <= n`` is the same as on the whole map;
+- when the focal window reads the decisions of neighbouring patches (as the
+  context mode of ``16_spatialShape``), both margins add up.
+
+With that halo the output does not depend on the tile size. ``run_tiled``
+applies a window function to every tile of a stack, in a process pool
+when the output is a memory map or a chunked store. Each core is written
+by exactly one tile, so the output is the same for any number of workers.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Rows and columns of a tile (without the halo)
+TILE_SIZE = 1024
+
+
+def required_halo(kernel_radius=0, max_patch_pixels=0, context=False):
+    """Margin (in pixels) a filter needs around a pixel to decide it exactly."""
+    if context:
+        return kernel_radius + max_patch_pixels
+    return max(kernel_radius, max_patch_pixels)
+
+
+def tiles(rows, cols, tile_size=TILE_SIZE, halo=0):
+    """Yield ``(window, core, inner)`` slices of every tile.
+
+    ``window`` is the tile with its halo, ``core`` the tile in the plane and
+    ``inner`` the tile inside the window.
+    """
+    for row in range(0, rows, tile_size):
+        for col in range(0, cols, tile_size):
+            core = (slice(row, min(row + tile_size, rows)), slice(col, min(col + tile_size, cols)))
+            top, left = max(row - halo, 0), max(col - halo, 0)
+            window = (slice(top, min(core[0].stop + halo, rows)), slice(left, min(core[1].stop + halo, cols)))
+            inner = (slice(row - top, core[0].stop - top), slice(col - left, core[1].stop - left))
+            yield window, core, inner
+
+
+def run_tile(apply, stack, out, window, core, inner):
+    # Read the window of every year, filter it and write the core
+    filtered = apply(np.asarray(stack[(slice(None),) + window]))
+    out[(slice(None),) + core] = filtered[(slice(None),) + inner]
+
+
+# Task of the worker processes, inherited through fork instead of pickled
+_task = {}
+
+
+def run_task(index):
+    run_tile(_task['apply'], _task['stack'], _task['out'], *_task['tiles'][index])
+    return index
+
+
+def run_tiled(apply, stack, out=None, halo=0, tile_size=TILE_SIZE, workers=1, log=print):
+    """Apply ``apply`` (a ``(years, rows, cols)`` window function) to ``stack`` tile by tile.
+
+    ``stack`` and ``out`` may be memory maps or chunked stores (any object
+    with ``shape`` and slice indexing). With ``workers > 1`` the tiles run in
+    forked processes, which write to ``out`` directly: it must then be a
+    memory map or a store, not an in-memory array, and the tiles must be
+    aligned with the chunks of a store.
+    """
+    if out is None:
+        out = np.empty(stack.shape, dtype=np.uint8)
+    if workers > 1 and type(out) is np.ndarray:
+        raise ValueError('Tiles in worker processes need a memory map or a store as output')
+    chunks = getattr(out, 'chunks', None)
+    if workers > 1 and chunks is not None and (tile_size % chunks[1] or tile_size % chunks[2]):
+        # Two workers would otherwise rewrite the same chunk of a store
+        raise ValueError(f'tile_size must be a multiple of the chunk rows and columns of the output {chunks[1:]}')
+
+    plan = list(tiles(stack.shape[1], stack.shape[2], tile_size, halo))
+    if workers <= 1:
+        for window, core, inner in plan:
+            run_tile(apply, stack, out, window, core, inner)
+    else:
+        _task.update(apply=apply, stack=stack, out=out, tiles=plan)
+        try:
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                for done, _ in enumerate(pool.map(run_task, range(len(plan))), start=1):
+                    if done % 100 == 0:
+                        log(f'{done}/{len(plan)} tiles')
+        finally:
+            _task.clear()
+
+    if hasattr(out, 'flush'):
+        out.flush()
+    log(f'{len(plan)} tile(s) of {tile_size} px with a halo of {halo} px')
+    return out
@@ -0,0 +1,94 @@
+"""Local engine of the ``09_transitions.js`` spatial-temporal transition filter.
+
+Classes are mapped to the Native, Anthropic and Other groups with a
+256-entry lookup table (unlisted classes are group 0, an invalid window).
+A year is a spurious transition when its group differs from the group of
+the previous year and the next year returns to it (``A-B-A``). The three
+shifted views of the group stack give every centre year of a tile at once.
+Spurious pixels are labelled per year by transition code
+(``previous * 100 + current * 10 + next``, 8-connected), and those in a
+patch of at most ``MAX_PATCH_PIXELS`` pixels take the class of the previous
+year. As in the script, every year is compared with the input stack (not
+with the corrected previous year), and the first and last years are left
+unchanged.
+
+Tiles carry a halo of ``MAX_PATCH_PIXELS`` pixels, enough to see the whole
+of every patch small enough to be corrected (see ``tiling.py``).
+"""
+
+import numpy as np
+
+from .spatial import patch_sizes
+from .stack import create_stack, open_stack
+from .tiling import required_halo, tiles
+
+ANTHROPIC_GROUP = 1
+NATIVE_GROUP = 2
+OTHER_GROUP = 7
+
+GROUPS = {
+    NATIVE_GROUP: [3, 4, 11, 12],
+    ANTHROPIC_GROUP: [21, 25],
+    OTHER_GROUP: [33, 27],
+}
+
+# Largest transition patch that is corrected (~1 ha at 30 m)
+MAX_PATCH_PIXELS = 6
+
+# Rows and columns of a tile (without the halo); a tile holds every year
+TILE_SIZE = 1024
+
+
+def group_lookup(groups=GROUPS):
+    """Lookup table from class value to group (0 for classes outside every group)."""
+    lookup = np.zeros(256, dtype=np.uint8)
+    for group, classes in groups.items():
+        lookup[classes] = group
+    return lookup
+
+
+def spurious_codes(groups):
+    """Transition code of the spurious ``A-B-A`` centre years of a group stack (0 elsewhere).
+
+    Returns a ``(years - 2, rows, cols)`` array for the years 1 .. years - 2.
+    """
+    previous, current, following = groups[:-2], groups[1:-1], groups[2:]
+    spurious = (previous == following) & (current != previous) & (previous > 0) & (current > 0)
+
+    codes = previous * np.int16(100) + current * np.int16(10) + following
+    codes[~spurious] = 0
+    return codes
+
+
+def filter_window(window, max_patch_pixels=MAX_PATCH_PIXELS, groups=GROUPS):
+    """Apply the transition filter to a ``(years, rows, cols)`` window; return the filtered copy."""
+    codes = spurious_codes(group_lookup(groups)[window].astype(np.int16))
+    out = np.array(window)
+
+    for t in range(codes.shape[0]):
+        if not codes[t].any():
+            continue
+        small = (codes[t] != 0) & (patch_sizes(codes[t], 8) <= max_patch_pixels)
+        np.copyto(out[t + 1], window[t], where=small)
+    return out
+
+
+def transition_filter(stack, out=None, tile_size=TILE_SIZE, max_patch_pixels=MAX_PATCH_PIXELS, **options):
+    """Apply the transition filter to ``stack`` tile by tile; return the filtered stack."""
+    if out is None:
+        out = np.empty(stack.shape, dtype=np.uint8)
+
+    _, rows, cols = stack.shape
+    for window, core, inner in tiles(rows, cols, tile_size, required_halo(max_patch_pixels=max_patch_pixels)):
+        filtered = filter_window(np.asarray(stack[(slice(None),) + window]), max_patch_pixels, **options)
+        out[(slice(None),) + core] = filtered[(slice(None),) + inner]
+    return out
+
+
+def transition_filter_file(input_path, output_path, tile_size=TILE_SIZE, **options):
+    """Filter the ``.npy`` stack at ``input_path`` into a new ``.npy`` file."""
+    stack = open_stack(input_path)
+    out = create_stack(output_path, stack.shape)
+    transition_filter(stack, out, tile_size, **options)
+    out.flush()
+    return output_path
@@ -0,0 +1,178 @@
+"""Persistent local index of the assets stored in Earth Engine output folders.
+
+``ee.data.listAssets`` returns one page of results per call, and the drivers
+used to compare every expected asset against a Python list of names. The
+manifest keeps the folder listing in a SQLite file, pages through the
+listing on refresh, and answers existence checks from a set, so planning
+thousands of region-years costs a single folder scan.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from ._ee import resolve_ee
+
+# Prefix returned by the API for assets stored in legacy user folders
+LEGACY_PREFIX = 'projects/earthengine-legacy/assets/'
+
+# Number of assets requested per listing page
+PAGE_SIZE = 1000
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS assets (
+    folder TEXT NOT NULL,
+    name TEXT NOT NULL,
+    update_time TEXT,
+    PRIMARY KEY (folder, name)
+);
+CREATE TABLE IF NOT EXISTS folders (
+    folder TEXT PRIMARY KEY,
+    refreshed_at REAL NOT NULL
+);
+'''
+
+
+def normalize_folder(folder):
+    # Folders are keyed without the legacy prefix and the trailing slash
+    return strip_prefix(folder).rstrip('/')
+
+
+def strip_prefix(name):
+    # Remove the legacy prefix so names match the ids used by the drivers
+    if name.startswith(LEGACY_PREFIX):
+        return name[len(LEGACY_PREFIX):]
+    return name
+
+
+def list_assets(folder, ee=None, page_size=PAGE_SIZE):
+    """Yield every asset under ``folder``, following the listing pages."""
+    ee = resolve_ee(ee)
+    page_token = None
+
+    while True:
+        params = {'parent': folder, 'pageSize': page_size}
+        if page_token:
+            params['pageToken'] = page_token
+
+        response = ee.data.listAssets(params)
+        for asset in response.get('assets', []):
+            yield asset
+
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            break
+
+
+class AssetManifest:
+    """SQLite-backed listing of one or more Earth Engine folders."""
+
+    def __init__(self, path, ee=None):
+        self.path = path
+        self.ee = resolve_ee(ee)
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+        # In-memory set of asset names per folder, loaded on first use
+        self.cache = {}
+
+    def close(self):
+        self.db.close()
+
+    def refreshed_at(self, folder):
+        row = self.db.execute(
+            'SELECT refreshed_at FROM folders WHERE folder = ?',
+            (normalize_folder(folder),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def refresh(self, folder, max_age=None):
+        """Synchronize the manifest with the folder listing.
+
+        The listing is skipped when the folder was refreshed less than
+        ``max_age`` seconds ago. Returns the number of added and removed assets.
+        """
+        key = normalize_folder(folder)
+        last = self.refreshed_at(key)
+        if max_age is not None and last is not None and time.time() - last < max_age:
+            return 0, 0
+
+        listed = {
+            strip_prefix(asset['name']): asset.get('updateTime')
+            for asset in list_assets(key, ee=self.ee)
+        }
+
+        with self.lock, self.db:
+            known = {
+                name for (name,) in
+                self.db.execute('SELECT name FROM assets WHERE folder = ?', (key,))
+            }
+            added = listed.keys() - known
+            removed = known - listed.keys()
+
+            # Upsert the current listing and drop assets deleted since the last refresh
+            self.db.executemany(
+                'INSERT OR REPLACE INTO assets (folder, name, update_time) VALUES (?, ?, ?)',
+                [(key, name, update_time) for name, update_time in listed.items()]
+            )
+            self.db.executemany(
+                'DELETE FROM assets WHERE folder = ? AND name = ?',
+                [(key, name) for name in removed]
+            )
+            self.db.execute(
+                'INSERT OR REPLACE INTO folders (folder, refreshed_at) VALUES (?, ?)',
+                (key, time.time())
+            )
+            self.cache[key] = set(listed)
+
+        return len(added), len(removed)
+
+    def add(self, folder, names):
+        """Record assets known to exist (e.g. exports reported as completed)."""
+        key = normalize_folder(folder)
+        names = [strip_prefix(name) for name in names]
+
+        with self.lock, self.db:
+            self.db.executemany(
+                'INSERT OR IGNORE INTO assets (folder, name, update_time) VALUES (?, ?, NULL)',
+                [(key, name) for name in names]
+            )
+            if key in self.cache:
+                self.cache[key].update(names)
+
+    def existing(self, folder):
+        """Return the set of asset ids stored under ``folder``."""
+        key = normalize_folder(folder)
+        if key not in self.cache:
+            with self.lock:
+                self.cache[key] = {
+                    name for (name,) in
+                    self.db.execute('SELECT name FROM assets WHERE folder = ?', (key,))
+                }
+        return self.cache[key]
+
+    def missing(self, folder, expected):
+        """Return the expected asset ids absent from ``folder``, in input order."""
+        existing = self.existing(folder)
+        return [name for name in expected if name not in existing]
+
+    def missing_by_region(self, folder, expected):
+        """Group missing assets by region.
+
+        ``expected`` maps ``(region, year)`` keys to asset ids; the result maps
+        each region with missing assets to its sorted list of missing years.
+        """
+        existing = self.existing(folder)
+        grouped = {}
+
+        for (region, year), name in expected.items():
+            if name not in existing:
+                grouped.setdefault(region, []).append(year)
+
+        return {region: sorted(years) for region, years in grouped.items()}
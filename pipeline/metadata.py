@@ -0,0 +1,30 @@
+"""Batched metadata requests for the classification year loop.
+
+The classification drivers need, for every year, the list of classes found
+in the training samples. It used to be fetched with one ``getInfo`` call per
+year; here the class lists of all years of a region are fetched in a single
+``ee.Dictionary`` request. The band names come from ``pipeline.schema``.
+"""
+
+from ._ee import resolve_ee
+
+
+def prefetch_classes(years, collection_for, property='reference', ee=None):
+    """Return ``{year: sorted class ids}`` with a single server round trip.
+
+    ``collection_for(year)`` returns the training ``ee.FeatureCollection`` of
+    that year (after any balancing applied before training).
+    """
+    ee = resolve_ee(ee)
+    years = list(years)
+    if not years:
+        return {}
+
+    request = ee.Dictionary({
+        str(year): collection_for(year).aggregate_array(property).distinct()
+        for year in years
+    })
+    response = request.getInfo()
+
+    return {year: sorted(response[str(year)]) for year in years}
+
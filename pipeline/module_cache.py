@@ -0,0 +1,186 @@
+"""Content-hashed local cache of the ``mapbiomas-mosaic`` helper modules.
+
+The drivers import ``modules.SpectralIndexes``, ``modules.Mosaic``,
+``modules.SmaAndNdfi``, ``modules.ThreeYearMetrics`` and
+``modules.Miscellaneous`` from the costa-barbara/mapbiomas-mosaic
+repository, and used to delete and re-clone it with notebook shell commands
+on every start. ``load_modules`` keeps one copy of the ``modules`` package
+per source under a directory named after the hash of its content, records
+the commit it came from, and only clones when no verified copy is cached,
+so a start takes milliseconds and works offline once the cache is filled.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPOSITORY = 'https://github.com/costa-barbara/mapbiomas-mosaic.git'
+
+# Branch of each module set (None is the repository's default branch)
+SOURCES = {
+    'landsat': None,
+    'sentinel': 'mapbiomas-mosaics-10m',
+}
+
+# Commit and content hash of the modules the drivers were validated with; update both
+# together after validating a newer commit (``pin()`` returns the values of a branch head).
+# A source whose pins are None uses the head of its branch when first cached (see ``load_modules``).
+LANDSAT_COMMIT = None
+LANDSAT_HASH = None
+SENTINEL_COMMIT = None
+SENTINEL_HASH = None
+
+# Package copied from the repository
+PACKAGE = 'modules'
+
+INDEX = 'index.json'
+
+
+def default_cache_dir():
+    return os.environ.get(
+        'MAPBIOMAS_MODULE_CACHE',
+        os.path.join(os.path.expanduser('~'), '.cache', 'mapbiomas-mosaic')
+    )
+
+
+def content_hash(path):
+    """SHA-256 of the relative paths and contents of the Python files under ``path``."""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+        for name in sorted(files):
+            if not name.endswith('.py'):
+                continue
+            file_path = os.path.join(root, name)
+            digest.update(os.path.relpath(file_path, path).replace(os.sep, '/').encode())
+            with open(file_path, 'rb') as file:
+                digest.update(file.read())
+    return digest.hexdigest()
+
+
+def read_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, INDEX)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_index(cache_dir, index):
+    # Write to a temporary file first so an interrupted run never leaves a broken index
+    path = os.path.join(cache_dir, INDEX)
+    with open(path + '.tmp', 'w') as file:
+        json.dump(index, file, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def fetch(ref, commit, destination, repository=REPOSITORY):
+    """Shallow-clone ``ref`` (or ``commit``) of the repository into ``destination``."""
+    if commit:
+        subprocess.run(['git', 'init', '-q', destination], check=True)
+        subprocess.run(['git', '-C', destination, 'fetch', '-q', '--depth', '1', repository, commit], check=True)
+        subprocess.run(['git', '-C', destination, 'checkout', '-q', 'FETCH_HEAD'], check=True)
+    else:
+        command = ['git', 'clone', '-q', '--depth', '1']
+        if ref:
+            command += ['--branch', ref, '--single-branch']
+        subprocess.run(command + [repository, destination], check=True)
+
+    return subprocess.run(
+        ['git', '-C', destination, 'rev-parse', 'HEAD'],
+        check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+def activate(path):
+    """Put the cached copy at ``path`` first on ``sys.path`` and drop other loaded copies."""
+    for name in list(sys.modules):
+        if name == PACKAGE or name.startswith(PACKAGE + '.'):
+            module_file = getattr(sys.modules[name], '__file__', None) or ''
+            if not os.path.abspath(module_file).startswith(os.path.abspath(path) + os.sep):
+                del sys.modules[name]
+
+    sys.path[:] = [entry for entry in sys.path if entry != path]
+    sys.path.insert(0, path)
+
+
+def load_modules(source='landsat', commit=None, cache_dir=None, refresh=False,
+                 expected_hash=None, max_age=None, repository=REPOSITORY, log=print):
+    """Make the ``modules`` package of ``source`` importable and return its cache path.
+
+    ``commit`` pins a specific commit instead of the head of the source
+    branch, and ``expected_hash`` rejects a copy whose content differs.
+    Without a ``commit``, the head of the branch is cached on first use and
+    reused afterwards; ``max_age`` (seconds) fetches it again once the
+    cached copy is older. ``refresh`` clones again even when a verified
+    copy is cached.
+    """
+    if source not in SOURCES:
+        raise KeyError(f'Unknown module source: {source}')
+
+    cache_dir = cache_dir or default_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+
+    key = f'{source}@{commit}' if commit else source
+    index = read_index(cache_dir)
+    entry = index.get(key)
+
+    if entry and not commit and max_age is not None and time.time() - entry.get('fetched_at', 0) > max_age:
+        log(f'Cached {key} modules are older than {max_age} s; fetching the head of the branch again')
+        entry = None
+
+    # Reuse the cached copy when its content still matches the recorded hash
+    if entry and not refresh:
+        path = os.path.join(cache_dir, entry['hash'][:16])
+        if os.path.isdir(path) and content_hash(os.path.join(path, PACKAGE)) == entry['hash']:
+            if expected_hash and entry['hash'] != expected_hash:
+                raise ValueError(f'Cached {key} modules have hash {entry["hash"]}, expected {expected_hash}')
+            if not commit:
+                log(f'{source} modules are not pinned to a commit; using the cached copy from commit '
+                    f'{entry["commit"][:10]}')
+            activate(path)
+            return path
+        log(f'Cached {key} modules are missing or modified; fetching again')
+
+    if not commit:
+        log(f'{source} modules are not pinned to a commit; fetching the head of the branch')
+
+    with tempfile.TemporaryDirectory(dir=cache_dir) as tmp:
+        clone = os.path.join(tmp, 'repository')
+        revision = fetch(SOURCES[source], commit, clone, repository)
+        digest = content_hash(os.path.join(clone, PACKAGE))
+
+        if expected_hash and digest != expected_hash:
+            raise ValueError(f'Fetched {key} modules have hash {digest}, expected {expected_hash}')
+
+        # Content-addressed copy: identical module sets share one directory
+        path = os.path.join(cache_dir, digest[:16])
+        if os.path.isdir(path) and content_hash(os.path.join(path, PACKAGE)) != digest:
+            shutil.rmtree(path)
+        if not os.path.isdir(path):
+            staging = os.path.join(tmp, 'staging')
+            shutil.copytree(os.path.join(clone, PACKAGE), os.path.join(staging, PACKAGE),
+                            ignore=shutil.ignore_patterns('__pycache__'))
+            os.replace(staging, path)
+
+    index[key] = {'hash': digest, 'commit': revision, 'ref': SOURCES[source], 'fetched_at': time.time()}
+    write_index(cache_dir, index)
+    log(f'Cached {key} modules at commit {revision[:10]} ({digest[:16]})')
+
+    activate(path)
+    return path
+
+
+def pin(source='landsat', repository=REPOSITORY):
+    """Return the commit and content hash of the head of the ``source`` branch, to pin them."""
+    if source not in SOURCES:
+        raise KeyError(f'Unknown module source: {source}')
+    with tempfile.TemporaryDirectory() as tmp:
+        clone = os.path.join(tmp, 'repository')
+        revision = fetch(SOURCES[source], None, clone, repository)
+        return revision, content_hash(os.path.join(clone, PACKAGE))
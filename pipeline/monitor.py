@@ -0,0 +1,306 @@
+"""Export task lifecycle monitor with automatic retries.
+
+The drivers used to start their tasks and exit; failed exports (memory
+limits, computation timeouts, quota) were only noticed when the next run's
+missing-asset scan found holes. The monitor records every started task in a
+local SQLite file, polls the active ones with a single paginated
+``ee.data.listOperations`` listing per cycle (``getTaskStatus`` makes one
+request per task id), and resubmits failed jobs through a ``rebuild(key, attempt)``
+callback with escalated settings (see ``escalate_tile_scale`` and
+``reduce_fraction``), within a per-job attempt limit and a run-wide retry
+budget, waiting with exponential backoff between attempts.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from ._ee import resolve_ee
+
+# Task states that are still waiting or running
+ACTIVE_STATES = ('UNSUBMITTED', 'READY', 'RUNNING', 'CANCEL_REQUESTED')
+
+# Task state of each operation state of ``ee.data.listOperations`` (others are UNKNOWN)
+OPERATION_STATES = {
+    'PENDING': 'READY',
+    'RUNNING': 'RUNNING',
+    'CANCELLING': 'CANCEL_REQUESTED',
+    'SUCCEEDED': 'COMPLETED',
+    'CANCELLED': 'CANCELLED',
+    'FAILED': 'FAILED',
+}
+
+# Seconds a task may be missing from the listing, or in an unknown state, before it counts as failed
+UNKNOWN_TIMEOUT = 3600
+
+# Error messages that will fail again whatever the settings
+PERMANENT_ERRORS = ('already exists', 'not found', 'permission', 'does not have')
+
+# Largest tileScale accepted by ``sampleRegions``/``reduceRegions``
+MAX_TILE_SCALE = 16
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    run TEXT NOT NULL,
+    job TEXT NOT NULL,
+    attempt INTEGER NOT NULL,
+    description TEXT,
+    state TEXT NOT NULL,
+    error TEXT,
+    started_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_run_job ON tasks (run, job);
+'''
+
+
+def escalate_tile_scale(tile_scale, attempt):
+    """Double ``tile_scale`` for every retry (attempt 1 keeps the base value)."""
+    return min(tile_scale * 2 ** (attempt - 1), MAX_TILE_SCALE)
+
+
+def reduce_fraction(fraction, attempt, factor=0.7, minimum=0.3):
+    """Shrink the fraction of training samples kept for every retry."""
+    return max(fraction * factor ** (attempt - 1), minimum)
+
+
+def is_retryable(error):
+    # Memory, timeout, quota and internal errors may pass on a new attempt
+    message = (error or '').lower()
+    return not any(pattern in message for pattern in PERMANENT_ERRORS)
+
+
+def encode_job(key):
+    # Job keys (e.g. ``(region, year)``) are stored as JSON
+    return json.dumps(key)
+
+
+def decode_job(text):
+    value = json.loads(text)
+    return tuple(value) if isinstance(value, list) else value
+
+
+def parse_time(text):
+    # Seconds since the epoch of an RFC 3339 UTC time of the operation metadata
+    if not text:
+        return None
+    whole, _, fraction = text.rstrip('Z').partition('.')
+    seconds = datetime.strptime(whole, '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc).timestamp()
+    return seconds + (float(f'0.{fraction}') if fraction else 0.0)
+
+
+def operation_status(operation):
+    """Task id, state, error and running times of an ``ee.data.listOperations`` entry."""
+    metadata = operation.get('metadata', {})
+    return {
+        'id': operation['name'].rsplit('/', 1)[-1],
+        'state': OPERATION_STATES.get(metadata.get('state'), 'UNKNOWN'),
+        'error_message': operation.get('error', {}).get('message'),
+        'start': parse_time(metadata.get('startTime')),
+        'end': parse_time(metadata.get('endTime') or metadata.get('updateTime')),
+    }
+
+
+def task_duration(status, started_at, now):
+    # Running time reported by the server, or the time since the task was started
+    start, end = status.get('start'), status.get('end')
+    if start and end:
+        return end - start
+    return now - started_at
+
+
+class TaskMonitor:
+    """Persistent tracker of export tasks that retries the failed ones.
+
+    ``run`` names the launch (e.g. the output version): the SQLite file keeps
+    the tasks of earlier launches, and only those of ``run`` are polled and
+    reported, so a new session of the same launch resumes it.
+    ``rebuild(key, attempt)`` returns a new unstarted task for the job
+    ``key``; it receives the attempt number so it can escalate the task
+    settings. Without ``rebuild`` the monitor only tracks the outcomes.
+    A task missing from the listing or in an unknown state stays active for
+    ``unknown_timeout`` seconds after its start, then counts as a (retryable)
+    failure.
+    """
+
+    def __init__(self, path, run, rebuild=None, max_attempts=3, retry_budget=50,
+                 backoff=60, max_backoff=3600, poll_interval=60, unknown_timeout=UNKNOWN_TIMEOUT,
+                 ee=None, sleep=time.sleep, clock=time.time, log=print):
+        self.path = path
+        self.run_id = run
+        self.rebuild = rebuild
+        self.max_attempts = max_attempts
+        self.retry_budget = retry_budget
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.unknown_timeout = unknown_timeout
+        self.ee = resolve_ee(ee)
+        self.sleep = sleep
+        self.clock = clock
+        self.log = log
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+        # Durations of the jobs whose tasks completed while this monitor polled them: key -> seconds
+        self.completed = {}
+
+        # Failed jobs waiting for their backoff delay: key -> (due time, next attempt)
+        self.scheduled = {}
+        self.retries = 0
+
+    def close(self):
+        self.db.close()
+
+    def delay(self, attempt):
+        """Backoff before starting ``attempt`` (exponential, capped)."""
+        return min(self.backoff * 2 ** max(attempt - 2, 0), self.max_backoff)
+
+    def track(self, task, key, attempt=1):
+        """Record a started task as attempt ``attempt`` of job ``key``."""
+        now = self.clock()
+        description = getattr(task, 'config', {}).get('description')
+        with self.lock, self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?, NULL, ?, ?, NULL)',
+                (task.id, self.run_id, encode_job(key), attempt, description, 'READY', now, now)
+            )
+
+    def start(self, task, key, attempt=1):
+        task.start()
+        self.track(task, key, attempt)
+
+    def active(self):
+        """Return ``{task_id: (key, attempt, started_at)}`` of the tasks not yet finished."""
+        placeholders = ','.join('?' * len(ACTIVE_STATES))
+        rows = self.db.execute(
+            f'SELECT task_id, job, attempt, started_at FROM tasks WHERE run = ? AND state IN ({placeholders})',
+            (self.run_id,) + ACTIVE_STATES
+        ).fetchall()
+        return {task_id: (decode_job(job), attempt, started_at) for task_id, job, attempt, started_at in rows}
+
+    def durations(self):
+        """Return ``{key: seconds}`` of the jobs that completed while this monitor polled them.
+
+        Jobs completed in an earlier session of the run are left out, so each
+        duration is reported (e.g. to a cost model) once.
+        """
+        return dict(self.completed)
+
+    def outcomes(self):
+        """Return the state and attempt of the latest task of every job of the run."""
+        rows = self.db.execute(
+            'SELECT job, attempt, state, error FROM tasks WHERE run = ? ORDER BY started_at',
+            (self.run_id,)
+        ).fetchall()
+        return {decode_job(job): (state, attempt, error) for job, attempt, state, error in rows}
+
+    def poll(self):
+        """Update the active tasks from one operation listing; return the finished ones.
+
+        Each finished task is returned as ``(key, attempt, state, error)``.
+        """
+        active = self.active()
+        if not active:
+            return []
+
+        # The listing holds every operation of the project; keep the tracked ones
+        operations = {}
+        for operation in self.ee.data.listOperations():
+            status = operation_status(operation)
+            if status['id'] in active:
+                operations[status['id']] = status
+
+        finished = []
+        now = self.clock()
+
+        with self.lock, self.db:
+            for task_id, (key, attempt, started_at) in active.items():
+                status = operations.get(task_id, {'state': 'UNKNOWN'})
+                state = status['state']
+                error = status.get('error_message')
+
+                if state == 'UNKNOWN':
+                    # Not listed yet or not resolved by the server: wait, then retry it as a failure
+                    if now - started_at < self.unknown_timeout:
+                        continue
+                    state, error = 'FAILED', f'Task status unknown {now - started_at:.0f} s after its start'
+
+                duration = None
+                if state not in ACTIVE_STATES:
+                    duration = task_duration(status, started_at, now)
+                    finished.append((key, attempt, state, error))
+                    if state == 'COMPLETED':
+                        self.completed[key] = duration
+
+                self.db.execute(
+                    'UPDATE tasks SET state = ?, error = ?, updated_at = ?, duration = ? WHERE task_id = ?',
+                    (state, error, now, duration, task_id)
+                )
+
+        return finished
+
+    def schedule(self, key, attempt, error):
+        # Decide whether a failed job gets another attempt and when
+        if self.rebuild is None or not is_retryable(error):
+            return False
+        if attempt >= self.max_attempts or self.retries >= self.retry_budget:
+            return False
+
+        self.retries += 1
+        due = self.clock() + self.delay(attempt + 1)
+        self.scheduled[key] = (due, attempt + 1)
+        self.log(f'[{key}] failed on attempt {attempt} ({error}); '
+                 f'retrying in {due - self.clock():.0f} s')
+        return True
+
+    def resubmit(self):
+        # Rebuild and start the retries whose backoff delay has elapsed
+        now = self.clock()
+        for key, (due, attempt) in sorted(self.scheduled.items(), key=lambda item: item[1][0]):
+            if due > now:
+                continue
+            del self.scheduled[key]
+            try:
+                self.start(self.rebuild(key, attempt), key, attempt)
+            except Exception as error:
+                self.log(f'[{key}] rebuild for attempt {attempt} failed: {error}')
+
+    def run(self):
+        """Poll until every job completed or ran out of attempts; return a summary."""
+        while True:
+            for key, attempt, state, error in self.poll():
+                if state == 'FAILED' and not self.schedule(key, attempt, error):
+                    self.log(f'[{key}] failed permanently on attempt {attempt}: {error}')
+
+            self.resubmit()
+
+            if not self.active() and not self.scheduled:
+                break
+            self.sleep(self.poll_interval)
+
+        summary = self.summary()
+        self.log(f"Completed {summary['completed']} job(s), {len(summary['failed'])} failed, "
+                 f"{self.retries} retry(ies) used")
+        return summary
+
+    def summary(self):
+        outcomes = self.outcomes()
+        return {
+            'completed': sum(1 for state, _, _ in outcomes.values() if state == 'COMPLETED'),
+            'failed': sorted(
+                (key for key, (state, _, _) in outcomes.items() if state in ('FAILED', 'CANCELLED')),
+                key=str
+            ),
+            'retries': self.retries,
+        }
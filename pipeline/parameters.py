@@ -0,0 +1,29 @@
+"""Driver parameters that can be overridden by the command line runner.
+
+The drivers keep their parameters as plain assignments at the top of the
+script so they still run cell by cell in a notebook. Wrapping a value in
+``parameter(name, default)`` lets ``pipeline/cli.py`` replace it for one
+run: the runner passes the overrides of each worker as JSON in the
+``CERRADO_PARAMETERS`` environment variable, and the driver falls back to
+its own default when the variable is not set.
+"""
+
+import json
+import os
+
+ENV_VAR = 'CERRADO_PARAMETERS'
+
+
+def overrides():
+    """Return the parameters overridden for this run (empty in a notebook)."""
+    text = os.environ.get(ENV_VAR)
+    return json.loads(text) if text else {}
+
+
+def parameter(name, default=None):
+    """Return the overridden value of ``name``, or ``default``."""
+    return overrides().get(name, default)
+
+
+def encode(values):
+    return json.dumps(values, sort_keys=True)
@@ -0,0 +1,62 @@
+"""Whole-period classification assets.
+
+The annual export mode writes one asset per region and year (1,558 tasks
+for collection 11), which ``06_gapfill.js`` reassembles by filtering the
+collection by year and mosaicking each band. In the period mode the
+per-year classification images of a region are stacked into one multi-band
+asset, with the year appended to every band name (``classification_1985``,
+``Forest_1985``, ...), so a region needs a single export task and the
+post-classification steps read the ``classification_YYYY`` bands directly.
+"""
+
+from ._ee import resolve_ee
+
+ANNUAL = 'annual'
+PERIOD = 'period'
+EXPORT_MODES = (ANNUAL, PERIOD)
+
+
+def check_mode(mode):
+    if mode not in EXPORT_MODES:
+        raise ValueError(f'Unknown export mode {mode!r}; expected one of {EXPORT_MODES}')
+    return mode
+
+
+def year_band_names(bands, year):
+    """Return ``bands`` with the ``_YYYY`` suffix of ``year``."""
+    return [f'{band}_{year}' for band in bands]
+
+
+def period_asset_name(prefix, region, years, version):
+    """Name of the whole-period asset of a region (e.g. ``CERRADO_12_1985_2025_v17``)."""
+    years = sorted(years)
+    return f'{prefix}_{region}_{years[0]}_{years[-1]}_v{version}'
+
+
+class PeriodStack:
+    """Collect the annual images of one region and stack them into one image.
+
+    ``add(year, image, bands)`` takes the image exported in the annual mode
+    and the client-side list of its band names; the bands are renamed
+    without a server request.
+    """
+
+    def __init__(self, ee=None):
+        self.ee = resolve_ee(ee)
+        self.images = {}
+
+    def __len__(self):
+        return len(self.images)
+
+    @property
+    def years(self):
+        return sorted(self.images)
+
+    def add(self, year, image, bands):
+        self.images[year] = image.select(list(bands), year_band_names(bands, year))
+
+    def image(self):
+        """Return the stacked image, with the years in ascending order."""
+        if not self.images:
+            raise ValueError('No annual images were added to the period stack')
+        return self.ee.Image.cat([self.images[year] for year in self.years])
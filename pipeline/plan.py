@@ -0,0 +1,112 @@
+"""Dry-run plan of a launch: task counts, bands, samples, graph sizes and cost.
+
+Before a new version is launched the drivers can print what the launch
+would involve instead of submitting it: the missing region-years from the
+asset manifest, the band count from the feature schema, the training
+samples of every task, the serialized graph size of a few tasks built
+without starting them (extrapolated to the rest), and the total cost and
+wall-clock time predicted by the cost model for the project's task quota.
+"""
+
+from ._ee import resolve_ee
+from .graph_profile import MAX_BYTES, MAX_DEPTH, graph_stats, task_graph
+from .scheduler import PRIOR, balance, terms
+from .submitter import DEFAULT_MAX_IN_FLIGHT
+
+
+def collection_sizes(assets, ee=None):
+    """Return ``{asset: feature count}`` of several table assets with a single request."""
+    ee = resolve_ee(ee)
+    if not assets:
+        return {}
+    names = {f'a{i}': asset for i, asset in enumerate(assets)}
+    response = ee.Dictionary({
+        name: ee.FeatureCollection(asset).size() for name, asset in names.items()
+    }).getInfo()
+    return {asset: response[name] for name, asset in names.items()}
+
+
+def makespan(costs, slots):
+    """Wall-clock time of running jobs of ``costs`` over ``slots`` concurrent tasks (longest first)."""
+    if not costs:
+        return 0.0
+    bins = balance(list(costs), costs, min(slots, len(costs)))
+    return max(sum(costs[job] for job in jobs) for jobs in bins)
+
+
+class LaunchPlan:
+    """Tasks of a launch with their features, graph profiles and predicted cost.
+
+    ``bands`` is the band count of the feature stack; ``cost_model`` is a
+    ``CostModel`` (the prior weights are used without one).
+    """
+
+    def __init__(self, name, bands, cost_model=None, slots=DEFAULT_MAX_IN_FLIGHT):
+        self.name = name
+        self.bands = bands
+        self.cost_model = cost_model
+        self.slots = slots
+        self.features = {}
+        self.profiles = {}
+
+    def add(self, key, area=0, samples=0):
+        """Add the task ``key`` (e.g. ``(region, year)``) of a region of ``area`` km2."""
+        self.features[key] = {'area': area, 'samples': samples, 'bands': self.bands}
+
+    def profile(self, key, task):
+        """Record the graph profile of the built (unstarted) task ``key``."""
+        self.profiles[key] = graph_stats(task_graph(task))
+
+    def predict(self, key):
+        if self.cost_model is not None:
+            return self.cost_model.predict(self.features[key])
+        return sum(w * t for w, t in zip(PRIOR, terms(self.features[key])))
+
+    def summary(self):
+        costs = {key: self.predict(key) for key in self.features}
+        graph_bytes = [row['bytes'] for row in self.profiles.values()]
+        mean_bytes = sum(graph_bytes) / len(graph_bytes) if graph_bytes else 0
+
+        return {
+            'tasks': len(self.features),
+            'regions': len({key[0] for key in self.features}),
+            'bands': self.bands,
+            'samples': sum(features['samples'] for features in self.features.values()),
+            'profiled': len(self.profiles),
+            'graph_bytes_mean': mean_bytes,
+            'graph_bytes_max': max(graph_bytes, default=0),
+            'graph_bytes_total': mean_bytes * len(self.features),
+            'flagged': sorted(
+                (key for key, row in self.profiles.items()
+                 if row['bytes'] > MAX_BYTES or row['depth'] > MAX_DEPTH),
+                key=str
+            ),
+            'cost_seconds': sum(costs.values()),
+            'wall_clock_seconds': makespan(costs, self.slots),
+            'slots': self.slots,
+        }
+
+    def report(self):
+        """Format the plan as text."""
+        summary = self.summary()
+        lines = [
+            f'Plan of {self.name} (nothing was submitted)',
+            f"Tasks: {summary['tasks']} in {summary['regions']} region(s)",
+            f"Bands per task: {summary['bands']}",
+            f"Training samples: {summary['samples']:,.0f} "
+            f"({summary['samples'] / max(summary['tasks'], 1):,.0f} per task)",
+        ]
+        if summary['profiled']:
+            lines += [
+                f"Graph size: mean {summary['graph_bytes_mean'] / 1e3:.1f} kB, "
+                f"max {summary['graph_bytes_max'] / 1e3:.1f} kB over {summary['profiled']} profiled task(s); "
+                f"~{summary['graph_bytes_total'] / 1e6:.1f} MB in total",
+            ]
+            if summary['flagged']:
+                lines.append(f"Tasks over the graph thresholds: {', '.join(map(str, summary['flagged']))}")
+        lines += [
+            f"Estimated cost: {summary['cost_seconds'] / 3600:.1f} task-hours",
+            f"Estimated wall-clock: {summary['wall_clock_seconds'] / 3600:.1f} h "
+            f"with {summary['slots']} concurrent task(s)",
+        ]
+        return '\n'.join(lines)
@@ -0,0 +1,244 @@
+"""Cost-weighted ordering of region-year export jobs.
+
+Submitting jobs in numeric region order leaves the slowest region-years
+(large regions with many samples) at the tail of a launch, where they run
+alone after the rest of the queue drained. The scheduler predicts the cost
+of every job from its region area, sample count and band count, and orders
+submissions longest-first. Predictions start from a prior proportional to
+``bands * (area + samples)`` and are refitted by least squares on the
+durations recorded in previous runs. The region areas and sample counts
+the features come from are stored in the same file (``CostModel.lookup``),
+so the processes of a command line run fetch them once.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from ._ee import resolve_ee
+
+# Minimum number of recorded durations before the prior is replaced by a fit
+MIN_RECORDS = 10
+
+# Prior weights of the cost terms: constant, area x bands (km2), samples x bands
+PRIOR = (60.0, 0.002, 0.01)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS durations (
+    job TEXT NOT NULL,
+    area REAL NOT NULL,
+    samples REAL NOT NULL,
+    bands REAL NOT NULL,
+    seconds REAL NOT NULL,
+    recorded_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lookups (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    fetched_at REAL NOT NULL
+);
+'''
+
+# Seconds a process waits for another one fetching the same lookup
+LOOKUP_TIMEOUT = 600
+
+
+def terms(features):
+    # Cost terms of a job: constant overhead, pixels to compute, points to sample
+    bands = features.get('bands', 1)
+    return (1.0, features.get('area', 0) * bands, features.get('samples', 0) * bands)
+
+
+def solve(matrix, vector):
+    # Gaussian elimination with partial pivoting (small dense systems)
+    n = len(vector)
+    rows = [list(row) + [value] for row, value in zip(matrix, vector)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        if abs(rows[col][col]) < 1e-12:
+            raise ValueError('Singular system')
+        for r in range(col + 1, n):
+            factor = rows[r][col] / rows[col][col]
+            for c in range(col, n + 1):
+                rows[r][c] -= factor * rows[col][c]
+    solution = [0.0] * n
+    for r in reversed(range(n)):
+        solution[r] = (rows[r][n] - sum(rows[r][c] * solution[c] for c in range(r + 1, n))) / rows[r][r]
+    return solution
+
+
+def fit_weights(samples, ridge=1e-6):
+    """Least-squares weights of the cost terms, clipped to be non-negative."""
+    size = len(PRIOR)
+    # Scale the terms so the normal equations stay well conditioned
+    scale = [max(abs(row[i]) for row, _ in samples) or 1.0 for i in range(size)]
+    normal = [[0.0] * size for _ in range(size)]
+    target = [0.0] * size
+
+    for row, seconds in samples:
+        x = [row[i] / scale[i] for i in range(size)]
+        for i in range(size):
+            target[i] += x[i] * seconds
+            for j in range(size):
+                normal[i][j] += x[i] * x[j]
+
+    for i in range(size):
+        normal[i][i] += ridge
+
+    weights = solve(normal, target)
+    return tuple(max(weight, 0.0) / scale[i] for i, weight in enumerate(weights))
+
+
+class CostModel:
+    """Predicted cost (seconds) of export jobs, learned from recorded durations.
+
+    ``features`` of a job is a dictionary with the region ``area`` (km2), the
+    number of training ``samples`` and the number of ``bands``.
+    """
+
+    def __init__(self, path, min_records=MIN_RECORDS):
+        self.path = path
+        self.min_records = min_records
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.db = sqlite3.connect(path, timeout=LOOKUP_TIMEOUT, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.weights = self.fit()
+
+    def close(self):
+        self.db.close()
+
+    def records(self):
+        rows = self.db.execute('SELECT area, samples, bands, seconds FROM durations').fetchall()
+        return [
+            (terms({'area': area, 'samples': samples, 'bands': bands}), seconds)
+            for area, samples, bands, seconds in rows
+        ]
+
+    def fit(self):
+        """Refit the weights on the recorded durations (the prior until enough are recorded)."""
+        samples = self.records()
+        if len(samples) < self.min_records:
+            return PRIOR
+        try:
+            return fit_weights(samples)
+        except ValueError:
+            return PRIOR
+
+    def record(self, key, features, seconds):
+        self.record_many([(key, features, seconds)])
+
+    def record_many(self, entries):
+        """Store ``(key, features, seconds)`` durations and refit the weights."""
+        now = time.time()
+        with self.lock, self.db:
+            self.db.executemany(
+                'INSERT INTO durations VALUES (?, ?, ?, ?, ?, ?)',
+                [
+                    (json.dumps(key), features.get('area', 0), features.get('samples', 0),
+                     features.get('bands', 1), seconds, now)
+                    for key, features, seconds in entries
+                ]
+            )
+        self.weights = self.fit()
+
+    def lookup(self, key, fetch, max_age=None):
+        """Return the stored result of the server lookup ``key``, calling ``fetch()`` when missing.
+
+        ``key`` is any JSON-serializable description of the request; results
+        older than ``max_age`` seconds are fetched again. The file is locked
+        while fetching, so processes sharing it wait for the first fetch
+        instead of repeating the request.
+        """
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+        with self.lock:
+            self.db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.db.execute('SELECT value, fetched_at FROM lookups WHERE key = ?', (digest,)).fetchone()
+                if row and (max_age is None or time.time() - row[1] < max_age):
+                    value = pickle.loads(row[0])
+                else:
+                    value = fetch()
+                    self.db.execute(
+                        'INSERT OR REPLACE INTO lookups VALUES (?, ?, ?)',
+                        (digest, pickle.dumps(value), time.time())
+                    )
+                self.db.commit()
+            except BaseException:
+                self.db.rollback()
+                raise
+        return value
+
+    def predict(self, features):
+        return sum(w * t for w, t in zip(self.weights, terms(features)))
+
+    def order(self, jobs, features):
+        """Return ``jobs`` sorted by decreasing predicted cost (longest first)."""
+        return sorted(jobs, key=lambda job: self.predict(features[job]), reverse=True)
+
+
+def balance(jobs, costs, bins):
+    """Greedy longest-first assignment of jobs to ``bins`` with the least total cost.
+
+    Returns one list of jobs per bin.
+    """
+    loads = [0.0] * bins
+    assigned = [[] for _ in range(bins)]
+    for job in sorted(jobs, key=lambda job: costs[job], reverse=True):
+        target = min(range(bins), key=lambda i: loads[i])
+        assigned[target].append(job)
+        loads[target] += costs[job]
+    return assigned
+
+
+def region_areas(regions, property='mapb', ee=None, cache=None):
+    """Return ``{region id: area in km2}`` with a single request.
+
+    With a ``cache`` (a ``CostModel``) the result is fetched once for every
+    process sharing its file.
+    """
+    if cache is not None:
+        return cache.lookup(
+            ['region_areas', regions.serialize(), property],
+            lambda: region_areas(regions, property, ee)
+        )
+    ee = resolve_ee(ee)
+    areas = regions.map(lambda feature: feature.set('area_km2', feature.geometry().area(1000).divide(1e6)))
+    response = ee.Dictionary.fromLists(
+        areas.aggregate_array(property).map(lambda value: ee.Number(value).format('%d')),
+        areas.aggregate_array('area_km2')
+    ).getInfo()
+    return {int(region): area for region, area in response.items()}
+
+
+def sample_counts(point_assets, regions, property='mapb', ee=None, cache=None):
+    """Return ``{asset: {region id: point count}}`` for several point assets in one request.
+
+    ``cache`` is used as in ``region_areas``.
+    """
+    if cache is not None:
+        return cache.lookup(
+            ['sample_counts', sorted(point_assets), regions.serialize(), property],
+            lambda: sample_counts(point_assets, regions, property, ee)
+        )
+    ee = resolve_ee(ee)
+    keys = regions.aggregate_array(property).map(lambda value: ee.Number(value).format('%d'))
+
+    def counts(asset):
+        points = ee.FeatureCollection(asset)
+        sized = regions.map(lambda feature: feature.set('n', points.filterBounds(feature.geometry()).size()))
+        return ee.Dictionary.fromLists(keys, sized.aggregate_array('n'))
+
+    response = ee.Dictionary({asset: counts(asset) for asset in point_assets}).getInfo()
+    return {
+        asset: {int(region): count for region, count in response[asset].items()}
+        for asset in point_assets
+    }
@@ -0,0 +1,203 @@
+"""Feature-schema registry: the mosaic band list derived client-side.
+
+The predictor bands handed to ``smileRandomForest.train`` and
+``ee.Filter.notNull`` are the same for every year and region. They follow
+from the feature-stack definition of each driver: the spectral bands, the
+index functions, the ``getMosaic`` percentile suffixes, the coordinate bands
+and the ``geomorpho`` dictionary. The registry derives that list locally and
+checks it against the server once per run.
+
+Some helpers of the ``mapbiomas-mosaic`` modules (e.g. ``getStructuralContext``
+and the trailing three-year metrics) add bands whose names are defined by the
+module itself; they are declared as learned components and filled in by the
+first verification.
+"""
+
+import threading
+
+# Band names added by the index functions of the ``modules.SpectralIndexes``,
+# ``modules.SmaAndNdfi`` and ``modules.Miscellaneous`` helpers
+INDEX_BANDS = {
+    'getFractions': ['gv', 'npv', 'soil', 'cloud', 'shade'],
+    'getNDFI': ['gvs', 'ndfi'],
+    'getSEFI': ['sefi'],
+    'getWEFI': ['wefi'],
+    'getFNS': ['fns'],
+    'getNDVI': ['ndvi'],
+    'getNBR': ['nbr'],
+    'getMNDWI': ['mndwi'],
+    'getPRI': ['pri'],
+    'getCAI': ['cai'],
+    'getEVI2': ['evi2'],
+    'getGCVI': ['gcvi'],
+    'getGRND': ['grnd'],
+    'getMSI': ['msi'],
+    'getGARI': ['gari'],
+    'getGNDVI': ['gndvi'],
+    'getMSAVI': ['msavi'],
+    'getHallCover': ['hallcover'],
+    'getHallHeigth': ['hallheigth'],
+    'getHallHeight': ['hallheight'],
+    'getTGSI': ['tgsi'],
+    'getBSI': ['bsi'],
+    'getNDRI': ['ndri'],
+    'getNDVIRED': ['ndvired'],
+    'getVI700': ['vi700'],
+    'getIRECI': ['ireci'],
+    'getCIRE': ['cire'],
+    'getTCARI': ['tcari'],
+    'getSFDVI': ['sfdvi'],
+    'getNDRE': ['ndre'],
+    'getSlope': ['slope'],
+}
+
+# Percentile suffixes produced by ``getMosaic`` for every input band
+MOSAIC_SUFFIXES = ['median', 'median_dry', 'median_wet', 'min', 'max', 'stdDev']
+
+# Temporal aggregates of the MapBiomas Sentinel-2 mosaics
+SENTINEL_SUFFIXES = ['median', 'median_dry', 'median_wet', 'stdDev']
+
+# Spectral bands of the Landsat and Sentinel-2 sources
+LANDSAT_BANDS = ['blue', 'red', 'green', 'nir', 'swir1', 'swir2']
+SENTINEL_BANDS = ['blue', 'green', 'red', 'red_edge_1', 'red_edge_2', 'red_edge_3',
+                  'red_edge_4', 'nir', 'swir1', 'swir2']
+
+# Bands of the Google Satellite Embedding dataset
+EMBEDDING_BANDS = [f'A{i:02d}' for i in range(64)]
+
+# Coordinate bands built from ``ee.Image.pixelLonLat``
+COORDINATE_BANDS = ['latitude', 'longitude_sin', 'longitude_cos']
+
+# Geomorpho dictionary keys renamed when added to the mosaic
+GEOMORPHO_RENAMES = {'dem': 'merit_dem'}
+
+
+def function_name(function):
+    # Index functions are given either as callables or by name
+    return function if isinstance(function, str) else function.__name__
+
+
+def index_bands(functions):
+    """Return the bands added by a chain of index functions, in order."""
+    bands = []
+    for function in functions:
+        name = function_name(function)
+        if name not in INDEX_BANDS:
+            raise KeyError(f'Unknown index function: {name}')
+        bands.extend(INDEX_BANDS[name])
+    return bands
+
+
+def geomorpho_bands(geomorpho):
+    """Return the band names of a ``geomorpho`` dictionary (or of its keys)."""
+    return [GEOMORPHO_RENAMES.get(key, key) for key in geomorpho]
+
+
+def with_suffixes(bands, suffixes):
+    # Band-major expansion, as produced by the percentile reducers
+    return [f'{band}_{suffix}' for band in bands for suffix in suffixes]
+
+
+class FeatureSchema:
+    """Ordered band list of a feature stack.
+
+    ``components`` is a list of ``(name, bands)`` pairs; ``bands`` is ``None``
+    for components whose band names are only known by the server.
+    """
+
+    def __init__(self, name, components):
+        self.name = name
+        self.components = list(components)
+        self.lock = threading.Lock()
+        self.verified = None
+
+    @property
+    def complete(self):
+        # True when every component band is known locally
+        return all(bands is not None for _, bands in self.components)
+
+    def declared(self):
+        """Return the locally derived band list."""
+        return [band for _, bands in self.components if bands for band in bands]
+
+    def bands(self):
+        """Return the band list, preferring the verified one when available."""
+        return list(self.verified) if self.verified is not None else self.declared()
+
+    def compare(self, server_bands):
+        """Return the declared bands missing on the server and the unexpected ones."""
+        declared = set(self.declared())
+        server = set(server_bands)
+        missing = sorted(declared - server)
+        extra = sorted(server - declared) if self.complete else []
+        return missing, extra
+
+    def verify(self, image, log=print):
+        """Check the schema against ``image`` once per run and return the band list.
+
+        The first call fetches ``image.bandNames()``; later calls reuse the
+        result. A mismatch is reported and the server list is adopted.
+        """
+        with self.lock:
+            if self.verified is None:
+                server_bands = image.bandNames().getInfo()
+                missing, extra = self.compare(server_bands)
+                if missing or extra:
+                    log(f'[{self.name}] feature schema mismatch; using server bands '
+                        f'(missing: {missing}, unexpected: {extra})')
+                self.verified = list(server_bands)
+            return list(self.verified)
+
+
+def landsat_general_schema(index_functions, geomorpho):
+    """Feature stack of the Landsat general-map drivers (collection 11)."""
+    return FeatureSchema('landsat-general', [
+        ('mosaic', with_suffixes(LANDSAT_BANDS + index_bands(index_functions), MOSAIC_SUFFIXES)),
+        ('getStructuralContext', None),
+        ('addThreeYearMetrics', None),
+        ('getSlope', index_bands(['getSlope'])),
+        ('coordinates', COORDINATE_BANDS),
+        ('hand', ['hand']),
+        ('fire_age', ['fire_age']),
+        ('geomorpho', geomorpho_bands(geomorpho)),
+        ('year', ['year']),
+    ])
+
+
+def sentinel_general_schema(index_functions, geomorpho):
+    """Feature stack of the Sentinel-2 general-map drivers (collection 4)."""
+    return FeatureSchema('sentinel-general', [
+        ('mosaic', [
+            f'{band}_{suffix}'
+            for suffix in SENTINEL_SUFFIXES
+            for band in SENTINEL_BANDS + index_bands(index_functions)
+        ]),
+        ('embeddings', EMBEDDING_BANDS),
+        ('coordinates', COORDINATE_BANDS),
+        ('geomorpho', geomorpho_bands(geomorpho)),
+        ('year', ['year']),
+    ])
+
+
+def landsat_rocky_schema(index_functions):
+    """Feature stack of the Landsat rocky-outcrop drivers (collection 11)."""
+    return FeatureSchema('landsat-rocky', [
+        ('mosaic', with_suffixes(LANDSAT_BANDS + index_bands(index_functions), MOSAIC_SUFFIXES)),
+        ('getTerrainMetrics', None),
+        ('getSpatialContext', None),
+        ('coordinates', COORDINATE_BANDS),
+        ('hand', ['hand']),
+        ('tpi', ['tpi']),
+        ('threeYearMetrics', None),
+        ('year', ['year']),
+    ])
+
+
+def sentinel_rocky_schema(geomorpho):
+    """Feature stack of the Sentinel-2 rocky-outcrop drivers (collection 4)."""
+    return FeatureSchema('sentinel-rocky', [
+        ('embeddings', EMBEDDING_BANDS),
+        ('coordinates', COORDINATE_BANDS),
+        ('geomorpho', geomorpho_bands(geomorpho)),
+        ('year', ['year']),
+    ])
@@ -0,0 +1,188 @@
+"""Export workloads sharded across several Earth Engine projects.
+
+Each project has its own concurrent-task quota, so a launch can be spread
+over several projects instead of splitting the region list by hand (the
+commented "conta1..conta5" blocks of the collection 5 scripts). Jobs are
+partitioned in proportion to each project's quota, longest first, and
+every project submits its share through its own ``ExportSubmitter`` in a
+separate worker.
+
+The Earth Engine client keeps one project per process, so real projects
+run in forked worker processes, each initialized with its own project and
+credentials. With ``processes=False`` the workers are threads, which is
+meant for local stand-ins (one ``FakeEarthEngine`` per project).
+"""
+
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from .submitter import DEFAULT_MAX_IN_FLIGHT, ExportSubmitter
+
+# Operation states that occupy a slot of the project queue
+QUEUED_STATES = ('PENDING', 'RUNNING', 'CANCELLING', 'READY', 'UNSUBMITTED')
+
+
+class Shard:
+    """One Earth Engine project taking part in a launch."""
+
+    def __init__(self, project, max_in_flight=DEFAULT_MAX_IN_FLIGHT, workers=4, credentials=None):
+        self.project = project
+        self.max_in_flight = max_in_flight
+        self.workers = workers
+        self.credentials = credentials
+
+    def __repr__(self):
+        return f'Shard({self.project!r}, max_in_flight={self.max_in_flight})'
+
+
+def initialize(shard):
+    """Initialize the Earth Engine client for ``shard`` and return the ``ee`` module."""
+    import ee
+    ee.Initialize(credentials=shard.credentials, project=shard.project)
+    return ee
+
+
+def queued_tasks(ee):
+    """Number of tasks already waiting or running in the project queue."""
+    operations = ee.data.listOperations()
+    return sum(
+        1 for operation in operations
+        if operation.get('metadata', {}).get('state') in QUEUED_STATES
+    )
+
+
+def partition(jobs, shards, costs=None):
+    """Assign ``jobs`` to shards in proportion to their quota.
+
+    Jobs are taken longest first (by ``costs``, one unit each by default) and
+    given to the shard whose load relative to its ``max_in_flight`` is the
+    lowest. Returns ``{project: [jobs]}``.
+    """
+    costs = costs or {}
+    loads = {shard.project: 0.0 for shard in shards}
+    assigned = {shard.project: [] for shard in shards}
+
+    for job in sorted(jobs, key=lambda job: costs.get(job, 1), reverse=True):
+        shard = min(shards, key=lambda s: (loads[s.project] + costs.get(job, 1)) / s.max_in_flight)
+        assigned[shard.project].append(job)
+        loads[shard.project] += costs.get(job, 1)
+
+    return assigned
+
+
+def run_shard(shard, jobs, build, connect, poll_interval, log):
+    """Submit ``jobs`` in the project of ``shard`` and return a picklable summary."""
+    ee = connect(shard)
+
+    # Tasks left in the queue by earlier launches reduce the slots of this one
+    queued = queued_tasks(ee)
+    max_in_flight = max(1, shard.max_in_flight - queued)
+
+    submitter = ExportSubmitter(
+        build=lambda key: build(key, ee),
+        max_in_flight=max_in_flight,
+        workers=shard.workers,
+        poll_interval=poll_interval,
+        ee=ee,
+        log=lambda message: log(f'[{shard.project}] {message}')
+    )
+    started = submitter.run(jobs)
+
+    return {
+        'project': shard.project,
+        'jobs': len(jobs),
+        'queued_before': queued,
+        'max_in_flight': max_in_flight,
+        'started': [task.id for task in started],
+        'built': [key for key in jobs if key not in submitter.build_errors],
+        'build_errors': {str(key): str(error) for key, error in submitter.build_errors.items()},
+    }
+
+
+def run_shard_safely(shard, jobs, build, connect, poll_interval, log):
+    # A failing project must not stop the others; its traceback goes in the summary
+    try:
+        return run_shard(shard, jobs, build, connect, poll_interval, log)
+    except Exception:
+        return {'project': shard.project, 'error': traceback.format_exc()}
+
+
+# Work of the worker processes, inherited through fork instead of pickled
+_work = {}
+
+
+def run_work(index):
+    shard, jobs = _work['shards'][index]
+    return run_shard_safely(shard, jobs, _work['build'], _work['connect'], _work['poll_interval'], _work['log'])
+
+
+class ShardedSubmitter:
+    """Partition jobs across projects and submit each share in its own worker.
+
+    ``build(key, ee)`` returns the unstarted tasks of one job using the
+    given ``ee`` module. ``connect(shard)`` returns the ``ee`` module of a
+    project (``initialize`` by default; a stand-in factory in tests).
+    """
+
+    def __init__(self, shards, build, connect=initialize, processes=True, poll_interval=30, log=print):
+        if not shards:
+            raise ValueError('At least one project is required')
+        self.shards = list(shards)
+        self.build = build
+        self.connect = connect
+        self.processes = processes
+        self.poll_interval = poll_interval
+        self.log = log
+
+    def run(self, jobs, costs=None):
+        """Submit every job; return the summary of each project, keyed by project."""
+        assigned = partition(jobs, self.shards, costs)
+        for shard in self.shards:
+            self.log(f'[{shard.project}] {len(assigned[shard.project])} job(s), '
+                     f'quota {shard.max_in_flight} task(s)')
+
+        work = [(shard, assigned[shard.project]) for shard in self.shards if assigned[shard.project]]
+        if self.processes:
+            summaries = self.run_processes(work)
+        else:
+            summaries = self.run_threads(work)
+
+        for summary in summaries.values():
+            if 'error' in summary:
+                self.log(f"[{summary['project']}] worker failed: {summary['error']}")
+            else:
+                self.log(f"[{summary['project']}] started {len(summary['started'])} task(s), "
+                         f"{len(summary['build_errors'])} job(s) failed to build")
+        return summaries
+
+    def run_threads(self, work):
+        with ThreadPoolExecutor(max_workers=len(work) or 1) as pool:
+            futures = {
+                shard.project: pool.submit(
+                    run_shard_safely, shard, jobs, self.build, self.connect, self.poll_interval, self.log
+                )
+                for shard, jobs in work
+            }
+        return {project: future.result() for project, future in futures.items()}
+
+    def run_processes(self, work):
+        # Forked workers inherit the driver's functions without pickling them. A worker that dies
+        # (e.g. killed for memory) breaks the pool, which fails its futures instead of blocking.
+        _work.update(shards=work, build=self.build, connect=self.connect,
+                     poll_interval=self.poll_interval, log=self.log)
+        summaries = {}
+        try:
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=len(work), mp_context=context) as pool:
+                futures = {pool.submit(run_work, index): shard.project for index, (shard, _) in enumerate(work)}
+                for future in as_completed(futures):
+                    project = futures[future]
+                    try:
+                        summaries[project] = future.result()
+                    except BrokenProcessPool:
+                        summaries[project] = {'project': project, 'error': traceback.format_exc()}
+        finally:
+            _work.clear()
+        return summaries
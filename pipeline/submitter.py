@@ -0,0 +1,112 @@
+"""Concurrent submission of Earth Engine export tasks.
+
+Building a region's task graphs blocks on client round trips (``getInfo``),
+so graphs are built on a thread pool while the main thread starts the
+finished tasks. The number of tasks in flight (``READY`` or ``RUNNING``) is
+capped to the project's concurrent-task quota, and the window is refilled
+as tasks finish.
+"""
+
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from ._ee import resolve_ee
+
+# Default number of tasks allowed in the Earth Engine queue at once
+DEFAULT_MAX_IN_FLIGHT = 20
+
+# Task states that still occupy a slot in the project queue
+ACTIVE_STATES = ('UNSUBMITTED', 'READY', 'RUNNING', 'CANCEL_REQUESTED')
+
+
+class ExportSubmitter:
+    """Build export tasks in parallel and start them inside a bounded window.
+
+    ``build`` receives one job key (e.g. a region id) and returns an iterable
+    of unstarted ``ee.batch.Task`` objects for that key.
+    """
+
+    def __init__(self, build, max_in_flight=DEFAULT_MAX_IN_FLIGHT, workers=8,
+                 poll_interval=30, ee=None, sleep=time.sleep, log=print):
+        if max_in_flight < 1:
+            raise ValueError('max_in_flight must be at least 1')
+
+        self.build = build
+        self.max_in_flight = max_in_flight
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.ee = resolve_ee(ee)
+        self.sleep = sleep
+        self.log = log
+
+        # Started tasks still occupying a queue slot, keyed by task id
+        self.in_flight = {}
+
+        # Started tasks and failed builds, kept for the run summary
+        self.started = []
+        self.build_errors = {}
+
+    def refresh(self):
+        # Poll all in-flight tasks in a single status request
+        if not self.in_flight:
+            return 0
+
+        statuses = self.ee.data.getTaskStatus(list(self.in_flight))
+        finished = [
+            status['id'] for status in statuses
+            if status.get('state') not in ACTIVE_STATES
+        ]
+
+        for task_id in finished:
+            del self.in_flight[task_id]
+
+        return len(finished)
+
+    def start(self, task):
+        # Submit the task and reserve a slot for it
+        task.start()
+        self.in_flight[task.id] = task
+        self.started.append(task)
+
+    def run(self, keys):
+        """Build tasks for every key and start them; return the started tasks."""
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.build, key): key for key in keys}
+
+            while futures or pending:
+                # Collect task graphs that finished building
+                done = [future for future in futures if future.done()]
+                for future in done:
+                    key = futures.pop(future)
+                    try:
+                        pending.extend(future.result())
+                    except Exception as error:
+                        self.build_errors[key] = error
+                        self.log(f'[{key}] task build failed: {error}')
+
+                # Free the slots of tasks that left the queue
+                if pending and len(self.in_flight) >= self.max_in_flight:
+                    self.refresh()
+
+                # Refill the window with built tasks
+                started = 0
+                while pending and len(self.in_flight) < self.max_in_flight:
+                    self.start(pending.popleft())
+                    started += 1
+
+                if started:
+                    self.log(f'Started {started} task(s), {len(self.in_flight)} in flight, '
+                             f'{len(pending)} waiting, {len(futures)} job(s) building')
+                    continue
+
+                # Nothing could be started: wait for builds or for the queue to drain
+                if pending:
+                    self.sleep(self.poll_interval)
+                elif futures:
+                    wait(futures, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+
+        self.log(f'Submitted {len(self.started)} task(s); {len(self.build_errors)} job(s) failed to build')
+        return self.started
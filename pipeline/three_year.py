@@ -0,0 +1,64 @@
+"""Lazy trailing three-year window for the annual mosaics.
+
+``addThreeYearMetrics`` only reads the reduced images of the two previous
+years, so a year whose asset already exists does not need its own mosaic
+unless a missing year within the next two years depends on it. The window
+builds each annual mosaic on demand, at most once per region.
+"""
+
+# Number of previous years read by the trailing three-year metrics
+LAG = 2
+
+
+def plan_years(missing_years, years, lag=LAG):
+    """Return the sorted years whose mosaics are needed to export ``missing_years``."""
+    available = set(years)
+    needed = set()
+
+    for year in missing_years:
+        for offset in range(lag + 1):
+            if year - offset in available:
+                needed.add(year - offset)
+
+    return sorted(needed)
+
+
+class ThreeYearWindow:
+    """Memoized annual mosaics and their reduced three-year images for one region.
+
+    ``build(year)`` returns the annual context mosaic (base mosaic plus
+    structural context) and ``reduce(mosaic)`` returns the reduced image
+    stored for the trailing metrics (``getThreeYearReducedImage``).
+    """
+
+    def __init__(self, build, reduce, years, lag=LAG):
+        self.build = build
+        self.reduce = reduce
+        self.years = set(years)
+        self.lag = lag
+        self.mosaics = {}
+        self.reduced_images = {}
+
+    @property
+    def built(self):
+        # Years whose mosaics were built so far
+        return sorted(self.mosaics)
+
+    def mosaic(self, year):
+        # Build the annual context mosaic only the first time it is requested
+        if year not in self.mosaics:
+            self.mosaics[year] = self.build(year)
+        return self.mosaics[year]
+
+    def reduced(self, year):
+        if year not in self.reduced_images:
+            self.reduced_images[year] = self.reduce(self.mosaic(year))
+        return self.reduced_images[year]
+
+    def previous(self, year):
+        """Return the ``{year: reduced image}`` dictionary of the trailing years."""
+        return {
+            y: self.reduced(y)
+            for y in range(year - self.lag, year)
+            if y in self.years
+        }
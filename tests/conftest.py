@@ -0,0 +1,28 @@
+"""Shared fixtures of the local engine tests."""
+
+import numpy as np
+import pytest
+
+# Classes of the Cerrado legend, NoData included
+CLASSES = np.array([0, 3, 4, 11, 12, 15, 21, 25, 33], dtype=np.uint8)
+
+
+def make_stack(seed, years=41, rows=24, cols=24, persistence=0.7, block=1, classes=CLASSES):
+    """Annual stack whose pixels keep their class with probability ``persistence`` from year to year.
+
+    With ``block > 1`` the classes are drawn for ``block x block`` squares,
+    so the stack holds patches of several sizes instead of single pixels.
+    """
+    rng = np.random.default_rng(seed)
+    shape = (-(-rows // block), -(-cols // block))
+    stack = np.empty((years,) + shape, dtype=np.uint8)
+    stack[0] = rng.choice(classes, size=shape)
+    for t in range(1, years):
+        change = rng.random(shape) > persistence
+        stack[t] = np.where(change, rng.choice(classes, size=shape), stack[t - 1])
+    return np.ascontiguousarray(stack.repeat(block, axis=1).repeat(block, axis=2)[:, :rows, :cols])
+
+
+@pytest.fixture
+def random_stack():
+    return make_stack
@@ -0,0 +1,26 @@
+"""Covariate factory shared by task-building threads."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pipeline.covariates import CovariateFactory
+from pipeline.fake_ee import FakeEarthEngine
+
+
+def test_threads_share_one_graph():
+    fake = FakeEarthEngine()
+    factory = CovariateFactory({'slope': fake.Image('slope'), 'aspect': fake.Image('aspect')}, ee=fake)
+    names = ('coordinates', 'hand', 'tpi', 'geomorpho')
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        stacks = list(pool.map(lambda _: factory.stack(*names), range(200)))
+
+    assert all(stack is stacks[0] for stack in stacks)
+    assert factory.stack('hand') is factory.hand()
+    assert set(factory.images) == set(names)
+
+
+def test_unknown_covariate():
+    with pytest.raises(KeyError, match='Unknown covariate'):
+        CovariateFactory(ee=FakeEarthEngine()).get('slope')
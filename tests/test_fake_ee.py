@@ -0,0 +1,22 @@
+"""Registered and missing ``getInfo`` responses of the Earth Engine stand-in."""
+
+import pytest
+
+from pipeline.fake_ee import FakeEarthEngine
+
+
+def test_get_info_answers_registered_functions():
+    fake = FakeEarthEngine()
+    fake.respond('bandNames', ['blue_median', 'year'])
+    fake.respond('size', lambda node: 42)
+
+    image = fake.Image('mosaic')
+    assert image.bandNames().getInfo() == ['blue_median', 'year']
+    assert fake.FeatureCollection('samples').size().getInfo() == 42
+    assert fake.calls['getInfo'] == 2
+
+
+def test_get_info_without_a_response_names_the_function():
+    fake = FakeEarthEngine()
+    with pytest.raises(KeyError, match='aggregate_array'):
+        fake.FeatureCollection('regions').aggregate_array('mapb').getInfo()
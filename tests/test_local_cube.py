@@ -0,0 +1,87 @@
+"""Chunked cube store: round trips, rechunking and chunk views."""
+
+import os
+
+import numpy as np
+import pytest
+
+from pipeline.local.cube import create_cube, open_cube, rechunk
+from pipeline.local.stack import NODATA
+
+
+def quiet(message):
+    pass
+
+
+@pytest.fixture
+def stack(random_stack):
+    return random_stack(6, years=9, rows=37, cols=29, persistence=0.9, block=4)
+
+
+@pytest.mark.parametrize('compression', [None, 'zlib'])
+def test_round_trip(stack, tmp_path, compression):
+    cube = create_cube(str(tmp_path / 'stack.cube'), stack.shape, chunks=(4, 16, 8), compression=compression)
+    cube[:] = stack
+    # Partial writes across chunk edges, with an integer index
+    cube[2, 10:20, 5:9] = 33
+    stack[2, 10:20, 5:9] = 33
+
+    reopened = open_cube(str(tmp_path / 'stack.cube'))
+    assert (reopened.shape, reopened.chunks, reopened.compression) == (stack.shape, (4, 16, 8), compression)
+    np.testing.assert_array_equal(reopened[:], stack)
+    np.testing.assert_array_equal(reopened[3:7, 15:33, 7:], stack[3:7, 15:33, 7:])
+    np.testing.assert_array_equal(reopened[-1, 5], stack[-1, 5])
+    with pytest.raises(ValueError, match='read-only'):
+        reopened[0, 0, 0] = 1
+
+
+def test_compression_shrinks_the_chunks(stack, tmp_path):
+    plain = create_cube(str(tmp_path / 'plain.cube'), stack.shape, chunks=(9, 16, 16))
+    packed = create_cube(str(tmp_path / 'packed.cube'), stack.shape, chunks=(9, 16, 16), compression='zlib')
+    plain[:] = stack
+    packed[:] = stack
+    assert packed.stored_bytes() < plain.stored_bytes() / 2
+
+
+def test_missing_chunks_read_as_nodata(tmp_path):
+    cube = create_cube(str(tmp_path / 'empty.cube'), (3, 20, 20), chunks=(3, 8, 8))
+    cube[:, :8, :8] = 12
+
+    assert (cube[:, 8:, 8:] == NODATA).all()
+    # Reading never creates chunks
+    assert sorted(name for name in os.listdir(cube.path) if not name.startswith('.')) == ['0.0.0']
+
+
+@pytest.mark.parametrize('compression', [None, 'zlib'])
+def test_rechunk(stack, tmp_path, compression):
+    spatial = create_cube(str(tmp_path / 'spatial.cube'), stack.shape, chunks=(1, 16, 16))
+    spatial[:] = stack
+
+    temporal = rechunk(spatial, str(tmp_path / 'temporal.cube'), (9, 8, 8), compression, log=quiet)
+    assert temporal.chunks == (9, 8, 8) and temporal.compression == compression
+    np.testing.assert_array_equal(temporal[:], stack)
+
+    # From an in-memory stack, with chunks larger than the stack clipped to its shape
+    direct = rechunk(stack, str(tmp_path / 'direct.cube'), (41, 64, 64), log=quiet)
+    assert direct.chunks == stack.shape
+    np.testing.assert_array_equal(direct[:], stack)
+
+
+def test_chunk_view_is_zero_copy(stack, tmp_path):
+    cube = create_cube(str(tmp_path / 'stack.cube'), stack.shape, chunks=(9, 16, 16))
+    cube[:] = stack
+
+    view = cube.chunk_view((0, 1, 0))
+    part = view[:, 2:6, 3:9]
+    assert np.shares_memory(part, view)
+    assert not np.shares_memory(cube.read_chunk((0, 1, 0)), view)
+    np.testing.assert_array_equal(view, stack[:, 16:32, :16])
+
+    # Writes through the view land in the chunk file
+    part[...] = 50
+    view.flush()
+    assert (open_cube(cube.path)[:, 18:22, 3:9] == 50).all()
+
+    packed = create_cube(str(tmp_path / 'packed.cube'), stack.shape, compression='zlib')
+    with pytest.raises(ValueError, match='without a copy'):
+        packed.chunk_view((0, 0, 0))
@@ -0,0 +1,71 @@
+"""Deduplicated temporal chain against the chain applied to every pixel."""
+
+import numpy as np
+import pytest
+
+from pipeline.local.dedup import TEMPORAL_CHAIN, TrajectoryCache, dedup_filter
+
+
+def quiet(message):
+    pass
+
+
+def direct(stack):
+    chunk = np.array(stack)
+    for step in TEMPORAL_CHAIN:
+        chunk = step(chunk)
+    return chunk
+
+
+@pytest.fixture
+def stack(random_stack):
+    # Blocks of 3 x 3 pixels share a series: 81 pixels for 9 series per 9-row chunk, half of them repeated below
+    stack = random_stack(2, years=41, rows=36, cols=27, persistence=0.8, block=3)
+    stack[:, 18:] = stack[:, :18]
+    return stack
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 9, 36])
+def test_matches_the_direct_chain(stack, chunk_rows):
+    out, _ = dedup_filter(stack, chunk_rows=chunk_rows, log=quiet)
+    np.testing.assert_array_equal(out, direct(stack))
+
+
+def test_results_are_reused_across_tiles(stack):
+    cache = TrajectoryCache()
+    _, tiles = dedup_filter(stack, cache=cache, chunk_rows=9, log=quiet)
+
+    # The lower half repeats the upper half, so its series all come from the cache
+    assert [tile['evaluated'] for tile in tiles[2:]] == [0, 0]
+    assert [tile['hits'] for tile in tiles[2:]] == [tile['unique'] for tile in tiles[:2]]
+    assert cache.misses == len(cache.entries) == sum(tile['evaluated'] for tile in tiles)
+    assert cache.hits == sum(tile['hits'] for tile in tiles)
+
+
+def test_dedup_ratio(stack):
+    _, tiles = dedup_filter(stack, chunk_rows=9, log=quiet)
+
+    for tile in tiles:
+        assert tile['pixels'] == 9 * 27
+        assert tile['unique'] <= 27
+        assert tile['ratio'] == tile['pixels'] / tile['unique']
+    assert min(tile['ratio'] for tile in tiles) >= 9
+
+
+def test_lru_evicts_the_least_recent_series(stack):
+    cache = TrajectoryCache(max_entries=2)
+    a, b, c = (np.ascontiguousarray(stack[:, row, :1].T) for row in (0, 3, 6))
+
+    cache.lookup(a)
+    cache.lookup(b)
+    _, hits = cache.lookup(a)
+    assert hits == 1
+
+    # b is now the least recently used series, and the first to go
+    cache.lookup(c)
+    assert list(cache.entries) == [a.tobytes(), c.tobytes()]
+
+    # Evicted series are evaluated again with the same result
+    results, hits = cache.lookup(b)
+    assert hits == 0
+    np.testing.assert_array_equal(results, direct(stack[:, 3:4, :1])[:, :, 0].T)
@@ -0,0 +1,87 @@
+"""Frequency filter at the boundaries of its thresholds."""
+
+import numpy as np
+
+from pipeline.local import frequency
+from pipeline.local.frequency import STABLE_NATIVE_THRESHOLD
+
+# Savanna threshold and operator of the stable class rules
+SAVANNA = {class_id: (operator, threshold) for class_id, operator, threshold in frequency.CLASS_THRESHOLDS}[4]
+
+YEARS = 20
+
+
+def series(counts):
+    """Series of ``YEARS`` years holding ``counts`` ({class: years}), classes interleaved year by year."""
+    remaining = dict(counts)
+    values = []
+    while len(values) < YEARS:
+        for class_id in list(remaining):
+            if remaining[class_id]:
+                values.append(class_id)
+                remaining[class_id] -= 1
+    assert len(values) == YEARS and not any(remaining.values())
+    return values
+
+
+def chunk(*pixels):
+    return np.array([series(counts) for counts in pixels], dtype=np.uint8).T[:, None, :].copy()
+
+
+def test_thresholds_are_whole_percentages():
+    # The boundary pixels below need thresholds reachable with 20 years (5 % each)
+    assert STABLE_NATIVE_THRESHOLD % 5 == 0 and SAVANNA[1] % 5 == 0
+
+
+def test_stable_native_threshold_is_inclusive():
+    native = STABLE_NATIVE_THRESHOLD * YEARS // 100
+    data = chunk(
+        {4: 9, 3: native - 9, 21: YEARS - native},          # exactly at the threshold: stable
+        {4: 9, 3: native - 10, 21: YEARS - native + 1},     # one year below: unchanged
+    )
+    assert native * 100 == STABLE_NATIVE_THRESHOLD * YEARS
+
+    counts, valid = frequency.class_counts(data)
+    stable = frequency.stable_native_class(counts, valid)
+    assert stable[0].tolist() == [4, 0]
+
+    filtered = frequency.filter_chunk(data.copy())
+    np.testing.assert_array_equal(filtered[:, 0, 0], np.where(data[:, 0, 0] == 21, 21, 4))
+    np.testing.assert_array_equal(filtered[:, 0, 1], data[:, 0, 1])
+
+
+def test_savanna_threshold_is_exclusive():
+    assert SAVANNA[0] == '>'
+    savanna = SAVANNA[1] * YEARS // 100
+    data = chunk(
+        {4: savanna, 3: 8, 50: YEARS - savanna - 8},        # exactly at the threshold: no stable class
+        {4: savanna + 1, 3: 7, 50: YEARS - savanna - 8},    # one year above: savanna
+    )
+
+    counts, valid = frequency.class_counts(data)
+    assert frequency.stable_native_class(counts, valid)[0].tolist() == [0, 4]
+
+    filtered = frequency.filter_chunk(data.copy())
+    np.testing.assert_array_equal(filtered[:, 0, 0], data[:, 0, 0])
+    assert (filtered[:, 0, 1] == 4).all()
+
+
+def test_nodata_years_are_not_counted():
+    # 19 native years out of 19 valid ones: stable even though NoData brings the share of all years under 95 %
+    data = chunk({4: 10, 3: 9, 0: 1})
+    counts, valid = frequency.class_counts(data)
+    assert valid[0, 0] == YEARS - 1
+    assert frequency.stable_native_class(counts, valid)[0, 0] == 4
+
+    filtered = frequency.filter_chunk(data.copy())
+    np.testing.assert_array_equal(filtered[:, 0, 0], np.where(data[:, 0, 0] == 0, 0, 4))
+
+
+def test_persistent_runs_are_kept():
+    values = [3, 3, 3, 4, 3, 4, 4, 4] + [4, 3] * 6
+    data = np.array(values, dtype=np.uint8)[:, None, None].copy()
+    filtered = frequency.filter_chunk(data.copy())[:, 0, 0]
+
+    # Savanna in 10 of 20 years: the stable class; the forest run of three years stays
+    assert filtered[:3].tolist() == [3, 3, 3]
+    assert (filtered[3:] == 4).all()
@@ -0,0 +1,59 @@
+"""Fused chain against the steps run one after the other on the whole stack."""
+
+import numpy as np
+import pytest
+
+from pipeline.local.fused import STEPS, chain_halo, fused_filter, fused_filter_file
+
+
+def quiet(message):
+    pass
+
+
+def sequential(stack, steps=STEPS):
+    """Stack after every step, each applied to the whole stack."""
+    data, after = np.array(stack), {}
+    for step in steps:
+        # Per-pixel steps filter in place, so every stage is kept as a copy
+        data = step.apply(data)
+        after[step.name] = data.copy()
+    return after
+
+
+@pytest.fixture
+def stack(random_stack):
+    stack = random_stack(4, years=41, rows=45, cols=38, persistence=0.8, block=2)
+    stack[:, 10:14, 30:] = 0
+    return stack
+
+
+@pytest.mark.parametrize('tile_size', [16, 32, 64])
+def test_matches_the_sequential_steps(stack, tile_size):
+    expected = sequential(stack)['spatial_2']
+    out, summary = fused_filter(stack, tile_size=tile_size, log=quiet)
+
+    np.testing.assert_array_equal(out, expected)
+    assert summary['halo'] == chain_halo(STEPS)
+    assert summary['tiles'] == -(-45 // tile_size) * -(-38 // tile_size)
+
+
+def test_checkpoints_are_written(stack, tmp_path):
+    after = sequential(stack)
+    checkpoints = {'gapfill': np.zeros_like(stack), 'transitions': np.zeros_like(stack)}
+    fused_filter(stack, checkpoints=checkpoints, tile_size=24, log=quiet)
+    for name, checkpoint in checkpoints.items():
+        np.testing.assert_array_equal(checkpoint, after[name])
+
+    np.save(tmp_path / 'input.npy', stack)
+    paths = {'frequency': str(tmp_path / 'frequency.npy')}
+    output, summary = fused_filter_file(
+        str(tmp_path / 'input.npy'), str(tmp_path / 'output.npy'), paths, tile_size=24, log=quiet
+    )
+    np.testing.assert_array_equal(np.load(paths['frequency']), after['frequency'])
+    np.testing.assert_array_equal(np.load(output), after['spatial_2'])
+    assert summary['bytes_written'] == 2 * stack.nbytes
+
+
+def test_unknown_checkpoints_are_rejected(stack):
+    with pytest.raises(ValueError, match='not in the chain'):
+        fused_filter(stack, checkpoints={'topographic': np.zeros_like(stack)}, log=quiet)
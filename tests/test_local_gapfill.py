@@ -0,0 +1,70 @@
+"""Gap fill against a per-pixel reference of ``06_gapfill.js``."""
+
+import numpy as np
+import pytest
+
+from pipeline.local import gapfill
+from pipeline.local.stack import NODATA
+
+
+def reference(series):
+    """Forward then backward fill of one pixel series; return the filled series and the years filled."""
+    filled = list(series)
+    for t in range(1, len(filled)):
+        if filled[t] == NODATA:
+            filled[t] = filled[t - 1]
+    for t in range(len(filled) - 2, -1, -1):
+        if filled[t] == NODATA:
+            filled[t] = filled[t + 1]
+    gaps = sum(value == NODATA for value in series)
+    return filled, 0 if gaps == len(series) else gaps
+
+
+@pytest.fixture
+def stack(random_stack):
+    stack = random_stack(5, years=15, rows=20, cols=17, persistence=0.6)
+    stack[:, 0] = 15
+    stack[:, 0, 0] = NODATA                       # never observed
+    stack[:4, 0, 1] = NODATA                      # gaps at the start of the series
+    stack[4, 0, 1] = 3
+    stack[-3:, 0, 2] = NODATA                     # gaps at the end of the series
+    stack[-4, 0, 2] = 12
+    stack[:, 0, 3] = NODATA
+    stack[7, 0, 3] = 21                           # one valid year in the middle
+    stack[1:-1, 0, 4] = NODATA                    # only the first and last years
+    stack[0, 0, 4] = 4
+    return stack
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 6, 64])
+def test_matches_the_reference(stack, chunk_rows):
+    out, filled = gapfill.gapfill(stack, chunk_rows=chunk_rows)
+
+    for row in range(stack.shape[1]):
+        for col in range(stack.shape[2]):
+            series, years = reference(stack[:, row, col].tolist())
+            assert out[:, row, col].tolist() == series, (row, col)
+            assert filled[row, col] == years, (row, col)
+
+
+def test_edges_and_empty_pixels(stack):
+    out, filled = gapfill.gapfill(stack)
+
+    assert (out[:, 0, 0] == NODATA).all() and filled[0, 0] == 0
+    assert (out[:5, 0, 1] == 3).all() and filled[0, 1] == 4
+    assert (out[-4:, 0, 2] == 12).all() and filled[0, 2] == 3
+    assert (out[:, 0, 3] == 21).all() and filled[0, 3] == 14
+    assert (out[:-1, 0, 4] == 4).all() and out[-1, 0, 4] == 15 and filled[0, 4] == 13
+    # Every pixel with a valid year is left without gaps
+    observed = (stack != NODATA).any(axis=0)
+    assert (out[:, observed] != NODATA).all()
+
+
+def test_file_matches_memory(stack, tmp_path):
+    np.save(tmp_path / 'input.npy', stack)
+    output, filled_path = gapfill.gapfill_file(
+        str(tmp_path / 'input.npy'), str(tmp_path / 'output.npy'), str(tmp_path / 'filled.npy'), chunk_rows=7
+    )
+    out, filled = gapfill.gapfill(stack)
+    np.testing.assert_array_equal(np.load(output), out)
+    np.testing.assert_array_equal(np.load(filled_path), filled)
@@ -0,0 +1,15 @@
+"""Parity of the local temporal engines with their literal ports of the scripts."""
+
+import pytest
+
+from pipeline.local import regrowth, temporal
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_temporal_parity(seed, random_stack):
+    assert temporal.parity(random_stack(seed)) == 0
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_regrowth_parity(seed, random_stack):
+    assert regrowth.parity(random_stack(seed)) == 0
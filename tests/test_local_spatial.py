@@ -0,0 +1,47 @@
+"""Tiled spatial filter against the filter of the whole year."""
+
+import numpy as np
+import pytest
+
+from pipeline.local import spatial
+from pipeline.local.tiling import required_halo
+
+HALO = required_halo(spatial.KERNEL_RADIUS, spatial.MIN_MAPPED_PIXELS)
+
+
+@pytest.fixture
+def stack(random_stack):
+    # Patches of 1 to ~20 pixels, NoData included, and a NoData block wider than the focal window
+    stack = random_stack(7, years=4, rows=70, cols=53, persistence=0.5, block=2)
+    noise = np.random.default_rng(8).random(stack.shape) < 0.1
+    stack[noise] = random_stack(9, years=4, rows=70, cols=53)[noise]
+    stack[:, 30:45, 10:25] = 0
+    return stack
+
+
+@pytest.mark.parametrize('tile_size', [3, HALO - 1, 16, 29, 64])
+def test_tiles_match_the_whole_year(stack, tile_size):
+    whole = spatial.spatial_filter(stack, tile_size=max(stack.shape))
+    assert (whole != stack).any()
+
+    tiled = spatial.spatial_filter(stack, tile_size=tile_size)
+    np.testing.assert_array_equal(tiled, whole)
+
+
+def test_file_workers_match_the_whole_year(stack, tmp_path):
+    np.save(tmp_path / 'input.npy', stack)
+    output = spatial.spatial_filter_file(
+        str(tmp_path / 'input.npy'), str(tmp_path / 'output.npy'),
+        workers=2, tile_size=HALO - 3, log=lambda message: None
+    )
+    np.testing.assert_array_equal(np.load(output), spatial.spatial_filter(stack, tile_size=max(stack.shape)))
+
+
+def test_nodata_and_protected_classes_are_kept(stack):
+    filtered = spatial.spatial_filter(stack, tile_size=16)
+
+    # NoData stays NoData, protected classes are never replaced, merged classes disappear
+    np.testing.assert_array_equal(filtered == 0, stack == 0)
+    protected = np.isin(stack, spatial.PROTECTED_CLASSES)
+    np.testing.assert_array_equal(filtered[protected], stack[protected])
+    assert not np.isin(filtered, spatial.MERGED_INTO_21).any()
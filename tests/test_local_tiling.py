@@ -0,0 +1,75 @@
+"""Tiled runs of a window function: deterministic and independent of tiles and workers."""
+
+import numpy as np
+import pytest
+
+from pipeline.local import spatial, transitions
+from pipeline.local.cube import create_cube
+from pipeline.local.fused import HALOS, spatial_window
+from pipeline.local.stack import create_stack
+from pipeline.local.tiling import required_halo, run_tiled, tiles
+
+FILTERS = {
+    'spatial': (spatial_window, HALOS['07_1stSpatial']),
+    'transitions': (transitions.filter_window, HALOS['09_transitions']),
+}
+
+
+def quiet(message):
+    pass
+
+
+@pytest.fixture
+def stack(random_stack):
+    stack = random_stack(11, years=5, rows=48, cols=40, persistence=0.5, block=2)
+    stack[:, 20:28, 5:30] = 0
+    return stack
+
+
+def test_required_halo():
+    assert required_halo(spatial.KERNEL_RADIUS, spatial.MIN_MAPPED_PIXELS) == 11
+    assert required_halo(5, 128, context=True) == 133
+
+
+def test_tiles_cover_every_pixel_once():
+    covered = np.zeros((37, 23), dtype=int)
+    for window, core, inner in tiles(37, 23, tile_size=10, halo=4):
+        covered[core] += 1
+        assert window[0].start <= core[0].start and core[0].stop <= window[0].stop
+        assert inner[0].stop - inner[0].start == core[0].stop - core[0].start
+    assert (covered == 1).all()
+
+
+@pytest.mark.parametrize('name', sorted(FILTERS))
+@pytest.mark.parametrize('tile_size', [4, 16, 40])
+def test_tile_size_independence(stack, name, tile_size):
+    apply, halo = FILTERS[name]
+    whole = apply(stack)
+
+    tiled = run_tiled(apply, stack, halo=halo, tile_size=tile_size, log=quiet)
+    np.testing.assert_array_equal(tiled, whole)
+    np.testing.assert_array_equal(run_tiled(apply, stack, halo=halo, tile_size=tile_size, log=quiet), tiled)
+
+
+@pytest.mark.parametrize('name', sorted(FILTERS))
+def test_workers_match_one_process(stack, tmp_path, name):
+    apply, halo = FILTERS[name]
+    serial = run_tiled(apply, stack, halo=halo, tile_size=8, log=quiet)
+
+    memmap = create_stack(str(tmp_path / 'out.npy'), stack.shape)
+    run_tiled(apply, stack, memmap, halo=halo, tile_size=8, workers=3, log=quiet)
+    np.testing.assert_array_equal(memmap, serial)
+
+    cube = create_cube(str(tmp_path / 'out.cube'), stack.shape, chunks=(5, 8, 8))
+    run_tiled(apply, stack, cube, halo=halo, tile_size=16, workers=3, log=quiet)
+    np.testing.assert_array_equal(cube[:], serial)
+
+
+def test_workers_need_a_shared_output(stack, tmp_path):
+    apply, halo = FILTERS['transitions']
+    with pytest.raises(ValueError, match='memory map or a store'):
+        run_tiled(apply, stack, np.empty_like(stack), halo=halo, workers=2, log=quiet)
+
+    cube = create_cube(str(tmp_path / 'out.cube'), stack.shape, chunks=(5, 8, 8))
+    with pytest.raises(ValueError, match='multiple of the chunk'):
+        run_tiled(apply, stack, cube, halo=halo, tile_size=12, workers=2, log=quiet)
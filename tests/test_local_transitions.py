@@ -0,0 +1,41 @@
+"""Tiled transition filter: tile-size independence and the edges of the series."""
+
+import numpy as np
+import pytest
+
+from pipeline.local import transitions
+
+# Classes of the three groups, outside every group and NoData
+CLASSES = np.array([0, 3, 4, 12, 21, 25, 27, 33, 50], dtype=np.uint8)
+
+
+@pytest.fixture
+def stack(random_stack):
+    # Few classes flipping often, so many A-B-A years form patches on both sides of the size limit
+    return random_stack(3, years=12, rows=57, cols=46, persistence=0.6, block=2, classes=CLASSES)
+
+
+@pytest.mark.parametrize('tile_size', [2, transitions.MAX_PATCH_PIXELS - 1, 13, 32])
+def test_tiles_match_the_whole_stack(stack, tile_size):
+    whole = transitions.transition_filter(stack, tile_size=max(stack.shape))
+    assert (whole != stack).any()
+
+    tiled = transitions.transition_filter(stack, tile_size=tile_size)
+    np.testing.assert_array_equal(tiled, whole)
+
+
+def test_first_and_last_years_are_unchanged(stack):
+    filtered = transitions.transition_filter(stack, tile_size=16)
+    np.testing.assert_array_equal(filtered[0], stack[0])
+    np.testing.assert_array_equal(filtered[-1], stack[-1])
+
+
+def test_small_patches_take_the_previous_year():
+    stack = np.full((3, 12, 12), 3, dtype=np.uint8)
+    # Native - anthropic - native: a patch of MAX_PATCH_PIXELS pixels and a larger one
+    stack[1, 1:3, 1:4] = 21
+    stack[1, 6:10, 6:10] = 21
+
+    filtered = transitions.transition_filter(stack, tile_size=4)
+    assert (filtered[1, 1:3, 1:4] == 3).all()
+    assert (filtered[1, 6:10, 6:10] == 21).all()
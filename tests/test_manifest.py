@@ -0,0 +1,55 @@
+"""Asset manifest over a paged folder listing of the Earth Engine stand-in."""
+
+from pipeline.fake_ee import FakeEarthEngine
+from pipeline.manifest import AssetManifest
+
+FOLDER = 'projects/p/assets/SAMPLES'
+
+
+def asset(region, year):
+    return f'{FOLDER}/train_reg{region}_{year}'
+
+
+def test_refresh_lists_every_page(tmp_path):
+    # 50 regions x 50 years: three listing pages of at most 1000 assets
+    names = [asset(region, year) for region in range(50) for year in range(1976, 2026)]
+    fake = FakeEarthEngine(assets=names, page_size=1000)
+    manifest = AssetManifest(str(tmp_path / 'manifest.sqlite'), ee=fake)
+
+    assert manifest.refresh(FOLDER + '/') == (2500, 0)
+    assert fake.calls['listAssets'] == 3
+    assert manifest.existing(FOLDER) == set(names)
+
+    # Assets deleted and exported since the last listing
+    fake.assets -= {asset(0, 1976), asset(49, 2025)}
+    fake.assets |= {asset(50, 2000), asset(50, 2001), asset(50, 2002)}
+    assert manifest.refresh(FOLDER) == (3, 2)
+    assert fake.calls['listAssets'] == 6
+
+    # A recent listing is reused
+    assert manifest.refresh(FOLDER, max_age=3600) == (0, 0)
+    assert fake.calls['listAssets'] == 6
+
+    # A new manifest over the same file answers from the stored listing
+    stored = AssetManifest(str(tmp_path / 'manifest.sqlite'), ee=fake)
+    assert stored.existing(FOLDER) == set(fake.assets)
+
+
+def test_missing_by_region(tmp_path):
+    names = [asset(region, year) for region in range(50) for year in range(1976, 2026)]
+    fake = FakeEarthEngine(assets=names[:-1] + [asset(60, 1985)], page_size=1000)
+    fake.assets -= {asset(3, 1990), asset(3, 1985), asset(7, 2000)}
+    manifest = AssetManifest(str(tmp_path / 'manifest.sqlite'), ee=fake)
+    manifest.refresh(FOLDER)
+
+    expected = {(region, year): asset(region, year) for region in range(52) for year in range(1985, 2026)}
+    missing = manifest.missing_by_region(FOLDER, expected)
+
+    assert missing == {
+        3: [1985, 1990],
+        7: [2000],
+        49: [2025],
+        50: list(range(1985, 2026)),
+        51: list(range(1985, 2026)),
+    }
+    assert manifest.missing(FOLDER, [asset(3, 1990), asset(4, 1990)]) == [asset(3, 1990)]
@@ -0,0 +1,59 @@
+"""Module cache over a local clone source."""
+
+import subprocess
+import sys
+
+import pytest
+
+from pipeline.module_cache import load_modules, read_index
+
+
+def git(path, *args):
+    command = ['git', '-C', str(path), '-c', 'user.name=test', '-c', 'user.email=test@example.com']
+    return subprocess.run(command + list(args), check=True, capture_output=True, text=True).stdout.strip()
+
+
+def commit_modules(repository, text):
+    (repository / 'modules' / 'Mosaic.py').write_text(text)
+    git(repository, 'add', '.')
+    git(repository, 'commit', '-q', '-m', text)
+    return git(repository, 'rev-parse', 'HEAD')
+
+
+@pytest.fixture
+def repository(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, 'path', list(sys.path))
+    path = tmp_path / 'mapbiomas-mosaic'
+    (path / 'modules').mkdir(parents=True)
+    (path / 'modules' / '__init__.py').write_text('')
+    git(path, 'init', '-q')
+    return path
+
+
+def test_unpinned_sources_name_the_cached_commit(repository, tmp_path):
+    first = commit_modules(repository, 'VERSION = 1\n')
+    cache, messages = str(tmp_path / 'cache'), []
+
+    load_modules(cache_dir=cache, repository=str(repository), log=messages.append)
+    assert 'fetching the head of the branch' in messages[0]
+
+    # A newer head is not picked up: the log names the commit of the cached copy
+    commit_modules(repository, 'VERSION = 2\n')
+    messages.clear()
+    load_modules(cache_dir=cache, repository=str(repository), log=messages.append)
+    assert messages == [f'landsat modules are not pinned to a commit; using the cached copy from commit {first[:10]}']
+
+
+def test_max_age_refreshes_unpinned_sources(repository, tmp_path):
+    commit_modules(repository, 'VERSION = 1\n')
+    cache = str(tmp_path / 'cache')
+    load_modules(cache_dir=cache, repository=str(repository), log=lambda message: None)
+
+    second = commit_modules(repository, 'VERSION = 2\n')
+    load_modules(cache_dir=cache, repository=str(repository), max_age=3600, log=lambda message: None)
+    assert read_index(cache)['landsat']['commit'] != second
+
+    messages = []
+    load_modules(cache_dir=cache, repository=str(repository), max_age=0, log=messages.append)
+    assert 'older than 0 s' in messages[0]
+    assert read_index(cache)['landsat']['commit'] == second
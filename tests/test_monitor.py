@@ -0,0 +1,77 @@
+"""Task monitor polling and retries against the Earth Engine stand-in."""
+
+from pipeline.fake_ee import FakeEarthEngine
+from pipeline.monitor import TaskMonitor, operation_status
+
+
+class Clock:
+    """Simulated time advanced by the monitor's sleeps."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class UnlistedTask:
+    """Started task that the operation listing never reports."""
+
+    id = 'UNLISTED'
+    config = {'description': 'unlisted'}
+
+    def start(self):
+        pass
+
+
+def export(fake, name, attempt=1):
+    collection = fake.FeatureCollection(name)
+    return fake.batch.Export.table.toAsset(
+        collection=collection, description=name, assetId=f'out/{name}', attempt=attempt
+    )
+
+
+def monitor_for(fake, tmp_path, clock, **options):
+    return TaskMonitor(
+        str(tmp_path / 'monitor.sqlite'), 'v1', rebuild=lambda key, attempt: export(fake, key, attempt),
+        backoff=0, ee=fake, sleep=clock.sleep, clock=clock, log=lambda message: None, **options
+    )
+
+
+def test_operation_status():
+    status = operation_status({
+        'name': 'projects/p/operations/ABC',
+        'metadata': {'state': 'SUCCEEDED', 'startTime': '2025-01-01T00:00:00Z', 'endTime': '2025-01-01T00:01:30.5Z'},
+    })
+    assert status['id'] == 'ABC' and status['state'] == 'COMPLETED'
+    assert status['end'] - status['start'] == 90.5
+    assert operation_status({'name': 'ABC', 'metadata': {'state': 'WEIRD'}})['state'] == 'UNKNOWN'
+
+
+def test_one_listing_per_cycle(tmp_path):
+    fake, clock = FakeEarthEngine(), Clock()
+    monitor = monitor_for(fake, tmp_path, clock)
+    for name in ('a', 'b', 'c'):
+        monitor.start(export(fake, name), name)
+
+    summary = monitor.run()
+    assert summary['completed'] == 3
+    assert fake.calls['getTaskStatus'] == 0
+    assert fake.calls['listOperations'] == fake.polls_to_finish
+    assert set(monitor.durations()) == {'a', 'b', 'c'}
+
+
+def test_failed_and_unknown_tasks_are_retried(tmp_path):
+    fake = FakeEarthEngine(outcome=lambda task: 'FAILED' if task.config['attempt'] == 1 else 'COMPLETED')
+    clock = Clock()
+    monitor = monitor_for(fake, tmp_path, clock, unknown_timeout=600)
+    monitor.start(export(fake, 'a'), 'a')
+    monitor.start(UnlistedTask(), 'unlisted')
+
+    summary = monitor.run()
+    assert summary == {'completed': 2, 'failed': [], 'retries': 2}
+    assert monitor.outcomes()['unlisted'] == ('COMPLETED', 2, None)
+    assert clock.now >= 600
@@ -0,0 +1,85 @@
+"""Launches sharded across projects, one Earth Engine stand-in per project."""
+
+import pytest
+
+from pipeline.fake_ee import FakeEarthEngine
+from pipeline.sharding import Shard, ShardedSubmitter, partition
+
+SHARDS = [Shard('big', max_in_flight=30), Shard('small', max_in_flight=10)]
+
+
+def projects(shards=SHARDS, queued=None, broken=()):
+    """Return ``connect(shard)`` over one stand-in per project.
+
+    ``queued`` gives the tasks left in each queue by earlier launches, and
+    connecting to a project in ``broken`` fails.
+    """
+    fakes = {}
+    for shard in shards:
+        fake = fakes[shard.project] = FakeEarthEngine(project=shard.project)
+        for index in range((queued or {}).get(shard.project, 0)):
+            fake.batch.Export.table.toAsset(
+                collection=fake.FeatureCollection(f'old_{index}'), description=f'old_{index}'
+            ).start()
+
+    def connect(shard):
+        if shard.project in broken:
+            raise fakes[shard.project].EEException(f'Project {shard.project} is not registered')
+        return fakes[shard.project]
+
+    return connect, fakes
+
+
+def build(key, ee):
+    return [
+        ee.batch.Export.table.toAsset(
+            collection=ee.FeatureCollection(f'region_{key}'), description=f'region_{key}', assetId=f'out/{key}'
+        )
+    ]
+
+
+def submitter_for(connect, shards=SHARDS, processes=False):
+    return ShardedSubmitter(shards, build, connect=connect, processes=processes,
+                            poll_interval=0, log=lambda message: None)
+
+
+def test_partition_follows_the_quotas():
+    assigned = partition(list(range(40)), SHARDS)
+    assert len(assigned['big']) == 30 and len(assigned['small']) == 10
+
+    # Costly jobs are placed first and the load stays proportional to the quota
+    costs = {job: 10 if job < 4 else 1 for job in range(40)}
+    assigned = partition(list(range(40)), SHARDS, costs)
+    loads = {project: sum(costs[job] for job in jobs) for project, jobs in assigned.items()}
+    assert sorted(assigned['big'] + assigned['small']) == list(range(40))
+    assert loads['big'] / 30 == pytest.approx(loads['small'] / 10, rel=0.15)
+
+
+def test_queued_tasks_reduce_the_window():
+    connect, fakes = projects(queued={'big': 25, 'small': 12})
+    summaries = submitter_for(connect).run(list(range(8)))
+
+    assert summaries['big']['queued_before'] == 25
+    assert summaries['big']['max_in_flight'] == 5
+    # A queue already above the quota still leaves one slot
+    assert summaries['small']['queued_before'] == 12
+    assert summaries['small']['max_in_flight'] == 1
+    assert sum(len(summary['started']) for summary in summaries.values()) == 8
+
+
+def test_failing_project_does_not_stop_the_others():
+    connect, fakes = projects(broken={'small'})
+    summaries = submitter_for(connect).run(list(range(8)))
+
+    assert 'not registered' in summaries['small']['error']
+    assert len(summaries['big']['started']) == len(summaries['big']['built']) == 6
+    assert fakes['small'].calls['startProcessing'] == 0
+
+
+def test_threads_and_forked_processes_agree():
+    jobs = list(range(12))
+    threads = submitter_for(projects()[0]).run(jobs)
+    forked = submitter_for(projects()[0], processes=True).run(jobs)
+
+    assert forked == threads
+    assert sorted(threads['big']['built'] + threads['small']['built']) == jobs
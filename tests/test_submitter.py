@@ -0,0 +1,84 @@
+"""Bounded concurrent submission against the Earth Engine stand-in."""
+
+from pipeline.fake_ee import ACTIVE_STATES, FakeEarthEngine
+from pipeline.submitter import ExportSubmitter
+
+
+class CappedEarthEngine(FakeEarthEngine):
+    """Stand-in recording the largest number of tasks queued at once.
+
+    ``seen`` keeps the states of the tasks already started at each start.
+    """
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.peak = 0
+        self.seen = []
+
+    def start_task(self, task):
+        with self.lock:
+            self.seen.append(sorted(task.state for task in self.tasks.values()))
+        super().start_task(task)
+        with self.lock:
+            active = sum(task.state in ACTIVE_STATES for task in self.tasks.values())
+            self.peak = max(self.peak, active)
+
+
+def exports(fake, count=3):
+    # ``count`` export tasks per job key
+    def build(key):
+        return [
+            fake.batch.Export.table.toAsset(
+                collection=fake.FeatureCollection(f'{key}_{index}'),
+                description=f'{key}_{index}', assetId=f'out/{key}_{index}'
+            )
+            for index in range(count)
+        ]
+    return build
+
+
+def submitter_for(fake, build, max_in_flight):
+    return ExportSubmitter(build, max_in_flight=max_in_flight, workers=4, poll_interval=0,
+                           ee=fake, sleep=lambda seconds: None, log=lambda message: None)
+
+
+def test_in_flight_cap_is_never_exceeded():
+    fake = CappedEarthEngine(polls_to_finish=3)
+    submitter = submitter_for(fake, exports(fake), max_in_flight=4)
+
+    started = submitter.run(range(10))
+
+    assert len(started) == 30
+    assert fake.peak == 4
+    assert len(submitter.in_flight) <= 4
+
+
+def test_window_refills_as_tasks_finish():
+    fake = CappedEarthEngine(polls_to_finish=1)
+    submitter = submitter_for(fake, exports(fake, count=4), max_in_flight=2)
+
+    started = submitter.run(['a'])
+
+    # Two tasks fill the window; the other two start once a status poll reports them completed
+    assert len(started) == 4
+    assert fake.seen[2] == ['COMPLETED', 'COMPLETED']
+    assert fake.calls['getTaskStatus'] == 2
+    assert fake.peak == 2
+
+
+def test_build_errors_are_recorded_and_the_run_continues():
+    fake = FakeEarthEngine()
+    build = exports(fake, count=2)
+
+    def flaky(key):
+        if key == 3:
+            raise fake.EEException('Too many concurrent aggregations.')
+        return build(key)
+
+    submitter = submitter_for(fake, flaky, max_in_flight=20)
+    started = submitter.run(range(6))
+
+    assert list(submitter.build_errors) == [3]
+    assert 'Too many concurrent aggregations' in str(submitter.build_errors[3])
+    assert len(started) == 10
+    assert not any(task.config['description'].startswith('3_') for task in started)